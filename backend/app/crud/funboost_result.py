@@ -0,0 +1,147 @@
+"""
+funboost_consume_results 表的查询操作
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query, Session
+
+from app.models.funboost_result import FunboostConsumeResult
+
+CURSOR_NEXT = 'next'
+CURSOR_PREV = 'prev'
+
+# 列表页只需要的标量列，不包含 msg_dict/params JSON 以及 result/exception 等大字段
+SUMMARY_COLUMNS = (
+    FunboostConsumeResult._id,
+    FunboostConsumeResult.task_id,
+    FunboostConsumeResult.function,
+    FunboostConsumeResult.queue_name,
+    FunboostConsumeResult.host_name,
+    FunboostConsumeResult.params_str,
+    FunboostConsumeResult.time_cost,
+    FunboostConsumeResult.run_times,
+    FunboostConsumeResult.success,
+    FunboostConsumeResult.run_status,
+    FunboostConsumeResult.exception_type,
+    FunboostConsumeResult.insert_time,
+)
+
+# 列表统一按 (insert_time, _id) 倒序，与 idx_insert_time / idx_queue_name_insert_time 索引顺序一致
+NEWEST_FIRST = (FunboostConsumeResult.insert_time.desc(), FunboostConsumeResult._id.desc())
+OLDEST_FIRST = (FunboostConsumeResult.insert_time.asc(), FunboostConsumeResult._id.asc())
+
+
+def summary_query(db: Session) -> Query:
+    """只查询 SUMMARY_COLUMNS 的列表查询，返回 Row 而不是 ORM 对象"""
+    return db.query(*SUMMARY_COLUMNS)
+
+
+def rows_to_dicts(rows: list) -> List[dict]:
+    return [dict(row._mapping) for row in rows]
+
+
+def get_result_detail(db: Session, _id: str) -> Optional[FunboostConsumeResult]:
+    """按主键加载单条结果的完整内容"""
+    return db.get(FunboostConsumeResult, _id)
+
+
+def get_result_summary_by_task_id(db: Session, task_id: str) -> Optional[dict]:
+    """按 task_id 取最新一条结果的精简字段"""
+    row = summary_query(db).filter(FunboostConsumeResult.task_id == task_id).order_by(*NEWEST_FIRST).first()
+    return dict(row._mapping) if row else None
+
+
+def apply_filters(query: Query, task_id: Optional[str] = None, queue_name: Optional[str] = None,
+                  success: Optional[bool] = None) -> Query:
+    """追加结果列表的过滤条件"""
+    if task_id:
+        query = query.filter(FunboostConsumeResult.task_id == task_id)
+    if queue_name:
+        query = query.filter(FunboostConsumeResult.queue_name == queue_name)
+    if success is not None:
+        query = query.filter(FunboostConsumeResult.success == success)
+    return query
+
+
+def list_query(db: Session, task_id: Optional[str] = None, queue_name: Optional[str] = None,
+               success: Optional[bool] = None) -> Query:
+    """
+    结果列表（及其总数）的查询
+
+    游标由 (insert_time, _id) 组成，而各数据库对 NULL 的排序位置不一致，没有 insert_time 的行不进入列表，
+    仍可以按 _id 查看详情、按条件导出
+    """
+    query = apply_filters(summary_query(db), task_id, queue_name, success)
+    return query.filter(FunboostConsumeResult.insert_time.isnot(None))
+
+
+def encode_cursor(insert_time: datetime, _id: str, direction: str) -> str:
+    """把 (insert_time, _id) 编码为不透明的游标字符串"""
+    raw = json.dumps([insert_time.isoformat(), _id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str, str]:
+    """解析游标，格式不正确时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        insert_time, _id, direction = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if direction not in (CURSOR_NEXT, CURSOR_PREV):
+            raise ValueError(direction)
+        return datetime.fromisoformat(insert_time), str(_id), direction
+    except Exception as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+
+
+def _page_cursors(rows: list, has_prev: bool, has_next: bool) -> Tuple[Optional[str], Optional[str]]:
+    if not rows:
+        return None, None
+    first, last = rows[0], rows[-1]
+    prev_cursor = encode_cursor(first.insert_time, first._id, CURSOR_PREV) if has_prev else None
+    next_cursor = encode_cursor(last.insert_time, last._id, CURSOR_NEXT) if has_next else None
+    return prev_cursor, next_cursor
+
+
+def fetch_page_by_offset(query: Query, page: int, size: int) -> Tuple[List, Optional[str], Optional[str]]:
+    """
+    传统 offset 分页，同时返回可切换到游标模式的 prev/next 游标
+
+    :return: (rows, prev_cursor, next_cursor)
+    """
+    rows = query.order_by(*NEWEST_FIRST).offset((page - 1) * size).limit(size + 1).all()
+    has_next = len(rows) > size
+    rows = rows[:size]
+    return (rows, *_page_cursors(rows, page > 1, has_next))
+
+
+def fetch_page_by_cursor(query: Query, cursor: str, size: int) -> Tuple[List, Optional[str], Optional[str]]:
+    """
+    基于 (insert_time, _id) 的 keyset 分页，无论翻到第几页都只扫描 size+1 行索引
+
+    :return: (rows, prev_cursor, next_cursor)
+    """
+    insert_time, _id, direction = decode_cursor(cursor)
+    if direction == CURSOR_NEXT:
+        # 先用 insert_time <= t 给出索引范围，再排除同一时间点里已经返回过的行
+        query = query.filter(and_(
+            FunboostConsumeResult.insert_time <= insert_time,
+            or_(FunboostConsumeResult.insert_time < insert_time, FunboostConsumeResult._id < _id),
+        )).order_by(*NEWEST_FIRST)
+    else:
+        query = query.filter(and_(
+            FunboostConsumeResult.insert_time >= insert_time,
+            or_(FunboostConsumeResult.insert_time > insert_time, FunboostConsumeResult._id > _id),
+        )).order_by(*OLDEST_FIRST)
+
+    rows = query.limit(size + 1).all()
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if direction == CURSOR_NEXT:
+        return (rows, *_page_cursors(rows, True, has_more))
+    # 向前翻页时按正序取出，再翻转回倒序
+    rows.reverse()
+    return (rows, *_page_cursors(rows, has_more, True))
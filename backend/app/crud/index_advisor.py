@@ -0,0 +1,101 @@
+"""
+结果表索引检查
+
+列出结果列表、统计接口会产生的过滤条件组合，对照数据库中 funboost_consume_results 实际存在的索引
+（而不是模型中声明的），标出没有可用索引、只能沿 insert_time 索引或全表逐行过滤的组合，并给出建议的索引。
+
+判断规则（与 MySQL/PostgreSQL/sqlite 的 B-Tree 索引一致）：索引从第一列开始连续命中等值条件的列数为前缀长度，
+其后紧跟 insert_time 时还能直接按时间排序/范围扫描。
+- ok：所有等值条件都在前缀中，且后面是 insert_time
+- partial：至少第一列命中，剩余条件在索引范围内逐行过滤
+- missing：没有任何索引以等值条件中的列开头，结果少时要沿 insert_time 索引扫完整张表
+"""
+from itertools import combinations
+from typing import List, Sequence
+
+from sqlalchemy import inspect
+
+from app.models.funboost_result import FunboostConsumeResult
+
+TABLE = FunboostConsumeResult.__tablename__
+
+# 建议索引时按区分度从高到低排列等值列
+SELECTIVITY_ORDER = ('task_id', 'function', 'queue_name', 'success')
+
+# (接口, 可能出现的等值过滤列, 排序/范围列)，见 funboost_result.apply_filters 和 result_stats._filtered
+QUERY_SOURCES = (
+    ('/funboost/results', ('task_id', 'queue_name', 'success'), 'insert_time'),
+    ('/funboost/stats', ('queue_name', 'function'), 'insert_time'),
+)
+
+
+def table_indexes(bind) -> List[dict]:
+    """数据库中结果表的主键和索引 [{'name': ..., 'columns': [...]}]"""
+    inspector = inspect(bind)
+    indexes = [{'name': index['name'], 'columns': list(index['column_names'])} for index in inspector.get_indexes(TABLE)]
+    primary = inspector.get_pk_constraint(TABLE)
+    if primary and primary.get('constrained_columns'):
+        indexes.insert(0, {'name': primary.get('name') or 'PRIMARY', 'columns': list(primary['constrained_columns'])})
+    return indexes
+
+
+def query_shapes() -> List[dict]:
+    shapes = []
+    for source, columns, order in QUERY_SOURCES:
+        for n in range(len(columns) + 1):
+            for equals in combinations(columns, n):
+                shapes.append({'source': source, 'equals': list(equals), 'order': order})
+    return shapes
+
+
+def evaluate(shape: dict, indexes: Sequence[dict]) -> dict:
+    equals, order = set(shape['equals']), shape['order']
+    best, best_score = None, (-1, False)
+    for index in indexes:
+        columns = index['columns']
+        prefix = 0
+        while prefix < len(columns) and columns[prefix] in equals:
+            prefix += 1
+        ordered = prefix < len(columns) and columns[prefix] == order
+        if (prefix, ordered) > best_score:
+            best, best_score = index, (prefix, ordered)
+    prefix, ordered = best_score
+    if prefix == len(equals) and ordered:
+        rating = 'ok'
+    elif prefix > 0:
+        rating = 'partial'
+    else:
+        rating = 'missing'
+    return dict(shape, rating=rating, index=best['name'] if best and (prefix or ordered) else None,
+                matched_columns=prefix)
+
+
+def suggested_index(shape: dict) -> List[str]:
+    """建议的索引列：区分度最高的等值列加排序列；没有等值条件时只需要排序列上的索引"""
+    if not shape['equals']:
+        return [shape['order']]
+    leading = min(shape['equals'], key=SELECTIVITY_ORDER.index)
+    return [leading, shape['order']]
+
+
+def advise(bind) -> dict:
+    """
+    返回 {'indexes': 现有索引, 'checks': 每个过滤组合的结果, 'suggestions': 建议新增的索引}；
+    只对 missing 的组合给出建议，同一个建议索引覆盖多个组合时合并
+    """
+    indexes = table_indexes(bind)
+    checks = [evaluate(shape, indexes) for shape in query_shapes()]
+    suggestions = {}
+    for check in checks:
+        if check['rating'] != 'missing':
+            continue
+        columns = suggested_index(check)
+        name = 'idx_' + '_'.join(columns)
+        suggestion = suggestions.setdefault(name, {
+            'name': name,
+            'columns': columns,
+            'ddl': f"CREATE INDEX {name} ON {TABLE} ({', '.join(columns)})",
+            'covers': [],
+        })
+        suggestion['covers'].append({'source': check['source'], 'equals': check['equals']})
+    return {'indexes': indexes, 'checks': checks, 'suggestions': list(suggestions.values())}
@@ -0,0 +1,188 @@
+"""
+消费结果总数统计
+
+- 按过滤条件 (task_id, queue_name, success) 缓存 COUNT 结果，带 TTL；缓存命中时 total_exact 为 False
+- 写入方通过 mark_results_written 递增 redis 中的队列写入版本号，各进程的缓存据此失效。只有
+  result_status_saver 的缓冲写入和保留期清理会递增版本号，funboost 自带的结果保存不会，这部分写入
+  最多要等 TTL 过期后才反映到计数中
+- 版本号表在进程内缓存 RESULTS_VERSION_CACHE_SECONDS 秒，由接口在进入 run_sync 前通过线程池刷新，
+  事件循环线程上不直接访问 redis
+- estimated 模式下，无过滤条件时直接读取表统计信息，不再做全索引扫描
+"""
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Query, Session
+
+from app.models.funboost_result import FunboostConsumeResult
+
+COUNT_MODE_EXACT = 'exact'
+COUNT_MODE_CACHED = 'cached'
+COUNT_MODE_ESTIMATED = 'estimated'
+COUNT_MODES = (COUNT_MODE_EXACT, COUNT_MODE_CACHED, COUNT_MODE_ESTIMATED)
+
+RESULTS_COUNT_CACHE_TTL = float(os.getenv('RESULTS_COUNT_CACHE_TTL', '30'))
+# result_status_saver 中有同名常量，修改时两处保持一致
+RESULTS_WRITE_VERSION_KEY = 'taskrun:results_write_version'
+RESULTS_VERSION_CACHE_SECONDS = float(os.getenv('RESULTS_VERSION_CACHE_SECONDS', '1'))
+
+CountKey = Tuple[Optional[str], Optional[str], Optional[bool]]
+
+
+def _redis():
+    from funboost.utils.redis_manager import RedisMixin
+    return RedisMixin().redis_db_frame
+
+
+def mark_results_written(queue_names: Iterable[str]):
+    """写入/删除结果行后调用，使所有进程中相关队列的计数缓存失效"""
+    queue_names = set(q for q in queue_names if q)
+    if not queue_names:
+        return
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for queue_name in queue_names:
+            pipe.hincrby(RESULTS_WRITE_VERSION_KEY, queue_name, 1)
+        pipe.execute()
+    except Exception:
+        # redis 不可用时退化为只依赖 TTL
+        pass
+
+
+class WriteVersions:
+    """进程内缓存的 redis 写入版本号表"""
+
+    def __init__(self, max_age: float = RESULTS_VERSION_CACHE_SECONDS):
+        self.max_age = max_age
+        self._versions: Optional[Dict[str, str]] = None
+        self._read_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> Optional[Dict[str, str]]:
+        """缓存过期时从 redis 重新读取；会阻塞，异步接口中应通过 run_in_threadpool 调用"""
+        if not force and time.monotonic() - self._read_at < self.max_age:
+            return self._versions
+        try:
+            versions = _redis().hgetall(RESULTS_WRITE_VERSION_KEY)
+        except Exception:
+            versions = None
+        with self._lock:
+            self._versions, self._read_at = versions, time.monotonic()
+        return versions
+
+    def cached(self) -> Optional[Dict[str, str]]:
+        """只读本地缓存，不访问 redis；从未刷新过时返回 None（此时只依赖 TTL）"""
+        with self._lock:
+            return self._versions
+
+
+write_versions = WriteVersions()
+
+
+class ResultCountCache:
+    """进程内的计数缓存"""
+
+    def __init__(self, ttl: float = RESULTS_COUNT_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[CountKey, Tuple[int, float, object]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read_versions() -> Optional[Dict[str, str]]:
+        return write_versions.cached()
+
+    @staticmethod
+    def _version_of(key: CountKey, versions: Optional[Dict]) -> object:
+        """无队列过滤时任何队列的写入都会影响总数，取整个版本表作为版本号"""
+        if versions is None:
+            return None
+        queue_name = key[1]
+        if queue_name:
+            return versions.get(queue_name) or versions.get(queue_name.encode())
+        return tuple(sorted(versions.items()))
+
+    def current_version(self, key: CountKey) -> object:
+        return self._version_of(key, self._read_versions())
+
+    def get(self, key: CountKey) -> Tuple[Optional[int], object]:
+        """返回 (缓存的总数或 None, 当前版本号)"""
+        version = self.current_version(key)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None, version
+        total, expire_at, cached_version = entry
+        if time.monotonic() >= expire_at or cached_version != version:
+            return None, version
+        return total, version
+
+    def set(self, key: CountKey, total: int, version: object):
+        with self._lock:
+            self._entries[key] = (total, time.monotonic() + self.ttl, version)
+
+    def invalidate(self, queue_name: Optional[str] = None):
+        """清除本进程缓存；指定 queue_name 时只清除该队列及无队列过滤的条目"""
+        with self._lock:
+            if queue_name is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[1] in (None, queue_name)]:
+                del self._entries[key]
+
+
+count_cache = ResultCountCache()
+estimate_cache = ResultCountCache()
+
+
+def estimate_table_rows(db: Session) -> Optional[int]:
+    """从数据库统计信息读取结果表的估算行数，不支持的数据库返回 None"""
+    table = FunboostConsumeResult.__tablename__
+    dialect = db.get_bind().dialect.name
+    try:
+        if dialect == 'mysql':
+            row = db.execute(text(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"), {'table': table}).first()
+        elif dialect == 'postgresql':
+            row = db.execute(text(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = :table"), {'table': table}).first()
+        else:
+            return None
+    except Exception:
+        return None
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def count_results(db: Session, query: Query, key: CountKey, mode: str = COUNT_MODE_CACHED) -> Tuple[int, bool]:
+    """
+    统计过滤后的结果总数
+
+    版本号只读本地缓存，调用前应先刷新 write_versions（见 /funboost/results）
+
+    :return: (total, total_exact)，total_exact 为 False 表示来自表统计信息的估算值或可能过期的缓存值
+    """
+    filtered = any(v is not None and v != '' for v in key)
+    if mode == COUNT_MODE_ESTIMATED and not filtered:
+        estimated, version = estimate_cache.get(key)
+        if estimated is None:
+            estimated = estimate_table_rows(db)
+            if estimated is not None:
+                estimate_cache.set(key, estimated, version)
+        if estimated is not None:
+            return estimated, False
+
+    if mode == COUNT_MODE_EXACT:
+        version = count_cache.current_version(key)
+    else:
+        total, version = count_cache.get(key)
+        if total is not None:
+            return total, False
+
+    total = query.order_by(None).count()
+    count_cache.set(key, total, version)
+    return total, True
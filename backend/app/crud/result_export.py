@@ -0,0 +1,100 @@
+"""
+消费结果的流式导出
+
+使用服务端游标（stream_results + yield_per）逐批读取，边读边编码为 NDJSON/CSV，
+可选 gzip 压缩，导出多少行内存占用都只有一个批次的大小。
+"""
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+
+from app.crud.funboost_result import OLDEST_FIRST, SUMMARY_COLUMNS, apply_filters
+from app.database import SessionLocal
+from app.models.funboost_result import FunboostConsumeResult
+
+EXPORT_FORMAT_NDJSON = 'ndjson'
+EXPORT_FORMAT_CSV = 'csv'
+EXPORT_YIELD_PER = int(os.getenv('EXPORT_YIELD_PER', '1000'))
+# 攒够这么多字节再输出一个 chunk，避免每行一次写入
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+FULL_COLUMNS = tuple(FunboostConsumeResult.__table__.columns)
+
+MEDIA_TYPES = {
+    EXPORT_FORMAT_NDJSON: 'application/x-ndjson',
+    EXPORT_FORMAT_CSV: 'text/csv; charset=utf-8',
+}
+
+
+def export_filename(fmt: str, compress: bool) -> str:
+    name = f"funboost_results_{datetime.now():%Y%m%d%H%M%S}.{fmt}"
+    return name + '.gz' if compress else name
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return '' if value is None else value
+
+
+def _encode_rows(rows: Iterator, keys: list, fmt: str) -> Iterator[str]:
+    if fmt == EXPORT_FORMAT_CSV:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(keys)
+        for row in rows:
+            writer.writerow([_csv_value(v) for v in row])
+            if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+        return
+
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(keys, row)), default=str, ensure_ascii=False)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= EXPORT_CHUNK_BYTES:
+            yield '\n'.join(lines) + '\n'
+            lines, size = [], 0
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def stream_export(fmt: str = EXPORT_FORMAT_NDJSON, compress: bool = False, full: bool = True,
+                  task_id: Optional[str] = None, queue_name: Optional[str] = None, success: Optional[bool] = None,
+                  start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[bytes]:
+    """
+    按 insert_time 正序导出匹配的结果，生成 bytes chunk 供 StreamingResponse 使用
+
+    生成器自己持有数据库会话，请求依赖注入的会话可能在响应流结束前就被关闭。
+    """
+    columns = FULL_COLUMNS if full else SUMMARY_COLUMNS
+    keys = [c.key for c in columns]
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    db = SessionLocal()
+    try:
+        query = apply_filters(db.query(*columns), task_id, queue_name, success)
+        if start:
+            query = query.filter(FunboostConsumeResult.insert_time >= start)
+        if end:
+            query = query.filter(FunboostConsumeResult.insert_time < end)
+        rows = query.order_by(*OLDEST_FIRST).execution_options(
+            stream_results=True, yield_per=EXPORT_YIELD_PER)
+        for text_chunk in _encode_rows(rows, keys, fmt):
+            data = text_chunk.encode('utf-8')
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor:
+            yield compressor.flush()
+    finally:
+        db.close()
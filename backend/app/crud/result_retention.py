@@ -0,0 +1,308 @@
+"""
+消费结果的保留期清理与归档
+
+- 每个队列可以设置各自的保留天数，过期结果按批先以 gzip 压缩的 NDJSON 写入归档目录，再删除
+- MySQL 下如果结果表按 insert_time 做了 RANGE COLUMNS 分区，会预建未来的按天分区，
+  并在所有队列都过期的分区上先归档再直接 DROP PARTITION
+- 归档文件按 <ARCHIVE_DIR>/<queue_name>/<YYYY-MM-DD>.<批次摘要>.ndjson.gz 组织，可以按队列、时间范围和 task_id 回查。
+  批次摘要由这一批结果的 _id 计算，删除前中断（写完归档但 DELETE/DROP 没有提交）后重跑时同一批结果覆盖同一个文件，
+  不会重复归档
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import Session
+
+from app.crud.result_count import mark_results_written
+from app.crud.result_stats import now_in_funboost_tz
+from app.models.funboost_result import FunboostConsumeResult
+
+# 默认保留天数，0 表示永久保留
+RESULTS_RETENTION_DAYS = int(os.getenv('RESULTS_RETENTION_DAYS', '0'))
+# 单独设置某些队列的保留天数，格式: queue_a=7,queue_b=90
+RESULTS_RETENTION_QUEUE_DAYS = os.getenv('RESULTS_RETENTION_QUEUE_DAYS', '')
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '1000'))
+# 分区表预建未来多少天的分区
+RETENTION_PARTITION_DAYS_AHEAD = int(os.getenv('RETENTION_PARTITION_DAYS_AHEAD', '7'))
+ARCHIVE_DIR = os.getenv('RESULTS_ARCHIVE_DIR', os.path.join(os.getenv('LOGS_DIR', '/app/logs'), 'archive'))
+
+TABLE_NAME = FunboostConsumeResult.__tablename__
+COLUMNS = [c.key for c in FunboostConsumeResult.__table__.columns]
+
+
+def parse_queue_retention(value: str = RESULTS_RETENTION_QUEUE_DAYS) -> Dict[str, int]:
+    result = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        queue_name, days = item.rsplit('=', 1)
+        if queue_name.strip():
+            result[queue_name.strip()] = int(days)
+    return result
+
+
+def retention_days_of(queue_name: Optional[str], overrides: Dict[str, int]) -> int:
+    return overrides.get(queue_name, RESULTS_RETENTION_DAYS) if queue_name else RESULTS_RETENTION_DAYS
+
+
+def _safe_name(name: Optional[str]) -> str:
+    name = re.sub(r'[\\/:*?"<>|\x00]', '_', name or '')
+    return name if name.strip('.') else '_'
+
+
+def archive_path(queue_name: Optional[str], day: date, ids: List[str]) -> str:
+    digest = hashlib.sha1('\n'.join(sorted(str(i) for i in ids)).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(ARCHIVE_DIR, _safe_name(queue_name), f'{day.isoformat()}.{digest}.ndjson.gz')
+
+
+def _row_to_dict(row) -> dict:
+    return {key: getattr(row, key) for key in COLUMNS}
+
+
+def write_archive(rows: List[dict]) -> int:
+    """
+    把一批结果按 (queue_name, 日期) 分组写入归档文件，返回写入的压缩字节数
+
+    先写临时文件并 fsync，再原子地替换为按 _id 摘要命名的文件，之后才删除对应的数据库行；
+    重跑同一批结果时覆盖原文件。
+    """
+    groups: Dict[Tuple[Optional[str], date], List[dict]] = {}
+    for row in rows:
+        day = row['insert_time'].date() if row.get('insert_time') else date(1970, 1, 1)
+        groups.setdefault((row.get('queue_name'), day), []).append(row)
+    written = 0
+    for (queue_name, day), items in groups.items():
+        path = archive_path(queue_name, day, [item['_id'] for item in items])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                    for item in items:
+                        f.write((json.dumps(item, default=str, ensure_ascii=False) + '\n').encode('utf-8'))
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        written += os.path.getsize(path)
+    return written
+
+
+def _after(insert_time: datetime, _id: str):
+    return and_(
+        FunboostConsumeResult.insert_time >= insert_time,
+        or_(FunboostConsumeResult.insert_time > insert_time, FunboostConsumeResult._id > _id),
+    )
+
+
+def archive_and_delete_queue(db: Session, queue_name: Optional[str], cutoff: datetime,
+                             batch_size: int = RETENTION_BATCH_SIZE) -> Tuple[int, int]:
+    """
+    把一个队列中 insert_time < cutoff 的结果按批归档并删除
+
+    :return: (删除行数, 归档字节数)
+    """
+    queue_filter = (FunboostConsumeResult.queue_name.is_(None) if queue_name is None
+                    else FunboostConsumeResult.queue_name == queue_name)
+    deleted = archived_bytes = 0
+    while True:
+        rows = db.query(FunboostConsumeResult).filter(
+            queue_filter, FunboostConsumeResult.insert_time < cutoff,
+        ).order_by(FunboostConsumeResult.insert_time, FunboostConsumeResult._id).limit(batch_size).all()
+        if not rows:
+            break
+        archived_bytes += write_archive([_row_to_dict(row) for row in rows])
+        ids = [row._id for row in rows]
+        db.query(FunboostConsumeResult).filter(FunboostConsumeResult._id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        db.expunge_all()
+        deleted += len(ids)
+    return deleted, archived_bytes
+
+
+def archive_range(db: Session, start: Optional[datetime], end: datetime,
+                  batch_size: int = RETENTION_BATCH_SIZE) -> Tuple[int, int, Set[str]]:
+    """只归档不删除 [start, end) 内的全部结果，用于 DROP PARTITION 之前；返回 (行数, 字节数, 涉及的队列名)"""
+    query = db.query(FunboostConsumeResult).filter(FunboostConsumeResult.insert_time < end)
+    if start is not None:
+        query = query.filter(FunboostConsumeResult.insert_time >= start)
+    query = query.order_by(FunboostConsumeResult.insert_time, FunboostConsumeResult._id)
+    count = archived_bytes = 0
+    queue_names = set()
+    last = None
+    while True:
+        rows = (query.filter(_after(*last)) if last else query).limit(batch_size).all()
+        if not rows:
+            break
+        archived_bytes += write_archive([_row_to_dict(row) for row in rows])
+        count += len(rows)
+        queue_names.update(row.queue_name for row in rows)
+        last = (rows[-1].insert_time, rows[-1]._id)
+        db.expunge_all()
+    return count, archived_bytes, queue_names
+
+
+def list_range_partitions(db: Session) -> List[dict]:
+    """读取 MySQL 上按 RANGE COLUMNS(insert_time) 划分的分区，未分区或其他数据库返回空列表"""
+    if db.get_bind().dialect.name != 'mysql':
+        return []
+    rows = db.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_METHOD, PARTITION_EXPRESSION, PARTITION_DESCRIPTION, "
+        "TABLE_ROWS, DATA_LENGTH + INDEX_LENGTH "
+        "FROM information_schema.PARTITIONS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+        "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION"), {'table': TABLE_NAME}).all()
+    partitions = []
+    for name, method, expression, description, table_rows, size in rows:
+        if method != 'RANGE COLUMNS' or 'insert_time' not in (expression or ''):
+            return []
+        upper = None
+        if description and description.upper() != 'MAXVALUE':
+            upper = datetime.fromisoformat(description.strip("'"))
+        partitions.append({'name': name, 'upper': upper, 'rows': int(table_rows or 0), 'bytes': int(size or 0)})
+    return partitions
+
+
+def ensure_future_partitions(db: Session, partitions: List[dict], today: date,
+                             days_ahead: int = RETENTION_PARTITION_DAYS_AHEAD) -> List[str]:
+    """从 MAXVALUE 分区中拆出未来 days_ahead 天的按天分区，返回新建的分区名"""
+    if not partitions or partitions[-1]['upper'] is not None:
+        return []
+    bounded = [p['upper'] for p in partitions if p['upper'] is not None]
+    next_upper = max(bounded) if bounded else datetime.combine(today, datetime.min.time())
+    target = datetime.combine(today + timedelta(days=days_ahead + 1), datetime.min.time())
+    new_parts = []
+    while next_upper < target:
+        next_upper += timedelta(days=1)
+        new_parts.append((f"p{(next_upper - timedelta(days=1)):%Y%m%d}", next_upper))
+    if not new_parts:
+        return []
+    definitions = ', '.join(f"PARTITION {name} VALUES LESS THAN ('{upper:%Y-%m-%d %H:%M:%S}')" for name, upper in new_parts)
+    maxvalue = partitions[-1]['name']
+    db.execute(text(f"ALTER TABLE {TABLE_NAME} REORGANIZE PARTITION {maxvalue} INTO "
+                    f"({definitions}, PARTITION {maxvalue} VALUES LESS THAN (MAXVALUE))"))
+    return [name for name, _ in new_parts]
+
+
+def drop_expired_partitions(db: Session, partitions: List[dict], cutoff: datetime) -> Tuple[List[str], int, int, int]:
+    """
+    归档并删除上界不晚于 cutoff 的分区（这些分区里的结果对所有队列都已过期）
+
+    :return: (删除的分区名, 行数, 归档字节数, 释放字节数)
+    """
+    dropped, rows, archived_bytes, reclaimed = [], 0, 0, 0
+    lower = None
+    for partition in partitions:
+        upper = partition['upper']
+        if upper is None or upper > cutoff:
+            break
+        count, size, queue_names = archive_range(db, lower, upper)
+        db.execute(text(f"ALTER TABLE {TABLE_NAME} DROP PARTITION {partition['name']}"))
+        # DDL 会隐式提交，删除后立即使这些队列的计数缓存失效
+        mark_results_written(queue_names)
+        dropped.append(partition['name'])
+        rows += count
+        archived_bytes += size
+        reclaimed += partition['bytes']
+        lower = upper
+    return dropped, rows, archived_bytes, reclaimed
+
+
+def _avg_row_length(db: Session) -> int:
+    if db.get_bind().dialect.name != 'mysql':
+        return 0
+    row = db.execute(text(
+        "SELECT AVG_ROW_LENGTH FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"), {'table': TABLE_NAME}).first()
+    return int(row[0] or 0) if row else 0
+
+
+def run_retention(db: Session, now: Optional[datetime] = None) -> dict:
+    """执行一轮保留期清理，返回本轮的统计报告"""
+    now = now or now_in_funboost_tz()
+    overrides = parse_queue_retention()
+    report = {
+        'started_at': now,
+        'rows_deleted': 0,
+        'archive_bytes': 0,
+        'reclaimed_bytes': 0,
+        'partitions_created': [],
+        'partitions_dropped': [],
+        'queues': {},
+    }
+    avg_row_length = _avg_row_length(db)
+
+    # 分区是整表共享的，只有所有队列都设置了保留期时才能整分区删除
+    partitions = list_range_partitions(db)
+    if partitions:
+        report['partitions_created'] = ensure_future_partitions(db, partitions, now.date())
+        windows = [RESULTS_RETENTION_DAYS, *overrides.values()]
+        if all(days > 0 for days in windows):
+            dropped, rows, archived_bytes, reclaimed = drop_expired_partitions(
+                db, partitions, now - timedelta(days=max(windows)))
+            report['partitions_dropped'] = dropped
+            report['rows_deleted'] += rows
+            report['archive_bytes'] += archived_bytes
+            report['reclaimed_bytes'] += reclaimed
+
+    queue_names = [q for (q,) in db.query(FunboostConsumeResult.queue_name).distinct().all()]
+    for queue_name in queue_names:
+        days = retention_days_of(queue_name, overrides)
+        if days <= 0:
+            continue
+        deleted, archived_bytes = archive_and_delete_queue(db, queue_name, now - timedelta(days=days))
+        if deleted:
+            report['queues'][queue_name or ''] = {'retention_days': days, 'rows_deleted': deleted}
+            report['rows_deleted'] += deleted
+            report['archive_bytes'] += archived_bytes
+            # 批量 DELETE 释放的空间按平均行长估算
+            report['reclaimed_bytes'] += deleted * avg_row_length
+
+    mark_results_written(report['queues'].keys())
+    report['finished_at'] = now_in_funboost_tz()
+    return report
+
+
+def _archive_days(start: Optional[datetime], end: Optional[datetime], name: str) -> bool:
+    try:
+        day = date.fromisoformat(name[:10])
+    except ValueError:
+        return False
+    return (start is None or day >= start.date()) and (end is None or day <= end.date())
+
+
+def iter_archived_results(queue_name: Optional[str] = None, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None, task_id: Optional[str] = None) -> Iterator[dict]:
+    """按队列、时间范围和 task_id 逐行扫描归档文件，只解压命中日期的文件"""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return
+    queue_dirs = [_safe_name(queue_name)] if queue_name else sorted(os.listdir(ARCHIVE_DIR))
+    for queue_dir in queue_dirs:
+        directory = os.path.join(ARCHIVE_DIR, queue_dir)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory), reverse=True):
+            if not name.endswith('.ndjson.gz') or not _archive_days(start, end, name):
+                continue
+            with gzip.open(os.path.join(directory, name), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if task_id and task_id not in line:
+                        continue
+                    row = json.loads(line)
+                    if task_id and row.get('task_id') != task_id:
+                        continue
+                    insert_time = row.get('insert_time')
+                    if insert_time and ((start and insert_time < start.isoformat(sep=' ')) or
+                                        (end and insert_time >= end.isoformat(sep=' '))):
+                        continue
+                    yield row
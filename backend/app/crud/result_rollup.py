@@ -0,0 +1,264 @@
+"""
+消费结果的增量聚合（rollup）
+
+把原始结果表按分钟折叠进 funboost_result_rollup_minute，再由分钟表汇总到 funboost_result_rollup_hour，
+维度为 queue_name/function/success/host_name。进度记录在 funboost_result_rollup_state.high_water，
+每次只处理 [high_water, 当前时间 - 宽限期) 之间的整分钟。
+
+每个批次先删除再重建批次覆盖的聚合行，并在同一事务内推进 high_water，重复执行结果不变。
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import Base, engine
+from app.models.funboost_result import FunboostConsumeResult
+from app.models.funboost_result_rollup import (
+    FunboostResultRollupHour,
+    FunboostResultRollupMinute,
+    FunboostResultRollupState,
+)
+from app.crud.result_stats import floor_to_bucket, now_in_funboost_tz
+
+ROLLUP_STATE_NAME = 'funboost_result_rollup'
+ROLLUP_ENABLED = os.getenv('ROLLUP_ENABLED', 'True').lower() == 'true'
+# 后台聚合任务的执行间隔（秒）
+ROLLUP_INTERVAL = float(os.getenv('ROLLUP_INTERVAL', '60'))
+# 原始结果写入存在延迟，只聚合早于 当前时间 - 宽限期 的整分钟
+ROLLUP_GRACE_SECONDS = int(os.getenv('ROLLUP_GRACE_SECONDS', '120'))
+# 每个事务最多处理的分钟数，首次回填历史数据时分批推进
+ROLLUP_BATCH_MINUTES = int(os.getenv('ROLLUP_BATCH_MINUTES', '60'))
+
+# time_cost 直方图边界：0 以及 1ms 起按 1.2 倍递增，最后一个桶上限约 23 小时，相对误差不超过 10%
+HIST_BOUNDS = np.concatenate(([0.0], 0.001 * 1.2 ** np.arange(100)))
+
+ROLLUP_TABLES = [
+    FunboostResultRollupMinute.__table__,
+    FunboostResultRollupHour.__table__,
+    FunboostResultRollupState.__table__,
+]
+
+GroupKey = Tuple[str, str, bool, str]
+
+
+def ensure_rollup_tables():
+    """聚合表由 TaskRun 自己维护，不存在时自动创建"""
+    Base.metadata.create_all(engine, tables=ROLLUP_TABLES)
+
+
+def hist_index(values: np.ndarray) -> np.ndarray:
+    return np.clip(np.searchsorted(HIST_BOUNDS, values, side='right') - 1, 0, len(HIST_BOUNDS) - 1)
+
+
+def merge_hist(target: Dict[str, int], hist: Optional[Dict]) -> Dict[str, int]:
+    for idx, count in (hist or {}).items():
+        target[str(idx)] = target.get(str(idx), 0) + int(count)
+    return target
+
+
+def hist_percentiles(hist: Dict[str, int], qs: Iterable[float], lower: Optional[float] = None,
+                     upper: Optional[float] = None) -> List[Optional[float]]:
+    """根据直方图估算分位数，在桶内线性插值，并用实际的最小/最大值收窄首尾桶"""
+    if not hist:
+        return [None for _ in qs]
+    indexes = np.array(sorted(int(i) for i in hist), dtype=np.int64)
+    counts = np.array([hist[str(i)] for i in indexes], dtype=float)
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1]
+    lows = HIST_BOUNDS[indexes]
+    highs = np.append(HIST_BOUNDS, np.inf)[indexes + 1]
+    if lower is not None:
+        lows = np.maximum(lows, lower)
+    if upper is not None:
+        highs = np.minimum(highs, upper)
+    highs = np.where(np.isfinite(highs), highs, lows)
+    result = []
+    for q in qs:
+        rank = q * total
+        pos = int(np.searchsorted(cumulative, rank, side='left'))
+        pos = min(pos, len(indexes) - 1)
+        before = cumulative[pos - 1] if pos else 0.0
+        frac = (rank - before) / counts[pos] if counts[pos] else 0.0
+        result.append(round(float(lows[pos] + (highs[pos] - lows[pos]) * min(max(frac, 0.0), 1.0)), 6))
+    return result
+
+
+def _accumulate(item: dict, row):
+    """把一行聚合数据累加到 item 上"""
+    item['executions'] += row.executions
+    item['time_cost_sum'] += row.time_cost_sum or 0.0
+    if row.time_cost_min is not None:
+        item['time_cost_min'] = row.time_cost_min if item['time_cost_min'] is None else min(item['time_cost_min'], row.time_cost_min)
+    if row.time_cost_max is not None:
+        item['time_cost_max'] = row.time_cost_max if item['time_cost_max'] is None else max(item['time_cost_max'], row.time_cost_max)
+    merge_hist(item['time_cost_hist'], row.time_cost_hist)
+
+
+def get_high_water(db: Session) -> Optional[datetime]:
+    state = db.get(FunboostResultRollupState, ROLLUP_STATE_NAME)
+    return state.high_water if state else None
+
+
+def _aggregate_minutes(db: Session, start: datetime, end: datetime) -> List[dict]:
+    """从原始结果表计算 [start, end) 内每分钟、每个维度组合的聚合行"""
+    rows = db.query(
+        FunboostConsumeResult.insert_time,
+        FunboostConsumeResult.queue_name,
+        FunboostConsumeResult.function,
+        FunboostConsumeResult.success,
+        FunboostConsumeResult.host_name,
+        FunboostConsumeResult.time_cost,
+    ).filter(
+        FunboostConsumeResult.insert_time >= start,
+        FunboostConsumeResult.insert_time < end,
+    ).all()
+    if not rows:
+        return []
+
+    insert_times, queues, functions, successes, hosts, costs = zip(*rows)
+    minutes = (np.array(insert_times, dtype='datetime64[m]') - np.datetime64('1970-01-01T00:00', 'm')).astype(np.int64)
+    group_index: Dict[Tuple[int, GroupKey], int] = {}
+    group_ids = np.fromiter(
+        (group_index.setdefault((m, (q or '', f or '', bool(s), h or '')), len(group_index))
+         for m, q, f, s, h in zip(minutes.tolist(), queues, functions, successes, hosts)),
+        dtype=np.int64, count=len(rows))
+    n_groups = len(group_index)
+
+    cost_values = np.array([np.nan if c is None else c for c in costs], dtype=float)
+    has_cost = ~np.isnan(cost_values)
+    executions = np.bincount(group_ids, minlength=n_groups)
+    cost_sum = np.bincount(group_ids[has_cost], weights=cost_values[has_cost], minlength=n_groups)
+    cost_min = np.full(n_groups, np.inf)
+    cost_max = np.full(n_groups, -np.inf)
+    np.minimum.at(cost_min, group_ids[has_cost], cost_values[has_cost])
+    np.maximum.at(cost_max, group_ids[has_cost], cost_values[has_cost])
+
+    # 直方图：把 (group, 桶序号) 压成一维后计数，只保留非零项
+    n_bins = len(HIST_BOUNDS)
+    flat = group_ids[has_cost] * n_bins + hist_index(cost_values[has_cost])
+    flat_ids, flat_counts = np.unique(flat, return_counts=True)
+    hists: List[Dict[str, int]] = [{} for _ in range(n_groups)]
+    for flat_id, count in zip(flat_ids.tolist(), flat_counts.tolist()):
+        hists[flat_id // n_bins][str(flat_id % n_bins)] = count
+
+    epoch = datetime(1970, 1, 1)
+    result = []
+    for (minute, (q, f, s, h)), gid in group_index.items():
+        result.append({
+            'bucket_start': epoch + timedelta(minutes=minute),
+            'queue_name': q,
+            'function': f,
+            'success': s,
+            'host_name': h,
+            'executions': int(executions[gid]),
+            'time_cost_sum': float(cost_sum[gid]),
+            'time_cost_min': float(cost_min[gid]) if np.isfinite(cost_min[gid]) else None,
+            'time_cost_max': float(cost_max[gid]) if np.isfinite(cost_max[gid]) else None,
+            'time_cost_hist': hists[gid],
+        })
+    return result
+
+
+def _rebuild_hours(db: Session, start: datetime, end: datetime):
+    """用分钟表重建 [start, end) 覆盖到的整小时聚合行"""
+    hour_start = floor_to_bucket(start, 60)
+    hour_end = floor_to_bucket(end - timedelta(microseconds=1), 60) + timedelta(hours=1)
+    minute_rows = db.query(FunboostResultRollupMinute).filter(
+        FunboostResultRollupMinute.bucket_start >= hour_start,
+        FunboostResultRollupMinute.bucket_start < hour_end,
+    ).all()
+
+    merged: Dict[Tuple[datetime, GroupKey], dict] = {}
+    for row in minute_rows:
+        key = (floor_to_bucket(row.bucket_start, 60), (row.queue_name, row.function, row.success, row.host_name))
+        item = merged.get(key)
+        if item is None:
+            item = merged[key] = {
+                'bucket_start': key[0], 'queue_name': row.queue_name, 'function': row.function,
+                'success': row.success, 'host_name': row.host_name, 'executions': 0, 'time_cost_sum': 0.0,
+                'time_cost_min': None, 'time_cost_max': None, 'time_cost_hist': {},
+            }
+        _accumulate(item, row)
+
+    db.query(FunboostResultRollupHour).filter(
+        FunboostResultRollupHour.bucket_start >= hour_start,
+        FunboostResultRollupHour.bucket_start < hour_end,
+    ).delete(synchronize_session=False)
+    if merged:
+        db.execute(FunboostResultRollupHour.__table__.insert(), list(merged.values()))
+
+
+def rollup_once(db: Session, now: Optional[datetime] = None) -> int:
+    """
+    把 high_water 之后、已过宽限期的整分钟折叠进聚合表，直到追平
+
+    :return: 本次处理的原始结果行数
+    """
+    now = now or now_in_funboost_tz()
+    safe_end = floor_to_bucket(now - timedelta(seconds=ROLLUP_GRACE_SECONDS), 1)
+    high_water = get_high_water(db)
+    if high_water is None:
+        # 首次运行从最早的一条结果开始回填，空表则直接从当前位置开始
+        oldest = db.query(func.min(FunboostConsumeResult.insert_time)).scalar()
+        high_water = floor_to_bucket(oldest, 1) if oldest else safe_end
+        db.merge(FunboostResultRollupState(name=ROLLUP_STATE_NAME, high_water=high_water, updated_at=datetime.now()))
+        db.commit()
+
+    processed = 0
+    while high_water < safe_end:
+        # 批次从下一条结果所在的分钟开始计算长度，长时间没有结果的空档一次跳过
+        next_time = db.query(func.min(FunboostConsumeResult.insert_time)).filter(
+            FunboostConsumeResult.insert_time >= high_water).scalar()
+        batch_from = max(high_water, floor_to_bucket(next_time, 1)) if next_time else safe_end
+        batch_end = min(batch_from + timedelta(minutes=ROLLUP_BATCH_MINUTES), safe_end)
+        minute_rows = _aggregate_minutes(db, high_water, batch_end)
+        db.query(FunboostResultRollupMinute).filter(
+            FunboostResultRollupMinute.bucket_start >= high_water,
+            FunboostResultRollupMinute.bucket_start < batch_end,
+        ).delete(synchronize_session=False)
+        if minute_rows:
+            db.execute(FunboostResultRollupMinute.__table__.insert(), minute_rows)
+        db.flush()
+        _rebuild_hours(db, high_water, batch_end)
+        db.merge(FunboostResultRollupState(name=ROLLUP_STATE_NAME, high_water=batch_end, updated_at=datetime.now()))
+        db.commit()
+        processed += sum(row['executions'] for row in minute_rows)
+        high_water = batch_end
+    return processed
+
+
+def query_rollup_buckets(db: Session, queue_name: Optional[str], function: Optional[str], bucket_minutes: int,
+                         start: datetime, end: datetime, qs: Iterable[float]) -> Dict[datetime, Dict[Tuple[str, str], dict]]:
+    """
+    从聚合表读取 [start, end) 的时间桶数据，返回结构与 result_stats 中原始表计算结果一致
+
+    bucket_minutes 为 60 的整数倍时读小时表，否则读分钟表；分位数由直方图估算。
+    """
+    table = FunboostResultRollupHour if bucket_minutes % 60 == 0 else FunboostResultRollupMinute
+    query = db.query(table).filter(table.bucket_start >= start, table.bucket_start < end)
+    if queue_name:
+        query = query.filter(table.queue_name == queue_name)
+    if function:
+        query = query.filter(table.function == function)
+
+    buckets: Dict[datetime, Dict[Tuple[str, str], dict]] = {}
+    for row in query.all():
+        bucket_start = floor_to_bucket(row.bucket_start, bucket_minutes)
+        point = buckets.setdefault(bucket_start, {}).setdefault((row.queue_name, row.function), {
+            'executions': 0, 'failures': 0, 'time_cost_sum': 0.0,
+            'time_cost_min': None, 'time_cost_max': None, 'time_cost_hist': {},
+        })
+        _accumulate(point, row)
+        if not row.success:
+            point['failures'] += row.executions
+
+    qs = list(qs)
+    for points in buckets.values():
+        for point in points.values():
+            values = hist_percentiles(point.pop('time_cost_hist'), qs, point.pop('time_cost_min'), point.pop('time_cost_max'))
+            point.update({f'p{int(q * 100)}': v for q, v in zip(qs, values)})
+    return buckets
@@ -0,0 +1,239 @@
+"""
+消费结果的分时统计：按队列/函数、按时间桶计算执行次数、失败率和 time_cost 分位数
+
+- rollup 的 high_water 之前的时间桶直接读聚合表（见 result_rollup），分位数由直方图估算
+- 之后的部分查原始表：执行次数、失败次数、耗时总和在 SQL 中 GROUP BY 计算
+- 分位数需要原始耗时，取出 (insert_time, queue_name, function, time_cost) 后用 NumPy 分组向量化计算
+- 已经结束的时间桶结果不会再变化，缓存后不再重复计算
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy import case, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.models.funboost_result import FunboostConsumeResult
+from funboost_config import FunboostCommonConfig
+
+PERCENTILES = (0.5, 0.95, 0.99)
+# 时间桶结束后再等待的秒数，消费者写入结果存在少量延迟，过了这段时间才认为桶已关闭
+STATS_CLOSED_BUCKET_GRACE = int(os.getenv('STATS_CLOSED_BUCKET_GRACE', '120'))
+STATS_CACHE_MAX_BUCKETS = int(os.getenv('STATS_CACHE_MAX_BUCKETS', '20000'))
+STATS_MAX_BUCKETS_PER_QUERY = 2000
+
+_EPOCH = datetime(1970, 1, 1)
+SeriesKey = Tuple[Optional[str], Optional[str]]
+BucketKey = Tuple[Optional[str], Optional[str], int, datetime]
+
+
+def now_in_funboost_tz() -> datetime:
+    """funboost 按 FunboostCommonConfig.TIMEZONE 写入不带时区的 insert_time，这里取同一时区的当前时间"""
+    return datetime.now(ZoneInfo(FunboostCommonConfig.TIMEZONE)).replace(tzinfo=None)
+
+
+def floor_to_bucket(dt: datetime, bucket_minutes: int) -> datetime:
+    minutes = int((dt - _EPOCH).total_seconds() // 60)
+    return _EPOCH + timedelta(minutes=minutes - minutes % bucket_minutes)
+
+
+def grouped_percentiles(group_ids: np.ndarray, values: np.ndarray, qs=PERCENTILES) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按 group_ids 分组计算 values 的分位数（线性插值，与 np.percentile 默认一致）
+
+    :return: (unique_group_ids, shape 为 (组数, len(qs)) 的分位数矩阵)
+    """
+    order = np.lexsort((values, group_ids))
+    sorted_groups, sorted_values = group_ids[order], values[order]
+    unique_groups, starts, counts = np.unique(sorted_groups, return_index=True, return_counts=True)
+    pos = (counts[:, None] - 1) * np.asarray(qs, dtype=float)[None, :]
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    v_lo = sorted_values[starts[:, None] + lo]
+    v_hi = sorted_values[starts[:, None] + hi]
+    return unique_groups, v_lo + (v_hi - v_lo) * (pos - lo)
+
+
+class StatsBucketCache:
+    """已关闭时间桶的统计结果缓存，超过容量时淘汰最早写入的桶"""
+
+    def __init__(self, max_buckets: int = STATS_CACHE_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[BucketKey, Dict[SeriesKey, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: BucketKey) -> Optional[Dict[SeriesKey, dict]]:
+        with self._lock:
+            return self._buckets.get(key)
+
+    def put(self, key: BucketKey, points: Dict[SeriesKey, dict]):
+        with self._lock:
+            self._buckets[key] = points
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+stats_cache = StatsBucketCache()
+
+
+def _filtered(query, queue_name: Optional[str], function: Optional[str], start: datetime, end: datetime):
+    query = query.filter(FunboostConsumeResult.insert_time >= start, FunboostConsumeResult.insert_time < end)
+    if queue_name:
+        query = query.filter(FunboostConsumeResult.queue_name == queue_name)
+    if function:
+        query = query.filter(FunboostConsumeResult.function == function)
+    return query
+
+
+def _compute_buckets(db: Session, queue_name: Optional[str], function: Optional[str], bucket_minutes: int,
+                     start: datetime, end: datetime) -> Dict[datetime, Dict[SeriesKey, dict]]:
+    """从原始结果表计算 [start, end) 内每个时间桶、每个 (queue_name, function) 的统计值"""
+    buckets: Dict[datetime, Dict[SeriesKey, dict]] = {}
+
+    # 1. 次数、失败数、耗时总和：按分钟在 SQL 中聚合，再在内存中合并到时间桶
+    count_rows = _filtered(db.query(
+        FunboostConsumeResult.insert_minutes,
+        FunboostConsumeResult.queue_name,
+        FunboostConsumeResult.function,
+        func.count(),
+        func.sum(case((FunboostConsumeResult.success == False, 1), else_=0)),  # noqa: E712
+        func.sum(FunboostConsumeResult.time_cost),
+    ), queue_name, function, start, end).group_by(
+        FunboostConsumeResult.insert_minutes, FunboostConsumeResult.queue_name, FunboostConsumeResult.function,
+    ).all()
+    for minute_str, q, f, executions, failures, time_cost_sum in count_rows:
+        try:
+            bucket_start = floor_to_bucket(datetime.strptime(minute_str, '%Y-%m-%d %H:%M'), bucket_minutes)
+        except (TypeError, ValueError):
+            continue
+        point = buckets.setdefault(bucket_start, {}).setdefault((q, f), {
+            'executions': 0, 'failures': 0, 'time_cost_sum': 0.0,
+        })
+        point['executions'] += executions
+        point['failures'] += int(failures or 0)
+        point['time_cost_sum'] += float(time_cost_sum or 0)
+
+    # 2. 分位数：只取 4 个标量列，用 NumPy 按 (series, bucket) 分组计算
+    cost_rows = _filtered(db.query(
+        FunboostConsumeResult.insert_time,
+        FunboostConsumeResult.queue_name,
+        FunboostConsumeResult.function,
+        FunboostConsumeResult.time_cost,
+    ), queue_name, function, start, end).filter(FunboostConsumeResult.time_cost.isnot(None)).all()
+    if cost_rows:
+        insert_times, queues, functions, costs = zip(*cost_rows)
+        minutes = (np.array(insert_times, dtype='datetime64[m]') - np.datetime64(_EPOCH, 'm')).astype(np.int64)
+        bucket_ids = minutes // bucket_minutes
+        series_index: Dict[SeriesKey, int] = {}
+        series_ids = np.fromiter((series_index.setdefault(key, len(series_index)) for key in zip(queues, functions)),
+                                 dtype=np.int64, count=len(cost_rows))
+        series_list = list(series_index)
+        bucket_base = bucket_ids.min()
+        span = int(bucket_ids.max() - bucket_base) + 1
+        group_ids = series_ids * span + (bucket_ids - bucket_base)
+        groups, values = grouped_percentiles(group_ids, np.asarray(costs, dtype=float))
+        for group, row in zip(groups.tolist(), values.tolist()):
+            series_key = series_list[group // span]
+            bucket_start = _EPOCH + timedelta(minutes=int(bucket_base + group % span) * bucket_minutes)
+            point = buckets.setdefault(bucket_start, {}).get(series_key)
+            if point is not None:
+                point.update({f'p{int(qv * 100)}': round(v, 6) for qv, v in zip(PERCENTILES, row)})
+    return buckets
+
+
+def _rollup_high_water(db: Session, result_rollup) -> Optional[datetime]:
+    if not result_rollup.ROLLUP_ENABLED:
+        return None
+    try:
+        return result_rollup.get_high_water(db)
+    except SQLAlchemyError:
+        db.rollback()
+        return None
+
+
+def _finish_point(point: dict, bucket_minutes: int) -> dict:
+    executions = point['executions']
+    return {
+        'executions': executions,
+        'failures': point['failures'],
+        'executions_per_minute': round(executions / bucket_minutes, 4),
+        'failure_rate': round(point['failures'] / executions, 4) if executions else 0.0,
+        'avg_time_cost': round(point['time_cost_sum'] / executions, 6) if executions else None,
+        **{f'p{int(q * 100)}': point.get(f'p{int(q * 100)}') for q in PERCENTILES},
+    }
+
+
+def get_result_stats(db: Session, start: datetime, end: datetime, bucket_minutes: int = 1,
+                     queue_name: Optional[str] = None, function: Optional[str] = None) -> dict:
+    """
+    返回 [start, end) 范围内按时间桶划分的各队列/函数统计序列
+
+    已关闭的桶从缓存读取；只对第一个未缓存的桶到 end 之间的范围查询数据库。
+    """
+    first_bucket = floor_to_bucket(start, bucket_minutes)
+    step = timedelta(minutes=bucket_minutes)
+    bucket_count = max(0, -(-(end - first_bucket) // step))
+    if bucket_count > STATS_MAX_BUCKETS_PER_QUERY:
+        raise ValueError(f"时间桶数量过多({bucket_count})，请缩小时间范围或增大 bucket_minutes")
+    bucket_starts = [first_bucket + step * i for i in range(bucket_count)]
+
+    closed_before = now_in_funboost_tz() - timedelta(seconds=STATS_CLOSED_BUCKET_GRACE)
+    per_bucket: Dict[datetime, Dict[SeriesKey, dict]] = {}
+    missing_from = None
+    for bucket_start in bucket_starts:
+        cached = stats_cache.get((queue_name, function, bucket_minutes, bucket_start))
+        if cached is None:
+            missing_from = bucket_start
+            break
+        per_bucket[bucket_start] = cached
+
+    if missing_from is not None:
+        # result_rollup 依赖本模块的时间工具函数，这里延迟导入避免循环引用
+        from app.crud import result_rollup
+
+        range_end = bucket_starts[-1] + step
+        rollup_end = missing_from
+        high_water = _rollup_high_water(db, result_rollup)
+        if high_water is not None and high_water > missing_from:
+            # 只有完全早于 high_water 的时间桶才能从聚合表读取
+            rollup_end = max(missing_from, floor_to_bucket(min(high_water, range_end), bucket_minutes))
+        computed = {}
+        if rollup_end > missing_from:
+            computed.update(result_rollup.query_rollup_buckets(
+                db, queue_name, function, bucket_minutes, missing_from, rollup_end, PERCENTILES))
+        if rollup_end < range_end:
+            computed.update(_compute_buckets(db, queue_name, function, bucket_minutes, rollup_end, range_end))
+        for bucket_start in bucket_starts:
+            if bucket_start < missing_from:
+                continue
+            points = computed.get(bucket_start, {})
+            per_bucket[bucket_start] = points
+            if bucket_start + step <= closed_before:
+                stats_cache.put((queue_name, function, bucket_minutes, bucket_start), points)
+
+    series: Dict[SeriesKey, List[dict]] = {}
+    for bucket_start in bucket_starts:
+        for series_key, point in per_bucket[bucket_start].items():
+            series.setdefault(series_key, []).append({
+                'bucket_start': bucket_start,
+                **_finish_point(point, bucket_minutes),
+            })
+
+    return {
+        'start': first_bucket,
+        'end': bucket_starts[-1] + step if bucket_starts else first_bucket,
+        'bucket_minutes': bucket_minutes,
+        'series': [
+            {'queue_name': q, 'function': f, 'points': points}
+            for (q, f), points in sorted(series.items(), key=lambda item: (str(item[0][0]), str(item[0][1])))
+        ],
+    }
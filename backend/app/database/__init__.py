@@ -1,14 +1,51 @@
 # Database connection and session management
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from funboost_config import BrokerConnConfig
 
+# 同步驱动 -> 异步驱动
+ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def to_async_url(url: str) -> str:
+    """把同步连接地址换成对应的异步驱动，已经是异步驱动或不认识的数据库原样返回"""
+    url_obj = make_url(url)
+    backend = url_obj.get_backend_name()
+    if backend not in ASYNC_DRIVERS or url_obj.drivername == ASYNC_DRIVERS[backend]:
+        return url
+    return url_obj.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def engine_options(url: str) -> dict:
+    """连接池参数；sqlite（本地开发用）由驱动自行选择 NullPool/SingletonThreadPool，不接受连接池大小参数"""
+    options = {
+        'echo': BrokerConnConfig.SQLACHEMY_ECHO,
+        'pool_pre_ping': BrokerConnConfig.SQLACHEMY_POOL_PRE_PING,
+        'pool_recycle': BrokerConnConfig.SQLACHEMY_POOL_RECYCLE,
+    }
+    if make_url(url).get_backend_name() != 'sqlite':
+        options.update(pool_size=BrokerConnConfig.SQLACHEMY_POOL_SIZE,
+                       max_overflow=BrokerConnConfig.SQLACHEMY_MAX_OVERFLOW)
+    return options
+
+
 # Create engine
-engine = create_engine(BrokerConnConfig.SQLACHEMY_ENGINE_URL, echo=True)
+engine = create_engine(BrokerConnConfig.SQLACHEMY_ENGINE_URL, **engine_options(BrokerConnConfig.SQLACHEMY_ENGINE_URL))
+
+# 结果查询等接口使用异步引擎，等待数据库时不占用线程池中的线程
+ASYNC_ENGINE_URL = BrokerConnConfig.SQLACHEMY_ASYNC_ENGINE_URL or to_async_url(BrokerConnConfig.SQLACHEMY_ENGINE_URL)
+async_engine = create_async_engine(ASYNC_ENGINE_URL, **engine_options(ASYNC_ENGINE_URL))
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Create Base class
 Base = declarative_base()
@@ -19,4 +56,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,4 +1,5 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 import logging
 from fastapi.staticfiles import StaticFiles
@@ -9,8 +10,36 @@ from app.routers.auth import router as auth_router
 from app.routers.funboost import router as funboost_router
 from app.routers.system import router as system_router
 from app.routers.files import router as files_router
+from app.crud.result_rollup import ROLLUP_ENABLED
+from app.services.rollup_worker import rollup_worker
+from app.services.retention_worker import retention_worker, retention_configured
+from app.services.process_supervisor import supervisor
+from app.services.metrics import setup_metrics
+from app.services.slow_query import setup_slow_query_log
+from app.database import engine, async_engine
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 后台把消费结果折叠进聚合表，统计接口优先读取聚合表
+    if ROLLUP_ENABLED:
+        rollup_worker.start()
+    # 配置了保留天数时定期归档并清理过期结果
+    if retention_configured():
+        retention_worker.start()
+    yield
+    rollup_worker.stop()
+    retention_worker.stop()
+    # 服务退出（如重新部署）时优雅停止 taskrunner，等待正在执行的任务完成
+    supervisor.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# 请求耗时、SQL 耗时等 Prometheus 指标，见 /api/metrics
+setup_metrics(app, {'sync': engine, 'async': async_engine})
+# 超过 SLOW_QUERY_MS 的查询连同参数和 EXPLAIN 记录到 /api/db/slow-queries
+setup_slow_query_log(engine, async_engine)
 
 # Include routers
 app.include_router(auth_router, prefix="/api")
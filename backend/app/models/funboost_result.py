@@ -1,8 +1,14 @@
-from sqlalchemy import Column, String, DateTime, Float, Integer, BigInteger, Text, Boolean, JSON
+from sqlalchemy import Column, String, DateTime, Float, Integer, BigInteger, Text, Boolean, JSON, Index
 from app.database import Base
 
 class FunboostConsumeResult(Base):
     __tablename__ = 'funboost_consume_results'
+    # 与 DEV-README.md 中的建表语句保持一致
+    __table_args__ = (
+        Index('idx_insert_time', 'insert_time'),
+        Index('idx_queue_name_insert_time', 'queue_name', 'insert_time'),
+        Index('idx_params_str', 'params_str'),
+    )
 
     _id = Column(String(255), primary_key=True, nullable=False)
     function = Column(String(255))
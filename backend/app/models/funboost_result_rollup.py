@@ -0,0 +1,42 @@
+from sqlalchemy import Column, String, DateTime, Float, Integer, BigInteger, Boolean, JSON, Index
+from app.database import Base
+
+
+class _RollupColumns:
+    """分钟/小时聚合表的公共列，维度为 queue_name/function/success/host_name"""
+    # sqlite 只有 INTEGER PRIMARY KEY 才会自增
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    bucket_start = Column(DateTime, nullable=False)
+    queue_name = Column(String(255), nullable=False, default='')
+    function = Column(String(255), nullable=False, default='')
+    success = Column(Boolean, nullable=False)
+    host_name = Column(String(255), nullable=False, default='')
+    executions = Column(BigInteger, nullable=False, default=0)
+    time_cost_sum = Column(Float, nullable=False, default=0)
+    time_cost_min = Column(Float)
+    time_cost_max = Column(Float)
+    # time_cost 稀疏直方图 {桶序号: 次数}，桶边界见 crud.result_rollup.HIST_BOUNDS
+    time_cost_hist = Column(JSON)
+
+
+class FunboostResultRollupMinute(_RollupColumns, Base):
+    __tablename__ = 'funboost_result_rollup_minute'
+    __table_args__ = (
+        Index('idx_rollup_minute_bucket_queue', 'bucket_start', 'queue_name'),
+    )
+
+
+class FunboostResultRollupHour(_RollupColumns, Base):
+    __tablename__ = 'funboost_result_rollup_hour'
+    __table_args__ = (
+        Index('idx_rollup_hour_bucket_queue', 'bucket_start', 'queue_name'),
+    )
+
+
+class FunboostResultRollupState(Base):
+    """聚合任务的进度，high_water 之前的原始结果都已折叠进聚合表"""
+    __tablename__ = 'funboost_result_rollup_state'
+
+    name = Column(String(64), primary_key=True)
+    high_water = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime)
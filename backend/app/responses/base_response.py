@@ -1,6 +1,5 @@
 from typing import Any, Optional, List
 from pydantic import BaseModel
-from app.schemas.funboost_result import FunboostResult
 
 
 class BaseResponse(BaseModel):
@@ -11,8 +10,12 @@ class BaseResponse(BaseModel):
 
 
 class PaginatedResponse(BaseModel):
-    data: List[FunboostResult]
+    # 列表直接返回字典行（见 crud.funboost_result.SUMMARY_COLUMNS），避免逐行模型校验
+    data: List[Any]
     total: int
     page: int
     size: int
-    total_pages: int
\ No newline at end of file
+    total_pages: int
+    total_exact: bool = True
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
\ No newline at end of file
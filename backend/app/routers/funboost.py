@@ -1,13 +1,23 @@
 from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Optional
-from app.database import get_db
-from app.models.funboost_result import FunboostConsumeResult
+from typing import Literal, Optional
+from datetime import datetime, timedelta
+import threading
+from app.database import get_async_db, get_db
 from app.responses.base_response import PaginatedResponse
 from app.schemas.funboost_result import FunboostResult
 from app.dependencies.auth import verify_token
-from app.dependencies import success_response
+from app.dependencies import success_response, error_response
+from app.crud import funboost_result as crud
+from app.crud.result_count import count_results, write_versions
+from app.crud.result_stats import get_result_stats, now_in_funboost_tz
+from app.crud import result_retention
+from app.crud import result_export
+from app.services.retention_worker import retention_worker
+from app.services.log_spool import get_spool
 from funboost.faas import fastapi_router as fb_router
 
 router = APIRouter()
@@ -17,30 +27,197 @@ Funboost Faas 相关接口路由
 router.include_router(fb_router, dependencies=[Depends(verify_token)])
 
 @router.get("/funboost/results")
-def get_funboost_results(
+async def get_funboost_results(
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=100),
     task_id: Optional[str] = None,
     queue_name: Optional[str] = None,
     success: Optional[bool] = None,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    count_mode: Literal['exact', 'cached', 'estimated'] = 'cached',
+    db: AsyncSession = Depends(get_async_db),
     _: dict = Depends(verify_token)
 ):
-    query = db.query(FunboostConsumeResult)
-    if task_id:
-        query = query.filter(FunboostConsumeResult.task_id == task_id)
-    if queue_name:
-        query = query.filter(FunboostConsumeResult.queue_name == queue_name)
-    if success is not None:
-        query = query.filter(FunboostConsumeResult.success == success)
+    """
+    分页查询消费结果，按插入时间倒序
+
+    列表只返回 SUMMARY_COLUMNS 中的标量列，参数、结果、异常堆栈等大字段通过
+    /funboost/results/{_id} 按需获取。
+
+    传入 cursor（上一页返回的 next_cursor / prev_cursor）时使用 keyset 分页，
+    深翻页不再需要扫描并丢弃前面的所有行；page 仅用于前端展示页码。
 
-    total = query.count()
-    results = query.offset((page - 1) * size).limit(size).all()
+    count_mode 控制总数的计算方式：exact 每次 COUNT；cached 在 TTL 内复用缓存的 COUNT（命中缓存时
+    total_exact 为 False）；estimated 在无过滤条件时读取表统计信息（此时 total_exact 为 False）。
+    """
+    def query_page(sync_db: Session):
+        query = crud.list_query(sync_db, task_id, queue_name, success)
+        total, total_exact = count_results(sync_db, query, (task_id or None, queue_name or None, success), count_mode)
+        if cursor:
+            page_rows = crud.fetch_page_by_cursor(query, cursor, size)
+        else:
+            page_rows = crud.fetch_page_by_offset(query, page, size)
+        return (total, total_exact, *page_rows)
+
+    # 计数缓存的 redis 版本号在线程池中刷新，run_sync 中的代码跑在事件循环线程上，不能等待 redis
+    await run_in_threadpool(write_versions.refresh)
+    # crud 使用同步的 Query 接口，run_sync 让它跑在异步连接上，等待数据库时不阻塞事件循环
+    try:
+        total, total_exact, results, prev_cursor, next_cursor = await db.run_sync(query_page)
+    except ValueError as e:
+        return error_response(msg=str(e))
 
     return success_response(data=PaginatedResponse(
-        data=[FunboostResult.model_validate(result) for result in results],
+        data=crud.rows_to_dicts(results),
         total=total,
         page=page,
         size=size,
-        total_pages=(total + size - 1) // size
-    ))
\ No newline at end of file
+        total_pages=(total + size - 1) // size,
+        total_exact=total_exact,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor
+    ))
+
+
+# 需要在 /funboost/results/{_id} 之前注册，否则 export 会被当作 _id
+@router.get("/funboost/results/export")
+def export_funboost_results(
+    format: Literal['ndjson', 'csv'] = 'ndjson',
+    gzip: bool = False,
+    full: bool = True,
+    task_id: Optional[str] = None,
+    queue_name: Optional[str] = None,
+    success: Optional[bool] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    _: dict = Depends(verify_token)
+):
+    """
+    以 NDJSON 或 CSV 流式导出消费结果，按插入时间正序
+
+    过滤条件与 /funboost/results 相同，另外支持 [start, end) 时间范围；full=False 时只导出
+    SUMMARY_COLUMNS 中的标量列；gzip=True 时返回 .gz 压缩文件。
+    """
+    if start and end and start >= end:
+        return error_response(msg="start 必须早于 end")
+    filename = result_export.export_filename(format, gzip)
+    return StreamingResponse(
+        result_export.stream_export(format, gzip, full, task_id, queue_name, success, start, end),
+        media_type='application/gzip' if gzip else result_export.MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/funboost/stats")
+def get_funboost_stats(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket_minutes: int = Query(1, ge=1, le=1440),
+    queue_name: Optional[str] = None,
+    function: Optional[str] = None,
+    db: Session = Depends(get_db),
+    _: dict = Depends(verify_token)
+):
+    """
+    按队列/函数返回分时统计序列：每个时间桶的执行次数、每分钟执行数、失败率、
+    平均耗时以及 time_cost 的 p50/p95/p99
+
+    start/end 与 insert_time 一样使用 funboost 配置的时区，默认统计最近 1 小时。
+    """
+    end = end or now_in_funboost_tz()
+    start = start or end - timedelta(hours=1)
+    if start >= end:
+        return error_response(msg="start 必须早于 end")
+    try:
+        stats = get_result_stats(db, start, end, bucket_minutes, queue_name, function)
+    except ValueError as e:
+        return error_response(msg=str(e))
+    return success_response(data=stats)
+
+
+@router.get("/funboost/retention")
+def get_retention_status(_: dict = Depends(verify_token)):
+    """
+    返回保留期配置和最近一轮清理的报告（删除行数、归档字节数、估算释放字节数、分区变化）
+    """
+    return success_response(data={
+        'default_days': result_retention.RESULTS_RETENTION_DAYS,
+        'queue_days': result_retention.parse_queue_retention(),
+        'archive_dir': result_retention.ARCHIVE_DIR,
+        'running': retention_worker.running,
+        'last_report': retention_worker.last_report,
+        'last_error': retention_worker.last_error,
+    })
+
+
+@router.post("/funboost/retention/run")
+def run_retention(_: dict = Depends(verify_token)):
+    """
+    立即在后台执行一轮保留期清理，结果通过 GET /funboost/retention 查看
+    """
+    if retention_worker.running:
+        return error_response(msg="保留期清理正在执行")
+
+    def run():
+        try:
+            retention_worker.run_once()
+        except Exception:
+            pass
+
+    threading.Thread(target=run, daemon=True).start()
+    return success_response(msg="保留期清理已开始")
+
+
+@router.get("/funboost/archive/results")
+def get_archived_results(
+    queue_name: Optional[str] = None,
+    task_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    _: dict = Depends(verify_token)
+):
+    """
+    从归档文件中查询已被清理的历史结果，建议指定 queue_name 和时间范围以减少扫描的文件
+    """
+    rows = []
+    for row in result_retention.iter_archived_results(queue_name, start, end, task_id):
+        rows.append(row)
+        if len(rows) >= limit:
+            break
+    return success_response(data=rows)
+
+
+@router.get("/funboost/results/{task_id}/logs")
+async def get_task_logs(
+    task_id: str,
+    limit: int = Query(2000, ge=1, le=20000),
+    db: AsyncSession = Depends(get_async_db),
+    _: dict = Depends(verify_token)
+):
+    """
+    按 task_id 返回运行进程输出中属于该任务的日志行，以及该任务在结果表中的记录
+
+    日志行来自进程日志落盘的 task_id 索引，不需要扫描整个日志文件。
+    """
+    result = await db.run_sync(crud.get_result_summary_by_task_id, task_id)
+    spool = get_spool('process')
+    if spool is None:
+        return error_response(msg="日志落盘未启用或日志目录不可用")
+    logs = await run_in_threadpool(spool.task_lines, task_id, limit)
+    return success_response(data={'result': result, **logs})
+
+
+@router.get("/funboost/results/{_id}")
+async def get_funboost_result_detail(
+    _id: str,
+    db: AsyncSession = Depends(get_async_db),
+    _: dict = Depends(verify_token)
+):
+    """
+    查询单条消费结果的完整内容（包括 msg_dict、params、result、exception 等大字段）
+    """
+    result = await db.run_sync(crud.get_result_detail, _id)
+    if result is None:
+        return error_response(msg="结果不存在", code=404)
+    return success_response(data=FunboostResult.model_validate(result))
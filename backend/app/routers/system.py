@@ -1,122 +1,100 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from app.dependencies import success_response, error_response
 from app.dependencies.auth import verify_token, verify_token_query
+from fastapi.concurrency import run_in_threadpool
 from sse_starlette.sse import EventSourceResponse
-import subprocess
 import os
+import secrets
 import threading
-import asyncio
-from typing import AsyncGenerator
-from collections import defaultdict
+import re
+from datetime import datetime
+from typing import Literal, Optional
+from app.services.log_stream import add_log, logs_store, log_stream_manager, parse_last_event_id
+from app.services.log_spool import get_spool
+from app.services.dependency_installer import InstallBusyError, installer
+from app.services.process_supervisor import supervisor
+from app.services import metrics
+from app.services.slow_query import slow_query_log
+from app.crud import index_advisor
+from app.database import engine
+from app.services.profiler import PROFILE_MAX_HZ, PROFILE_MAX_SECONDS, ProfileBusyError, ProfileUnavailableError, profiler
+from app.services.runner_venv import RUNNER_VENV, runner_python, runner_venvs
+from runner_topology import TopologyError, load_topology, read_state
 
 router = APIRouter()
 
-process_store = {}
-logs_store = {'process': [], 'install': []}
+def runner_process_map(pid):
+    """taskrunner 启动时写入的进程分布，只返回当前进程写入的记录，并标记每个消费进程是否存活"""
+    state = read_state()
+    if not pid or not state or state.get('pid') != pid:
+        return None
+    for unit in state['units']:
+        unit['alive'] = [p for p in unit['pids'] if pid_alive(p)]
+    return state
 
-# SSE日志流管理器
-class LogStreamManager:
-    def __init__(self):
-        self.subscribers: dict[str, dict[str, asyncio.Queue]] = defaultdict(dict)
-        self._lock = threading.Lock()
-    
-    async def subscribe(self, log_type: str) -> AsyncGenerator:
-        """订阅指定类型的日志流"""
-        queue = asyncio.Queue()
-        subscriber_id = str(id(queue))
-        
-        with self._lock:
-            self.subscribers[log_type][subscriber_id] = queue
-        
-        try:
-            # 先发送历史日志
-            for log_line in logs_store.get(log_type, []):
-                yield {"data": log_line}
-            
-            # 然后持续发送新日志
-            while True:
-                log_line = await queue.get()
-                yield {"data": log_line}
-        finally:
-            with self._lock:
-                if subscriber_id in self.subscribers[log_type]:
-                    del self.subscribers[log_type][subscriber_id]
-    
-    def broadcast(self, log_type: str, log_line: str):
-        """广播日志到所有订阅者"""
-        with self._lock:
-            for queue in self.subscribers[log_type].values():
-                try:
-                    # 使用 call_soon_threadsafe 从其他线程安全地添加到队列
-                    queue._loop.call_soon_threadsafe(queue.put_nowait, log_line)
-                except Exception:
-                    pass
-
-log_stream_manager = LogStreamManager()
-
-def add_log(log_type, line):
-    logs = logs_store[log_type]
-    logs.append(line)
-    if len(logs) > 500:
-        logs.pop(0)
-    # 广播到SSE订阅者
-    log_stream_manager.broadcast(log_type, line)
-
-def read_output(pipe, log_type):
-    for line in iter(pipe.readline, ''):
-        add_log(log_type, line.strip())
-
-def install_requirements_if_exists(tasks_dir):
-    """使用Popen实时捕获pip install输出"""
-    req_file = os.path.join(tasks_dir, 'requirements.txt')
-    if os.path.exists(req_file):
-        try:
-            # 记录当前的 PIP_INDEX_URL
-            pip_index_url = os.getenv('PIP_INDEX_URL', 'Not Set')
-            add_log('install', f"Current PIP_INDEX_URL: {pip_index_url}")
-
-            # 使用Popen替代run以实时捕获输出
-            process = subprocess.Popen(
-                ['pip', 'install', '-r', 'requirements.txt'],
-                cwd=tasks_dir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,  # 合并stderr到stdout
-                text=True,
-                bufsize=1  # 行缓冲
-            )
-            
-            # 实时读取输出
-            for line in iter(process.stdout.readline, ''):
-                if line:
-                    add_log('install', line.strip())
-            
-            process.wait()
-            
-            if process.returncode != 0:
-                raise Exception(f"安装依赖失败，退出码: {process.returncode}")
-            
-            return True
-        except Exception as e:
-            error_msg = f"安装依赖失败: {str(e)}"
-            add_log('install', error_msg)
-            raise Exception(error_msg)
-    return False
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def install_requirements_if_exists(tasks_dir, force=False):
+    """安装任务目录下的 requirements.txt，requirements.txt 未变化且依赖均已安装时跳过，见 dependency_installer"""
+    try:
+        return installer.install(tasks_dir, force)
+    except InstallBusyError:
+        raise
+    except Exception as e:
+        error_msg = f"安装依赖失败: {str(e)}"
+        add_log('install', error_msg)
+        raise Exception(error_msg)
+
+def runner_command(tasks_dir):
+    """启用独立 venv 时先确保运行环境已按当前 requirements.txt 创建好（未变化时直接复用）"""
+    if RUNNER_VENV:
+        install_requirements_if_exists(tasks_dir)
+    return [runner_python(tasks_dir), '-u', 'taskrunner.py']
 
 @router.get('/system/health')
 async def health_check():
     """健康检查接口"""
     return success_response(data={"status": "healthy"})
 
+@router.get('/metrics')
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Prometheus 格式的指标
+
+    需要带登录 token 或 Authorization: Bearer <METRICS_TOKEN>（设置了 METRICS_TOKEN 时），METRICS_PUBLIC 为 True 时不校验
+    """
+    if not metrics.METRICS_PUBLIC:
+        token_ok = bool(metrics.METRICS_TOKEN) and authorization is not None \
+            and secrets.compare_digest(authorization, f"Bearer {metrics.METRICS_TOKEN}")
+        if not token_ok:
+            if authorization is None:
+                raise HTTPException(status_code=401, detail="Could not validate credentials",
+                                    headers={"WWW-Authenticate": "Bearer"})
+            await verify_token(authorization)
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 @router.post("/process/install", dependencies=[Depends(verify_token)])
-async def install_dependencies():
+async def install_dependencies(force: bool = False):
     """
     安装依赖接口
+
+    同一时间只允许一个安装任务；requirements.txt 未变化且依赖均已安装时跳过，force 为 True 时强制重新安装
     """
     tasks_dir = os.getenv('TASKS_DIR', '/workspaces/TaskRun/examleTask')
-    
+    if installer.running:
+        return error_response(msg="依赖安装正在进行中")
+
     def install():
         try:
-            install_requirements_if_exists(tasks_dir)
+            install_requirements_if_exists(tasks_dir, force)
         except Exception as e:
             # 错误已在 install_requirements_if_exists 中记录到日志
             pass
@@ -124,60 +102,68 @@ async def install_dependencies():
     threading.Thread(target=install).start()
     return success_response(msg="依赖安装已开始")
 
+@router.get("/install/status", dependencies=[Depends(verify_token)])
+async def get_install_status():
+    """
+    查看依赖安装状态：是否正在安装、当前步骤、上次安装成功的记录，以及 taskrunner 独立 venv 是否已按当前
+    requirements.txt 创建
+    """
+    data = installer.status()
+    data['venv'] = runner_venvs.status(os.getenv('TASKS_DIR', '/workspaces/TaskRun/examleTask'))
+    return success_response(data=data)
+
 @router.post("/process/start", dependencies=[Depends(verify_token)])
 async def start_process():
     """
     启动子进程接口
     """
-    if 'taskrunner' in process_store and process_store['taskrunner'].poll() is None:
-        return error_response(msg="进程已在运行")
-    
+    tasks_dir = os.getenv('TASKS_DIR', '/workspaces/TaskRun/examleTask')
     try:
-        process_store['taskrunner'] = subprocess.Popen(['python', '-u', 'taskrunner.py'], cwd=os.path.dirname(__file__) + '/../..', stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        threading.Thread(target=read_output, args=(process_store['taskrunner'].stdout, 'process')).start()
-        threading.Thread(target=read_output, args=(process_store['taskrunner'].stderr, 'process')).start()
+        load_topology(tasks_dir)
+        if supervisor.is_running():
+            return error_response(msg="进程已在运行")
+        command = await run_in_threadpool(runner_command, tasks_dir)
+        if not supervisor.start(command):
+            return error_response(msg="进程已在运行")
         return success_response(msg="进程启动成功")
+    except TopologyError as e:
+        return error_response(msg=f"进程拓扑配置错误: {e}")
+    except InstallBusyError:
+        return error_response(msg="依赖安装正在进行中，请完成后再启动")
     except Exception as e:
         return error_response(msg=f"启动失败: {str(e)}")
 
 @router.post("/process/restart", dependencies=[Depends(verify_token)])
-async def restart_process():
+async def restart_process(drain_seconds: Optional[float] = Query(None, ge=0)):
     """
     重启子进程接口
+
+    先优雅停止（等待正在执行的任务完成，最长 drain_seconds 秒，默认 PROCESS_DRAIN_SECONDS），再启动
     """
+    tasks_dir = os.getenv('TASKS_DIR', '/workspaces/TaskRun/examleTask')
     try:
-        # 先停止所有相关的 taskrunner 进程
-        result = subprocess.run(['pkill', '-f', 'taskrunner.py'], capture_output=True, text=True)
-        
-        # 清理存储的进程引用
-        if 'taskrunner' in process_store:
-            del process_store['taskrunner']
-        
-        # 再启动
-        process_store['taskrunner'] = subprocess.Popen(['python', '-u', 'taskrunner.py'], cwd=os.path.dirname(__file__) + '/../..', stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        threading.Thread(target=read_output, args=(process_store['taskrunner'].stdout, 'process')).start()
-        threading.Thread(target=read_output, args=(process_store['taskrunner'].stderr, 'process')).start()
+        # 拓扑配置有误或运行环境创建失败时不停止正在运行的进程
+        load_topology(tasks_dir)
+        command = await run_in_threadpool(runner_command, tasks_dir)
+        await run_in_threadpool(supervisor.restart, drain_seconds, command)
         return success_response(msg="进程重启成功")
+    except TopologyError as e:
+        return error_response(msg=f"进程拓扑配置错误: {e}")
+    except InstallBusyError:
+        return error_response(msg="依赖安装正在进行中，请完成后再重启")
     except Exception as e:
         return error_response(msg=f"重启失败: {str(e)}")
 
 @router.post("/process/stop", dependencies=[Depends(verify_token)])
-async def stop_process():
+async def stop_process(drain_seconds: Optional[float] = Query(None, ge=0)):
     """
     终止子进程接口
+
+    先向进程组发送 SIGTERM，等待 drain_seconds 秒（默认 PROCESS_DRAIN_SECONDS）后仍未退出再 SIGKILL
     """
     try:
-        # 使用 pkill 终止所有 taskrunner.py 进程
-        result = subprocess.run(['pkill', '-f', 'taskrunner.py'], capture_output=True, text=True)
-        
-        # 清理存储的进程引用
-        if 'taskrunner' in process_store:
-            del process_store['taskrunner']
-        
-        if result.returncode == 0 or result.returncode == 1:  # 0 表示找到并终止，1 表示未找到
-            return success_response(msg="进程终止成功")
-        else:
-            return error_response(msg=f"终止失败: {result.stderr}")
+        returncode = await run_in_threadpool(supervisor.stop, drain_seconds)
+        return success_response(data={"exit_code": returncode}, msg="进程终止成功")
     except Exception as e:
         return error_response(msg=f"终止失败: {str(e)}")
 
@@ -185,36 +171,164 @@ async def stop_process():
 async def get_process_status():
     """
     查询子进程状态接口
+
+    status 为 running / restarting（异常退出后等待自动重启）/ stopped，
+    同时返回运行时长、自动重启次数和最近的退出记录；运行中时 topology 为按拓扑配置启动的进程分布
+    """
+    data = supervisor.status()
+    data['topology'] = runner_process_map(data.get('pid'))
+    return success_response(data=data)
+
+@router.get("/process/topology", dependencies=[Depends(verify_token)])
+async def get_process_topology():
+    """
+    查看任务目录下的进程拓扑配置（校验后的结果），配置有误时返回错误信息
+    """
+    try:
+        return success_response(data=load_topology(os.getenv('TASKS_DIR', '/workspaces/TaskRun/examleTask')))
+    except (TopologyError, OSError) as e:
+        return error_response(msg=f"进程拓扑配置错误: {e}")
+
+@router.post("/profile/start", dependencies=[Depends(verify_token)])
+async def start_profile(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    hz: float = Query(100, gt=0, le=PROFILE_MAX_HZ),
+    target: Literal['all', 'api', 'runner'] = 'all',
+    include_idle: bool = False
+):
+    """
+    开始采样性能分析，持续 seconds 秒，每秒采样 hz 次
+
+    target 为 all 时同时分析 API 进程、taskrunner 主进程和所有消费进程；include_idle 为 True 时保留阻塞等待中的线程。
+    结束后通过 /profile/{id}/collapsed 下载合并后的折叠栈
+    """
+    data = supervisor.status()
+    runner_pid = data.get('pid') if data['status'] == 'running' else None
+    if target == 'runner' and not runner_pid:
+        return error_response(msg="进程未运行")
+    try:
+        return success_response(data=profiler.start(seconds, hz, target, include_idle, runner_pid),
+                                msg="性能分析已开始")
+    except (ProfileBusyError, ProfileUnavailableError) as e:
+        return error_response(msg=str(e))
+
+@router.get("/profile", dependencies=[Depends(verify_token)])
+async def list_profiles():
+    """
+    最近的性能分析记录
+    """
+    return success_response(data=profiler.list())
+
+@router.get("/profile/{profile_id}", dependencies=[Depends(verify_token)])
+async def get_profile_status(profile_id: str):
+    """
+    查看性能分析进度：是否结束、剩余秒数、已写出结果的进程
+    """
+    data = profiler.status(profile_id)
+    if data is None:
+        return error_response(msg="性能分析记录不存在")
+    return success_response(data=data)
+
+@router.get("/profile/{profile_id}/collapsed", dependencies=[Depends(verify_token)])
+async def get_profile_collapsed(profile_id: str):
+    """
+    下载合并后的折叠栈（每行 `进程;线程;函数;... 样本数`），可直接用于 flamegraph.pl 或 speedscope
+    """
+    data = profiler.status(profile_id)
+    if data is None:
+        return error_response(msg="性能分析记录不存在")
+    if not data['finished']:
+        return error_response(msg=f"性能分析尚未结束，剩余 {data['remaining']} 秒")
+    return PlainTextResponse(profiler.collapsed(profile_id))
+
+@router.get("/db/slow-queries", dependencies=[Depends(verify_token)])
+async def get_slow_queries(limit: int = Query(50, ge=1, le=1000)):
+    """
+    最近的慢查询（新的在前）：SQL、绑定参数、耗时，以及后台执行的 EXPLAIN 结果（explain 为 None 时尚未执行完）
     """
-    if 'taskrunner' in process_store and process_store['taskrunner'].poll() is None:
-        return success_response(data={"status": "running", "pid": process_store['taskrunner'].pid})
-    else:
-        return success_response(data={"status": "stopped"})
+    return success_response(data={**slow_query_log.status(), 'queries': slow_query_log.list(limit)})
+
+@router.delete("/db/slow-queries", dependencies=[Depends(verify_token)])
+async def clear_slow_queries():
+    """
+    清空慢查询记录
+    """
+    slow_query_log.clear()
+    return success_response(msg="慢查询记录已清空")
+
+@router.get("/db/index-advisor", dependencies=[Depends(verify_token)])
+def get_index_advisor():
+    """
+    对照数据库中结果表实际存在的索引，检查结果列表和统计接口的各种过滤条件组合是否有可用索引，
+    rating 为 missing 的组合会随数据量增长退化为全表扫描，suggestions 为建议新增的索引
+    """
+    try:
+        return success_response(data=index_advisor.advise(engine))
+    except Exception as e:
+        return error_response(msg=f"读取索引信息失败: {e}")
 
 @router.get('/logs', dependencies=[Depends(verify_token)])
 async def get_process_logs():
     """
     查看子进程日志接口（备用接口，保留兼容性）
+
+    streams 与 logs 一一对应，标记每行来自 stdout 还是 stderr
     """
-    return success_response(data={'logs': logs_store['process']})
+    return success_response(data={'logs': logs_store['process'].lines(), 'streams': logs_store['process'].streams()})
 
 @router.get('/install/logs', dependencies=[Depends(verify_token)])
 async def get_install_logs():
     """
     查看安装日志接口（备用接口，保留兼容性）
     """
-    return success_response(data={'logs': logs_store['install']})
+    return success_response(data={'logs': logs_store['install'].lines()})
+
+@router.get('/logs/query', dependencies=[Depends(verify_token)])
+def query_logs(
+    log_type: Literal['process', 'install'] = 'process',
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    keyword: Optional[str] = None,
+    regex: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000)
+):
+    """
+    查询落盘的历史日志
+
+    start/end 为服务器本地时间，按写入时间 [start, end) 过滤；keyword 为子串匹配，regex 为正则匹配，
+    两者同时传入时都需要满足。按时间正序返回，超过 limit 时 truncated 为 True。
+    """
+    spool = get_spool(log_type)
+    if spool is None:
+        return error_response(msg="日志落盘未启用或日志目录不可用")
+    try:
+        result = spool.query(start, end, keyword, regex, limit)
+    except re.error as e:
+        return error_response(msg=f"正则表达式错误: {e}")
+    return success_response(data=result)
 
 @router.get('/logs/stream')
-async def stream_process_logs(_: str = Depends(verify_token_query)):
+async def stream_process_logs(
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias='Last-Event-ID'),
+    _: str = Depends(verify_token_query)
+):
     """
     SSE实时进程日志流
+
+    浏览器自动重连时会带上 Last-Event-ID 请求头；前端手动重连时通过 last_event_id 查询参数传入
     """
-    return EventSourceResponse(log_stream_manager.subscribe('process'))
+    return EventSourceResponse(log_stream_manager.subscribe(
+        'process', parse_last_event_id(last_event_id_header or last_event_id)))
 
 @router.get('/install/logs/stream')
-async def stream_install_logs(_: str = Depends(verify_token_query)):
+async def stream_install_logs(
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias='Last-Event-ID'),
+    _: str = Depends(verify_token_query)
+):
     """
     SSE实时安装日志流
     """
-    return EventSourceResponse(log_stream_manager.subscribe('install'))
\ No newline at end of file
+    return EventSourceResponse(log_stream_manager.subscribe(
+        'install', parse_last_event_id(last_event_id_header or last_event_id)))
\ No newline at end of file
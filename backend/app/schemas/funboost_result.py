@@ -1,9 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Any
 from datetime import datetime
 
 class FunboostResult(BaseModel):
-    _id: str
+    # 以下划线开头的属性会被 pydantic 当作私有属性，这里用别名映射 _id 列
+    id: str = Field(validation_alias='_id', serialization_alias='_id')
     function: Optional[str]
     host_name: Optional[str]
     host_process: Optional[str]
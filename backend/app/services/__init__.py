@@ -0,0 +1 @@
+# Background services
\ No newline at end of file
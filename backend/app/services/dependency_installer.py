@@ -0,0 +1,214 @@
+"""
+任务目录依赖安装
+
+- requirements.txt 内容（连同 Python 版本）的 sha256 与上次安装成功时一致，且其中的依赖都已安装、版本满足时跳过
+- 优先从本地 wheelhouse（INSTALL_WHEELHOUSE）离线安装；缺少 wheel 时用 pip wheel 从索引下载/构建到 wheelhouse
+  后再离线安装，重复安装和重建容器（wheelhouse 在挂载的日志目录下）不需要再访问索引
+- requirements.txt 中有 wheelhouse 无法处理的依赖（例如 -e、VCS 地址）导致 pip wheel 失败时，退回直接 pip install
+- 同一时间只允许一个安装任务，每个步骤和 pip 输出都写入 install 日志
+- 启用 RUNNER_VENV 时安装到 taskrunner 的独立 venv 中，API 进程的环境不受影响，见 runner_venv
+"""
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from importlib import metadata
+from typing import List, Optional
+
+from app.services.log_stream import add_log
+from app.services.pipe_reader import read_process_output
+from app.services.runner_venv import RUNNER_VENV, runner_venvs
+
+INSTALL_WHEELHOUSE = os.getenv('INSTALL_WHEELHOUSE', os.path.join(os.getenv('LOGS_DIR', '/app/logs'), 'wheelhouse'))
+INSTALL_STATE_FILE = os.getenv('INSTALL_STATE_FILE', os.path.join(os.getenv('LOGS_DIR', '/app/logs'), 'install_state.json'))
+
+
+class InstallBusyError(RuntimeError):
+    pass
+
+
+def requirements_hash(req_file: str) -> str:
+    with open(req_file, 'rb') as f:
+        content = f.read()
+    # 换了 Python 版本（例如重建容器升级了镜像）需要重新安装
+    return hashlib.sha256(sys.version.encode() + b'\0' + content).hexdigest()
+
+
+def unsatisfied_requirements(req_file: str) -> List[str]:
+    """
+    检查 requirements.txt 中的依赖在当前环境中是否都已安装且版本满足
+
+    只检查普通的 name[extras]<specifier> 形式，-r / -e / URL 等无法检查的行忽略
+    """
+    try:
+        from packaging.requirements import InvalidRequirement, Requirement
+    except ImportError:
+        from pip._vendor.packaging.requirements import InvalidRequirement, Requirement
+    missing = []
+    with open(req_file, encoding='utf-8') as f:
+        for line in f:
+            line = line.split(' #', 1)[0].strip()
+            if not line or line.startswith(('#', '-')):
+                continue
+            try:
+                req = Requirement(line)
+            except InvalidRequirement:
+                continue
+            if req.url or (req.marker is not None and not req.marker.evaluate()):
+                continue
+            try:
+                version = metadata.version(req.name)
+            except metadata.PackageNotFoundError:
+                missing.append(req.name)
+                continue
+            if req.specifier and not req.specifier.contains(version, prereleases=True):
+                missing.append(f"{req.name}=={version} (需要 {req.specifier})")
+    return missing
+
+
+def read_install_state(path: str = INSTALL_STATE_FILE) -> Optional[dict]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_install_state(state: dict, path: str = INSTALL_STATE_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class DependencyInstaller:
+    def __init__(self, wheelhouse: str = INSTALL_WHEELHOUSE, state_file: str = INSTALL_STATE_FILE):
+        self.wheelhouse = wheelhouse
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self.current: Optional[dict] = None
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _pip(self, args: List[str], cwd: str, python: str = sys.executable) -> int:
+        add_log('install', f"$ pip {' '.join(args)}")
+        process = subprocess.Popen([python, '-m', 'pip', *args], cwd=cwd,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0)
+        wait_output = read_process_output(process, 'install')
+        process.wait()
+        wait_output()
+        return process.returncode
+
+    def _step(self, step: int, message: str):
+        total = self.current['total']
+        self.current = {'step': step, 'total': total, 'message': message, 'started_at': self.current['started_at']}
+        add_log('install', f"[{step}/{total}] {message}")
+
+    def install(self, tasks_dir: str, force: bool = False) -> dict:
+        """
+        安装任务目录下的 requirements.txt，返回 {'status': 'missing' | 'skipped' | 'installed', ...}；
+        启用 RUNNER_VENV 时安装到 taskrunner 的独立 venv 中。
+        已有安装任务在运行时抛出 InstallBusyError，pip 失败时抛出 Exception
+        """
+        if not self._lock.acquire(blocking=False):
+            raise InstallBusyError("依赖安装正在进行中")
+        try:
+            self.current = {'started_at': time.time(), 'total': 5 if RUNNER_VENV else 3}
+            if RUNNER_VENV:
+                return self._install_venv(tasks_dir, force)
+            return self._install(tasks_dir, force)
+        finally:
+            self.current = None
+            self._lock.release()
+
+    def _install_requirements(self, tasks_dir: str, python: str, first_step: int) -> str:
+        """
+        先确认 wheelhouse 中已有全部依赖（包括间接依赖）的 wheel，缺少时再访问索引，最后从 wheelhouse 离线安装，
+        返回 offline / wheelhouse / index
+        """
+        add_log('install', f"Current PIP_INDEX_URL: {os.getenv('PIP_INDEX_URL', 'Not Set')}")
+        os.makedirs(self.wheelhouse, exist_ok=True)
+        wheel = ['wheel', '--find-links', self.wheelhouse, '-w', self.wheelhouse, '-r', 'requirements.txt']
+        self._step(first_step, f"检查本地 wheelhouse ({self.wheelhouse})")
+        mode = 'offline'
+        if self._pip(['wheel', '--no-index', *wheel[1:]], tasks_dir) != 0:
+            self._step(first_step + 1, "wheelhouse 缺少部分依赖，从索引下载/构建 wheel")
+            mode = 'wheelhouse' if self._pip(wheel, tasks_dir) == 0 else 'index'
+        if mode == 'index':
+            self._step(first_step + 2, "无法全部构建为 wheel，直接从索引安装")
+            returncode = self._pip(['install', '-r', 'requirements.txt'], tasks_dir, python)
+        else:
+            self._step(first_step + 2, "从本地 wheelhouse 离线安装")
+            returncode = self._pip(['install', '--no-index', '--find-links', self.wheelhouse, '-r', 'requirements.txt'],
+                                   tasks_dir, python)
+        if returncode != 0:
+            raise Exception(f"安装依赖失败，退出码: {returncode}")
+        return mode
+
+    def _install(self, tasks_dir: str, force: bool) -> dict:
+        req_file = os.path.join(tasks_dir, 'requirements.txt')
+        if not os.path.exists(req_file):
+            add_log('install', "任务目录下没有 requirements.txt，无需安装")
+            return {'status': 'missing'}
+        started = time.monotonic()
+        digest = requirements_hash(req_file)
+        state = read_install_state(self.state_file) or {}
+        if not force and state.get('hash') == digest:
+            missing = unsatisfied_requirements(req_file)
+            if not missing:
+                add_log('install', f"requirements.txt 与上次安装成功时一致（sha256 {digest[:12]}），依赖均已安装，跳过")
+                return {'status': 'skipped', 'hash': digest}
+            add_log('install', f"requirements.txt 未变化，但以下依赖缺失或版本不符，重新安装: {', '.join(missing)}")
+
+        mode = self._install_requirements(tasks_dir, sys.executable, 1)
+        seconds = round(time.monotonic() - started, 1)
+        write_install_state({'hash': digest, 'installed_at': time.time(), 'mode': mode, 'seconds': seconds},
+                            self.state_file)
+        add_log('install', f"✅ 依赖安装完成，耗时 {seconds} 秒")
+        return {'status': 'installed', 'hash': digest, 'mode': mode, 'seconds': seconds}
+
+    def _install_venv(self, tasks_dir: str, force: bool) -> dict:
+        """venv 按 requirements.txt 的内容命名，已经创建好时跳过"""
+        venv = runner_venvs.for_tasks(tasks_dir)
+        if venv.ready and not force:
+            add_log('install', f"requirements.txt 未变化，复用已有的运行环境 {venv.path}，跳过")
+            return {'status': 'skipped', 'hash': venv.key, 'venv': venv.path}
+
+        started = time.monotonic()
+        self._step(1, f"创建运行环境 {venv.path}")
+        runner_venvs.create(venv)
+        mode = None
+        if os.path.exists(os.path.join(tasks_dir, 'requirements.txt')):
+            mode = self._install_requirements(tasks_dir, venv.python, 2)
+        else:
+            add_log('install', "任务目录下没有 requirements.txt，只使用系统环境中的依赖")
+        self._step(5, "按内容链接到共享包存储")
+        stats = runner_venvs.dedupe(venv)
+        add_log('install', f"复用 {stats['linked']} 个文件（节省 {stats['saved_bytes'] / 1024 / 1024:.1f} MB），"
+                           f"新存入 {stats['stored']} 个文件")
+        if 'error' in stats:
+            add_log('install', f"链接到共享包存储失败，不影响使用: {stats['error']}")
+        runner_venvs.mark_ready(venv)
+        from app.services.process_supervisor import supervisor
+        removed = runner_venvs.prune(venv, in_use=supervisor.command[0])
+        if removed:
+            add_log('install', f"删除旧的运行环境: {', '.join(removed)}")
+
+        seconds = round(time.monotonic() - started, 1)
+        write_install_state({'hash': venv.key, 'installed_at': time.time(), 'mode': mode, 'seconds': seconds,
+                             'venv': venv.path}, self.state_file)
+        add_log('install', f"✅ 运行环境创建完成，耗时 {seconds} 秒；重启进程后生效")
+        return {'status': 'installed', 'hash': venv.key, 'mode': mode, 'seconds': seconds, 'venv': venv.path}
+
+    def status(self) -> dict:
+        return {'running': self.running, 'current': self.current, 'last': read_install_state(self.state_file),
+                'wheelhouse': self.wheelhouse}
+
+
+installer = DependencyInstaller()
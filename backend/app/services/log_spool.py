@@ -0,0 +1,438 @@
+"""
+日志落盘：把进程/安装日志按大小滚动写入 LOGS_DIR/spool/<log_type>/ 下的分段文件
+
+- 每行格式为 "<写入时间 ISO 格式，精确到毫秒>\t<日志内容>\n"，时间前缀定长，可以直接按字节比较
+- 每个分段 seg-<毫秒时间戳>.log 对应一个稀疏索引 .idx，每隔 LOG_SPOOL_INDEX_INTERVAL 字节记录一次 "时间 偏移"
+- 查询时用索引定位到起始偏移，再通过 mmap 逐行扫描，不会把整个文件读入内存
+- 进程日志额外维护 task_id 索引：每行中出现的 task_id 以 "task_id 偏移" 追加到分段的 .tidx 文件，
+  最近的 task_id 同时缓存在内存中，按 task_id 取日志时直接按偏移读取对应的行
+- spool_log 只把日志放入有界队列，由后台线程按入队顺序写盘，写日志的线程不等待磁盘
+"""
+import bisect
+import logging
+import mmap
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+LOG_SPOOL_ENABLED = os.getenv('LOG_SPOOL_ENABLED', 'True').lower() == 'true'
+LOG_SPOOL_DIR = os.getenv('LOG_SPOOL_DIR', os.path.join(os.getenv('LOGS_DIR', '/app/logs'), 'spool'))
+LOG_SPOOL_SEGMENT_BYTES = int(os.getenv('LOG_SPOOL_SEGMENT_BYTES', str(16 * 1024 * 1024)))
+LOG_SPOOL_MAX_SEGMENTS = int(os.getenv('LOG_SPOOL_MAX_SEGMENTS', '20'))
+LOG_SPOOL_INDEX_INTERVAL = int(os.getenv('LOG_SPOOL_INDEX_INTERVAL', str(64 * 1024)))
+# funboost 的 task_id 默认是 UUID，日志模板中的 %(task_id)s 以及 get_logger(fct.task_id) 的 logger 名都会带上它
+LOG_TASK_ID_PATTERN = os.getenv('LOG_TASK_ID_PATTERN', r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+# 内存中缓存的 task_id 数量，超出后淘汰最久未出现的，查询时回退到扫描 .tidx 文件
+LOG_TASK_INDEX_MAX_TASKS = int(os.getenv('LOG_TASK_INDEX_MAX_TASKS', '100000'))
+# 单个 task_id 在内存中缓存的日志行数，超出后不再缓存该 task_id 的偏移，查询时回退到扫描 .tidx 文件
+LOG_TASK_INDEX_MAX_OFFSETS = int(os.getenv('LOG_TASK_INDEX_MAX_OFFSETS', '2000'))
+# 等待后台线程写盘的日志行数上限，磁盘跟不上时超出的行不再落盘，内存中的日志推送不受影响
+LOG_SPOOL_QUEUE_SIZE = int(os.getenv('LOG_SPOOL_QUEUE_SIZE', '100000'))
+# 写入缓冲最长保留的秒数，查询前也会先刷新
+LOG_SPOOL_FLUSH_INTERVAL = 1.0
+
+TIME_FORMAT_WIDTH = 23  # 2024-01-01T00:00:00.000
+
+logger = logging.getLogger(__name__)
+
+
+def format_time(dt: datetime) -> str:
+    return dt.isoformat(timespec='milliseconds')
+
+
+class SpoolSegment:
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path[:-len('.log')] + '.idx'
+        self.task_index_path = path[:-len('.log')] + '.tidx'
+        self.name = os.path.basename(path)
+        self._index: Optional[Tuple[List[str], List[int]]] = None
+
+    def load_index(self) -> Tuple[List[str], List[int]]:
+        """读取稀疏索引，返回 (时间列表, 偏移列表)；正在写入的分段每次都重新读取"""
+        if self._index is not None:
+            return self._index
+        times, offsets = [], []
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    ts, offset = line.split()
+                    times.append(ts)
+                    offsets.append(int(offset))
+        except (OSError, ValueError):
+            pass
+        return times, offsets
+
+    def seal(self):
+        """分段写满后索引不再变化，缓存在内存中"""
+        self._index = None
+        self._index = self.load_index()
+
+    def first_time(self) -> Optional[str]:
+        times, _ = self.load_index()
+        return times[0] if times else None
+
+    def delete(self):
+        for path in (self.path, self.index_path, self.task_index_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class LogSpool:
+    """单个日志类型的分段文件写入与查询"""
+
+    def __init__(self, directory: str, segment_bytes: int = LOG_SPOOL_SEGMENT_BYTES,
+                 max_segments: int = LOG_SPOOL_MAX_SEGMENTS, index_interval: int = LOG_SPOOL_INDEX_INTERVAL,
+                 index_task_ids: bool = False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.index_interval = index_interval
+        os.makedirs(directory, exist_ok=True)
+        self.segments: List[SpoolSegment] = [
+            SpoolSegment(os.path.join(directory, name))
+            for name in sorted(os.listdir(directory)) if name.startswith('seg-') and name.endswith('.log')
+        ]
+        for segment in self.segments:
+            segment.seal()
+        self._file = None
+        self._index_file = None
+        self._offset = 0
+        self._last_indexed = -1
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self.index_task_ids = index_task_ids
+        self._task_id_re = re.compile(LOG_TASK_ID_PATTERN)
+        self._task_file = None
+        # task_id -> [是否完整, [(分段名, 偏移), ...]]；发生过淘汰之后新出现的 task_id 可能缺少更早的记录，
+        # 日志行数超过 LOG_TASK_INDEX_MAX_OFFSETS 的 task_id 也标记为不完整并清空偏移
+        self._recent_tasks: "OrderedDict[str, list]" = OrderedDict()
+        # 分段名 -> 该分段中出现过的 task_id，分段被滚动删除时清理对应的内存记录
+        self._segment_tasks: Dict[str, set] = {}
+        self._task_evicted = False
+        # 启动前已存在的分段不在内存索引中（例如重试的任务在重启前已经打印过日志），查询时扫描它们的 .tidx
+        self._startup_segments = {segment.name for segment in self.segments}
+
+    def _open_segment(self, now: datetime):
+        self._close_files()
+        name = f"seg-{int(now.timestamp() * 1000):013d}.log"
+        if self.segments and os.path.basename(self.segments[-1].path) >= name:
+            # 同一毫秒内滚动两次时顺延，保证文件名有序
+            name = f"seg-{int(os.path.basename(self.segments[-1].path)[4:-4]) + 1:013d}.log"
+        segment = SpoolSegment(os.path.join(self.directory, name))
+        self.segments.append(segment)
+        self._file = open(segment.path, 'ab', buffering=64 * 1024)
+        self._index_file = open(segment.index_path, 'a', encoding='utf-8')
+        if self.index_task_ids:
+            self._task_file = open(segment.task_index_path, 'a', encoding='utf-8', buffering=64 * 1024)
+        self._offset = 0
+        self._last_indexed = -1
+        while len(self.segments) > self.max_segments:
+            removed = self.segments.pop(0)
+            removed.delete()
+            self._forget_segment(removed.name)
+
+    def _close_files(self):
+        if self._file:
+            self._file.close()
+            self._index_file.close()
+            if self._task_file:
+                self._task_file.close()
+            self.segments[-1].seal()
+        self._file = self._index_file = self._task_file = None
+
+    def write(self, line: str, now: Optional[datetime] = None):
+        now = now or datetime.now()
+        ts = format_time(now)
+        data = f"{ts}\t{line}\n".encode('utf-8', errors='replace')
+        with self._lock:
+            if self._file is None or self._offset >= self.segment_bytes:
+                self._open_segment(now)
+            if self._last_indexed < 0 or self._offset - self._last_indexed >= self.index_interval:
+                self._index_file.write(f"{ts} {self._offset}\n")
+                self._index_file.flush()
+                self._last_indexed = self._offset
+            if self.index_task_ids:
+                self._index_task_ids(line)
+            self._file.write(data)
+            self._offset += len(data)
+            if time.monotonic() - self._last_flush >= LOG_SPOOL_FLUSH_INTERVAL:
+                self._flush()
+
+    def _index_task_ids(self, line: str):
+        segment_name = self.segments[-1].name
+        for task_id in set(self._task_id_re.findall(line)):
+            self._task_file.write(f"{task_id} {self._offset}\n")
+            entry = self._recent_tasks.get(task_id)
+            if entry is None:
+                entry = self._recent_tasks[task_id] = [not self._task_evicted, []]
+            else:
+                self._recent_tasks.move_to_end(task_id)
+            if not entry[0]:
+                continue
+            if len(entry[1]) >= LOG_TASK_INDEX_MAX_OFFSETS:
+                entry[0] = False
+                entry[1] = []
+                continue
+            entry[1].append((segment_name, self._offset))
+            self._segment_tasks.setdefault(segment_name, set()).add(task_id)
+        while len(self._recent_tasks) > LOG_TASK_INDEX_MAX_TASKS:
+            self._recent_tasks.popitem(last=False)
+            self._task_evicted = True
+
+    def _forget_segment(self, segment_name: str):
+        """偏移按写入顺序追加，被删除的最旧分段的记录都在列表开头"""
+        self._startup_segments.discard(segment_name)
+        for task_id in self._segment_tasks.pop(segment_name, ()):
+            entry = self._recent_tasks.get(task_id)
+            if entry is None:
+                continue
+            offsets = entry[1]
+            i = 0
+            while i < len(offsets) and offsets[i][0] == segment_name:
+                i += 1
+            del offsets[:i]
+            if entry[0] and not offsets:
+                del self._recent_tasks[task_id]
+
+    def _flush(self):
+        if self._file:
+            self._file.flush()
+        if self._task_file:
+            self._task_file.flush()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+
+    def _candidate_segments(self, start: Optional[str], end: Optional[str]) -> List[SpoolSegment]:
+        """分段 i 覆盖 [第 i 段首行时间, 第 i+1 段首行时间)，只保留与查询范围有交集的分段"""
+        with self._lock:
+            segments = list(self.segments)
+        firsts = [segment.first_time() for segment in segments]
+        result = []
+        for i, segment in enumerate(segments):
+            if firsts[i] is None:
+                continue
+            next_first = next((t for t in firsts[i + 1:] if t), None)
+            if start and next_first and next_first <= start:
+                continue
+            if end and firsts[i] >= end:
+                continue
+            result.append(segment)
+        return result
+
+    def query(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              keyword: Optional[str] = None, pattern: Optional[str] = None, limit: int = 1000) -> dict:
+        """
+        按时间范围 [start, end) 以及子串或正则过滤日志，按时间正序返回最多 limit 行
+
+        :raises re.error: 正则表达式不合法
+        """
+        start_ts = format_time(start) if start else None
+        end_ts = format_time(end) if end else None
+        needle = keyword.encode('utf-8') if keyword else None
+        regex = re.compile(pattern.encode('utf-8')) if pattern else None
+        self.flush()
+
+        lines, truncated = [], False
+        for segment in self._candidate_segments(start_ts, end_ts):
+            times, offsets = segment.load_index()
+            position = 0
+            if start_ts:
+                # 最后一个时间早于 start 的索引点之后才可能出现匹配的行
+                i = bisect.bisect_left(times, start_ts) - 1
+                position = offsets[i] if i >= 0 else 0
+            done, truncated = self._scan(segment.path, position, start_ts, end_ts, needle, regex, lines, limit)
+            if done:
+                break
+        return {'lines': lines, 'truncated': truncated}
+
+    @staticmethod
+    def _scan(path: str, position: int, start_ts: Optional[str], end_ts: Optional[str], needle: Optional[bytes],
+              regex, lines: List[dict], limit: int) -> Tuple[bool, bool]:
+        """从 position 开始扫描一个分段，返回 (是否结束整个查询, 是否因 limit 截断)"""
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return False, False
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= position:
+                return False, False
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                start_b = start_ts.encode() if start_ts else None
+                end_b = end_ts.encode() if end_ts else None
+                while position < size:
+                    line_end = mm.find(b'\n', position)
+                    if line_end < 0:
+                        line_end = size
+                    ts = mm[position:position + TIME_FORMAT_WIDTH]
+                    if end_b and ts >= end_b:
+                        return True, False
+                    if not start_b or ts >= start_b:
+                        content = mm[position + TIME_FORMAT_WIDTH + 1:line_end]
+                        if (needle is None or needle in content) and (regex is None or regex.search(content)):
+                            if len(lines) >= limit:
+                                return True, True
+                            lines.append({'time': ts.decode(), 'line': content.decode('utf-8', errors='replace')})
+                    position = line_end + 1
+        return False, False
+
+
+    def _scan_task_index(self, task_id: str, segments: List[SpoolSegment]) -> List[Tuple[str, int]]:
+        """在各分段的 .tidx 文件中查找 task_id，用于内存索引没有完整记录的情况"""
+        needle = task_id.encode('utf-8') + b' '
+        entries = []
+        for segment in segments:
+            try:
+                f = open(segment.task_index_path, 'rb')
+            except OSError:
+                continue
+            with f:
+                size = os.fstat(f.fileno()).st_size
+                if not size:
+                    continue
+                with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                    position = mm.find(needle)
+                    while position >= 0:
+                        if position == 0 or mm[position - 1:position] == b'\n':
+                            line_end = mm.find(b'\n', position)
+                            entries.append((segment.name, int(mm[position + len(needle):line_end if line_end >= 0 else size])))
+                        position = mm.find(needle, position + 1)
+        return entries
+
+    def task_lines(self, task_id: str, limit: int = 2000) -> dict:
+        """按时间正序返回包含 task_id 的日志行，超过 limit 时 truncated 为 True"""
+        with self._lock:
+            self._flush()
+            segments = {segment.name: segment for segment in self.segments}
+            cached = self._recent_tasks.get(task_id)
+            entries = list(cached[1]) if cached and cached[0] else None
+        if entries is None:
+            entries = self._scan_task_index(task_id, list(segments.values()))
+        else:
+            entries += self._scan_task_index(
+                task_id, [segment for name, segment in segments.items() if name in self._startup_segments])
+
+        lines = []
+        entries.sort()
+        truncated = len(entries) > limit
+        current_name, f = None, None
+        try:
+            for segment_name, offset in entries[:limit]:
+                if segment_name != current_name:
+                    if f:
+                        f.close()
+                    current_name, f = segment_name, None
+                    if segment_name in segments:
+                        try:
+                            f = open(segments[segment_name].path, 'rb')
+                        except OSError:
+                            pass
+                if f is None:
+                    # 分段已经被滚动删除
+                    continue
+                f.seek(offset)
+                raw = f.readline().rstrip(b'\n')
+                lines.append({
+                    'time': raw[:TIME_FORMAT_WIDTH].decode(),
+                    'line': raw[TIME_FORMAT_WIDTH + 1:].decode('utf-8', errors='replace'),
+                })
+        finally:
+            if f:
+                f.close()
+        return {'lines': lines, 'truncated': truncated}
+
+
+_spools: Dict[str, LogSpool] = {}
+_spools_lock = threading.Lock()
+_disabled_reason: Optional[str] = None
+
+
+def get_spool(log_type: str) -> Optional[LogSpool]:
+    """日志目录不可写时只记录一次警告并停用落盘，不影响内存中的日志推送"""
+    global _disabled_reason
+    if not LOG_SPOOL_ENABLED or _disabled_reason:
+        return None
+    spool = _spools.get(log_type)
+    if spool is None:
+        with _spools_lock:
+            spool = _spools.get(log_type)
+            if spool is None and not _disabled_reason:
+                try:
+                    spool = _spools[log_type] = LogSpool(os.path.join(LOG_SPOOL_DIR, log_type),
+                                                         index_task_ids=log_type == 'process')
+                except OSError as e:
+                    _disabled_reason = str(e)
+                    logger.warning(f"日志落盘目录不可用，停用日志落盘: {e}")
+    return spool
+
+
+def _write_line(log_type: str, line: str, now: datetime):
+    spool = get_spool(log_type)
+    if spool is None:
+        return
+    try:
+        spool.write(line, now=now)
+    except OSError as e:
+        logger.warning(f"写入日志落盘文件失败: {e}")
+
+
+class SpoolWriter:
+    """后台写盘线程，第一次提交时启动；队列满时丢弃新的行并计数"""
+
+    def __init__(self, max_pending: int = LOG_SPOOL_QUEUE_SIZE):
+        self._queue: "queue.Queue[Tuple[str, str, datetime]]" = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, log_type: str, line: str, now: datetime):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='log-spool-writer', daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait((log_type, line, now))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 10000 == 0:
+                logger.warning(f"日志落盘跟不上写入速度，已丢弃 {self.dropped} 行未落盘的日志")
+
+    def _run(self):
+        while True:
+            log_type, line, now = self._queue.get()
+            try:
+                _write_line(log_type, line, now)
+            except Exception as e:
+                logger.warning(f"写入日志落盘文件失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """等待已提交的行全部写盘"""
+        self._queue.join()
+
+
+spool_writer = SpoolWriter()
+
+
+def spool_log(log_type: str, line: str):
+    """只入队，不等待磁盘；写入时间在入队时确定，调用方按顺序提交即可保证分段文件中的时间有序"""
+    if not LOG_SPOOL_ENABLED or _disabled_reason:
+        return
+    spool_writer.submit(log_type, line, datetime.now())
@@ -0,0 +1,229 @@
+"""
+进程/安装日志的内存存储与 SSE 推送
+
+- LogRingBuffer: 固定容量的环形缓冲区，每行日志带单调递增的序号，写满后覆盖最旧的行
+- LogStreamManager: 把新日志推送给 SSE 订阅者；订阅时带上 Last-Event-ID 可以从断开处继续
+- LogSubscriber: 每个订阅者的有界缓冲区，消费过慢时丢弃最旧的行，多行合并为一个 SSE 事件推送
+"""
+import asyncio
+import os
+import threading
+from collections import defaultdict, deque
+from typing import AsyncGenerator, Deque, List, Optional, Tuple
+
+from app.services.log_spool import spool_log
+
+LOG_BUFFER_SIZE = int(os.getenv('LOG_BUFFER_SIZE', '20000'))
+# 新订阅者（没有 Last-Event-ID）先回放的历史行数
+LOG_REPLAY_LINES = int(os.getenv('LOG_REPLAY_LINES', '1000'))
+# 每个订阅者最多缓存的未发送行数，超出后丢弃最旧的行并在推送中插入跳过提示
+LOG_SUBSCRIBER_BUFFER = int(os.getenv('LOG_SUBSCRIBER_BUFFER', '5000'))
+# 合并推送：每隔 LOG_BATCH_INTERVAL 秒或攒够 LOG_BATCH_MAX_LINES 行发送一个 SSE 事件
+LOG_BATCH_INTERVAL = float(os.getenv('LOG_BATCH_INTERVAL', '0.05'))
+LOG_BATCH_MAX_LINES = int(os.getenv('LOG_BATCH_MAX_LINES', '500'))
+
+LogEntry = Tuple[int, str]
+# 日志来源标记，进程日志区分 stdout / stderr
+STREAM_STDOUT = 'stdout'
+STREAM_STDERR = 'stderr'
+
+
+class LogRingBuffer:
+    def __init__(self, capacity: int = LOG_BUFFER_SIZE):
+        self.capacity = capacity
+        self._lines: List[Optional[str]] = [None] * capacity
+        self._streams: List[Optional[str]] = [None] * capacity
+        # 下一行的序号，序号从 1 开始
+        self._next_seq = 1
+        self._lock = threading.Lock()
+
+    @property
+    def first_seq(self) -> int:
+        """缓冲区中最旧一行的序号"""
+        return max(1, self._next_seq - self.capacity)
+
+    @property
+    def last_seq(self) -> int:
+        """最新一行的序号，没有日志时为 0"""
+        return self._next_seq - 1
+
+    def append(self, line: str, stream: Optional[str] = None) -> int:
+        with self._lock:
+            seq = self._next_seq
+            self._lines[seq % self.capacity] = line
+            self._streams[seq % self.capacity] = stream
+            self._next_seq = seq + 1
+            return seq
+
+    def since(self, after_seq: int) -> List[LogEntry]:
+        """返回序号大于 after_seq 且仍在缓冲区中的日志"""
+        with self._lock:
+            start = max(after_seq + 1, self.first_seq)
+            return [(seq, self._lines[seq % self.capacity]) for seq in range(start, self._next_seq)]
+
+    def tail(self, count: int) -> List[LogEntry]:
+        return self.since(self.last_seq - count)
+
+    def lines(self) -> List[str]:
+        return [line for _, line in self.since(0)]
+
+    def streams(self) -> List[Optional[str]]:
+        """与 lines() 一一对应的来源标记"""
+        with self._lock:
+            return [self._streams[seq % self.capacity] for seq in range(self.first_seq, self._next_seq)]
+
+
+class LogSubscriber:
+    """
+    单个 SSE 订阅者的有界缓冲区
+
+    写入方（读取进程输出的线程）只往 deque 里追加，缓冲区满时丢弃最旧的行并计数；
+    只有缓冲区从空变为非空时才通过 call_soon_threadsafe 唤醒一次事件循环，
+    突发输出时不会为每一行都调度一个回调。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_lines: int = LOG_SUBSCRIBER_BUFFER):
+        self.loop = loop
+        self.pending: Deque[LogEntry] = deque(maxlen=max_lines)
+        self.dropped = 0
+        self.ready = asyncio.Event()
+        self._notified = False
+        self._lock = threading.Lock()
+
+    def push(self, seq: int, line: str):
+        self.push_many([(seq, line)])
+
+    def push_many(self, entries: List[LogEntry]):
+        with self._lock:
+            overflow = len(self.pending) + len(entries) - self.pending.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self.pending.extend(entries)
+            if self._notified:
+                return
+            self._notified = True
+        self.loop.call_soon_threadsafe(self.ready.set)
+
+    def drain(self, max_lines: int) -> Tuple[List[LogEntry], int]:
+        """取出最多 max_lines 行以及此前丢弃的行数"""
+        with self._lock:
+            count = min(len(self.pending), max_lines)
+            entries = [self.pending.popleft() for _ in range(count)]
+            dropped, self.dropped = self.dropped, 0
+            if not self.pending:
+                self._notified = False
+                self.ready.clear()
+            return entries, dropped
+
+    def __len__(self):
+        return len(self.pending)
+
+
+def skipped_marker(count: int) -> str:
+    return f"... 客户端接收过慢或断开过久，跳过了 {count} 行日志 ..."
+
+
+class LogStreamManager:
+    """SSE日志流管理器"""
+
+    def __init__(self, buffers: dict):
+        self.buffers = buffers
+        self.subscribers: dict[str, dict[str, LogSubscriber]] = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def _replay_from(self, log_type: str, last_event_id: Optional[int]) -> int:
+        """确定回放起点：能续上的 Last-Event-ID 从断开处继续，否则只回放最近 LOG_REPLAY_LINES 行"""
+        buffer = self.buffers[log_type]
+        # 大于当前最新序号说明服务重启过，序号已经重新开始
+        if last_event_id is not None and 0 <= last_event_id <= buffer.last_seq:
+            return last_event_id
+        return max(0, buffer.last_seq - LOG_REPLAY_LINES)
+
+    @staticmethod
+    def _event(entries: List[LogEntry], skipped: int = 0) -> dict:
+        """多行合并为一个事件，data 中按换行分隔，事件 id 为最后一行的序号"""
+        lines = [line for _, line in entries]
+        if skipped:
+            lines.insert(0, skipped_marker(skipped))
+        return {"id": entries[-1][0], "data": '\n'.join(lines)}
+
+    async def subscribe(self, log_type: str, last_event_id: Optional[int] = None) -> AsyncGenerator:
+        """订阅指定类型的日志流，每 LOG_BATCH_INTERVAL 秒或攒够 LOG_BATCH_MAX_LINES 行推送一个事件"""
+        subscriber = LogSubscriber(asyncio.get_running_loop())
+        subscriber_id = str(id(subscriber))
+
+        # 先注册再读取历史，两者之间产生的日志会同时出现在历史和缓冲区中，按序号去重
+        with self._lock:
+            self.subscribers[log_type][subscriber_id] = subscriber
+
+        try:
+            sent_seq = self._replay_from(log_type, last_event_id)
+            history = self.buffers[log_type].since(sent_seq)
+            # Last-Event-ID 对应的行已经被环形缓冲区覆盖
+            skipped = history[0][0] - sent_seq - 1 if history else 0
+            for i in range(0, len(history), LOG_BATCH_MAX_LINES):
+                yield self._event(history[i:i + LOG_BATCH_MAX_LINES], skipped)
+                skipped = 0
+            if history:
+                sent_seq = history[-1][0]
+
+            while True:
+                await subscriber.ready.wait()
+                if len(subscriber) < LOG_BATCH_MAX_LINES:
+                    # 等一小段时间把突发的多行合并到同一个事件
+                    await asyncio.sleep(LOG_BATCH_INTERVAL)
+                entries, skipped = subscriber.drain(LOG_BATCH_MAX_LINES)
+                entries = [entry for entry in entries if entry[0] > sent_seq]
+                if not entries:
+                    continue
+                yield self._event(entries, skipped)
+                sent_seq = entries[-1][0]
+        finally:
+            with self._lock:
+                if subscriber_id in self.subscribers[log_type]:
+                    del self.subscribers[log_type][subscriber_id]
+
+    def broadcast(self, log_type: str, seq: int, log_line: str):
+        """广播日志到所有订阅者"""
+        self.broadcast_many(log_type, [(seq, log_line)])
+
+    def broadcast_many(self, log_type: str, entries: List[LogEntry]):
+        """一次广播多行，整批只获取一次订阅者锁"""
+        with self._lock:
+            for subscriber in self.subscribers[log_type].values():
+                try:
+                    subscriber.push_many(entries)
+                except Exception:
+                    pass
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+logs_store = {'process': LogRingBuffer(), 'install': LogRingBuffer()}
+log_stream_manager = LogStreamManager(logs_store)
+# stdout/stderr 两个读取线程同时写入时，保证推送顺序与序号顺序一致
+_add_log_lock = threading.Lock()
+
+
+def add_log(log_type: str, line: str, stream: Optional[str] = None):
+    add_logs(log_type, [line], stream)
+
+
+def add_logs(log_type: str, lines: List[str], stream: Optional[str] = None):
+    """批量写入同一来源的多行日志，读取进程输出时一次读到的整块按行拆分后整批写入"""
+    if not lines:
+        return
+    with _add_log_lock:
+        buffer = logs_store[log_type]
+        entries = []
+        for line in lines:
+            entries.append((buffer.append(line, stream), line))
+            # 同时写入磁盘分段文件，API 重启后仍可通过 /logs/query 查询；只入队，写盘在后台线程中进行
+            spool_log(log_type, line)
+        # 广播到SSE订阅者
+        log_stream_manager.broadcast_many(log_type, entries)
@@ -0,0 +1,270 @@
+"""
+Prometheus 格式的运行指标，由 /api/metrics 输出
+
+- HTTP：纯 ASGI 中间件按路由模板（而不是实际路径）记录请求耗时直方图和正在处理的请求数；
+  SSE 等长连接只计入请求数，不计入耗时直方图
+- 数据库：SQLAlchemy cursor 事件记录每条 SQL 的执行耗时，按语句类型（SELECT/INSERT/...）区分
+- 日志、进程：SSE 订阅者数、环形缓冲区使用率、累计写入行数、taskrunner 状态等在抓取时才读取，
+  不增加请求路径上的开销
+
+不依赖 prometheus_client，每次记录只是一次二分查找加几个整数累加。
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+# 抓取 /api/metrics 默认需要登录 token；设置 METRICS_TOKEN 后也可以带 Authorization: Bearer <METRICS_TOKEN>，
+# 便于 Prometheus 使用固定的凭据。METRICS_PUBLIC 为 True 时不校验
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_PUBLIC = os.getenv('METRICS_PUBLIC', 'False').lower() in ('1', 'true', 'yes')
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # 标签值 -> [每个桶（不累计）的计数..., +Inf 桶计数, 总和]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = [(labels, list(series)) for labels, series in self._series.items()]
+        bounds = ['le="%s"' % _number(bound) for bound in self.buckets + (float('inf'),)]
+        for labels, series in sorted(snapshot, key=lambda item: item[0]):
+            cumulative = 0
+            for bound, count in zip(bounds, series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, bound)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]!r}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}' for labels, value in values)
+        return lines
+
+
+class GaugeFunc:
+    """抓取时调用 func 取值的指标，func 返回 [(标签值元组, 数值), ...]"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str],
+                 func: Callable[[], Iterable[Tuple[tuple, float]]], kind: str = 'gauge'):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.func = func
+        self.kind = kind
+
+    def collect(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}' for labels, value in self.func())
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.collect())
+            except Exception as e:
+                # 单个指标取值失败不影响其它指标
+                lines.append(f'# {metric.name} 取值失败: {_escape(e)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    'taskrun_http_request_duration_seconds', 'HTTP 请求耗时（不含 SSE 等流式响应）',
+    ('method', 'route', 'status'), HTTP_BUCKETS))
+http_requests_streaming = registry.register(Counter(
+    'taskrun_http_streaming_requests_total', 'SSE 等流式响应的请求数', ('method', 'route', 'status')))
+_in_progress = [0]
+registry.register(GaugeFunc('taskrun_http_requests_in_progress', '正在处理的 HTTP 请求数', (),
+                            lambda: [((), _in_progress[0])]))
+
+db_query_duration = registry.register(Histogram(
+    'taskrun_db_query_duration_seconds', 'SQL 执行耗时', ('engine', 'operation'), DB_BUCKETS))
+db_query_errors = registry.register(Counter(
+    'taskrun_db_query_errors_total', 'SQL 执行出错次数', ('engine', 'operation')))
+
+
+class MetricsMiddleware:
+    """纯 ASGI 中间件（不使用 BaseHTTPMiddleware，避免额外的任务和队列开销）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        response = {'status': 500, 'streaming': False}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                for key, value in message.get('headers', ()):
+                    if key == b'content-type' and value.startswith(b'text/event-stream'):
+                        response['streaming'] = True
+            await send(message)
+
+        _in_progress[0] += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _in_progress[0] -= 1
+            # 路由匹配后 FastAPI 会把路由对象写入 scope，使用路由模板避免标签数量随路径参数膨胀
+            route = scope.get('route')
+            labels = (scope['method'], getattr(route, 'path', 'unmatched'), str(response['status']))
+            if response['streaming']:
+                http_requests_streaming.inc(*labels)
+            else:
+                http_request_duration.observe(elapsed, *labels)
+
+
+def _operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else 'UNKNOWN'
+
+
+def instrument_engine(engine, name: str):
+    """给 SQLAlchemy 引擎（异步引擎传入 sync_engine）加上 SQL 计时"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._taskrun_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_taskrun_started', None)
+        if started is not None:
+            db_query_duration.observe(time.perf_counter() - started, name, _operation(statement))
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(exception_context):
+        statement = exception_context.statement or ''
+        db_query_errors.inc(name, _operation(statement))
+
+
+def _log_buffers():
+    from app.services.log_stream import logs_store
+    return sorted(logs_store.items())
+
+
+def _log_subscribers():
+    from app.services.log_stream import log_stream_manager
+    return [((log_type,), len(log_stream_manager.subscribers.get(log_type, {}))) for log_type, _ in _log_buffers()]
+
+
+registry.register(GaugeFunc('taskrun_log_stream_subscribers', 'SSE 日志流订阅者数', ('log_type',),
+                            _log_subscribers))
+registry.register(GaugeFunc('taskrun_log_buffer_fill_ratio', '日志环形缓冲区使用率', ('log_type',),
+                            lambda: [((t,), min(b.last_seq, b.capacity) / b.capacity) for t, b in _log_buffers()]))
+# 环形缓冲区的序号从 1 开始递增，最新序号就是服务启动以来写入的行数
+registry.register(GaugeFunc('taskrun_log_lines_total', '服务启动以来写入的日志行数', ('log_type',),
+                            lambda: [((t,), b.last_seq) for t, b in _log_buffers()], kind='counter'))
+
+
+def _runner_status() -> dict:
+    from app.services.process_supervisor import supervisor
+    return supervisor.status()
+
+
+def _runner_consumers():
+    from runner_topology import read_state
+    status = _runner_status()
+    state = read_state()
+    if status['status'] != 'running' or not state or state.get('pid') != status.get('pid'):
+        return []
+    return [((unit['group'] or ','.join(unit['queues']),), len(unit['pids'])) for unit in state['units']]
+
+
+def _install_running():
+    from app.services.dependency_installer import installer
+    return [((), 1 if installer.running else 0)]
+
+
+registry.register(GaugeFunc('taskrun_runner_up', 'taskrunner 是否在运行', (),
+                            lambda: [((), 1 if _runner_status()['status'] == 'running' else 0)]))
+registry.register(GaugeFunc('taskrun_runner_uptime_seconds', 'taskrunner 本次运行时长', (),
+                            lambda: [((), _runner_status().get('uptime', 0))]))
+registry.register(GaugeFunc('taskrun_runner_restarts_total', 'taskrunner 自动重启次数', (),
+                            lambda: [((), _runner_status()['restarts'])], kind='counter'))
+registry.register(GaugeFunc('taskrun_runner_consumer_processes', '按拓扑配置启动的消费进程数', ('unit',),
+                            _runner_consumers))
+registry.register(GaugeFunc('taskrun_install_running', '是否正在安装依赖', (), _install_running))
+
+
+def setup_metrics(app, engines: Optional[Dict[str, object]] = None):
+    if not METRICS_ENABLED:
+        return
+    app.add_middleware(MetricsMiddleware)
+    for name, engine in (engines or {}).items():
+        instrument_engine(getattr(engine, 'sync_engine', engine), name)
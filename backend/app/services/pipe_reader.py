@@ -0,0 +1,155 @@
+"""
+子进程输出读取：所有子进程的 stdout/stderr 管道由同一个线程通过 selectors 读取
+
+- 每次可读时用 os.read 读取一整块（最多 PIPE_READ_CHUNK 字节），增量解码后按行拆分，整批写入日志
+- 没有换行的半行留到下一块；超过 PIPE_MAX_LINE 仍没有换行时按一行输出，避免无限累积
+- 管道关闭（子进程退出）时输出剩余的半行并注销，不会因为进程重启留下读取线程
+"""
+import codecs
+import logging
+import os
+import selectors
+import threading
+from typing import Callable, Dict, List, Optional
+
+from app.services.log_stream import STREAM_STDERR, STREAM_STDOUT, add_logs
+
+PIPE_READ_CHUNK = int(os.getenv('PIPE_READ_CHUNK', '65536'))
+PIPE_MAX_LINE = int(os.getenv('PIPE_MAX_LINE', '65536'))
+
+logger = logging.getLogger(__name__)
+
+
+class PipeStream:
+    """一个已注册的管道：来源标记、增量解码器和尚未遇到换行的半行"""
+
+    def __init__(self, pipe, log_type: str, stream: str):
+        # pipe 对象由读取线程持有，读完后一起关闭
+        self.pipe = pipe
+        self.fd = pipe.fileno()
+        self.log_type = log_type
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.partial = ''
+        self.closed = threading.Event()
+
+    def feed(self, data: bytes, final: bool = False) -> List[str]:
+        text = self.partial + self.decoder.decode(data, final)
+        lines = text.split('\n')
+        self.partial = lines.pop()
+        if final or len(self.partial) > PIPE_MAX_LINE:
+            if self.partial:
+                lines.append(self.partial)
+            self.partial = ''
+        return [line.rstrip() for line in lines]
+
+
+class PipeReader:
+    def __init__(self, chunk_size: int = PIPE_READ_CHUNK):
+        self.chunk_size = chunk_size
+        self._selector = selectors.DefaultSelector()
+        self._streams: Dict[int, PipeStream] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # 注册新管道时通过自管道唤醒正在 select 的读取线程
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._pending: List[PipeStream] = []
+
+    def register(self, pipe, log_type: str, stream: str) -> threading.Event:
+        """
+        开始读取 pipe（子进程的 stdout/stderr，需以二进制模式打开）
+
+        返回的 Event 在管道读完（子进程关闭输出）且剩余日志已写入后被设置
+        """
+        os.set_blocking(pipe.fileno(), False)
+        item = PipeStream(pipe, log_type, stream)
+        with self._lock:
+            self._pending.append(item)
+            self._ensure_thread()
+        self._wakeup()
+        return item.closed
+
+    @property
+    def active(self) -> int:
+        """正在读取的管道数"""
+        with self._lock:
+            return len(self._streams) + len(self._pending)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='pipe-reader', daemon=True)
+            self._thread.start()
+
+    def _wakeup(self):
+        try:
+            os.write(self._wakeup_w, b'\0')
+        except BlockingIOError:
+            pass
+
+    def _add_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for item in pending:
+            self._streams[item.fd] = item
+            self._selector.register(item.fd, selectors.EVENT_READ, item)
+
+    def _close(self, item: PipeStream):
+        if self._streams.pop(item.fd, None) is None:
+            return
+        self._selector.unregister(item.fd)
+        try:
+            item.pipe.close()
+        except OSError:
+            pass
+        item.closed.set()
+
+    def _read(self, item: PipeStream):
+        try:
+            data = os.read(item.fd, self.chunk_size)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.warning(f"读取子进程输出失败: {e}")
+            data = b''
+        add_logs(item.log_type, item.feed(data, final=not data), item.stream)
+        if not data:
+            self._close(item)
+
+    def _run(self):
+        while True:
+            for key, _ in self._selector.select():
+                if key.fd == self._wakeup_r:
+                    try:
+                        while os.read(self._wakeup_r, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    self._add_pending()
+                    continue
+                try:
+                    self._read(key.data)
+                except Exception as e:
+                    # 单个管道出错不影响其它管道的读取
+                    logger.exception(f"处理子进程输出失败: {e}")
+                    self._close(key.data)
+
+
+pipe_reader = PipeReader()
+
+
+def read_process_output(process, log_type: str) -> Callable[[float], bool]:
+    """
+    读取子进程的 stdout/stderr 并按来源打上标记，返回等待两个管道都读完的函数
+
+    stderr 未单独重定向（合并到 stdout）时只读取 stdout
+    """
+    events = [pipe_reader.register(process.stdout, log_type, STREAM_STDOUT)]
+    if process.stderr is not None:
+        events.append(pipe_reader.register(process.stderr, log_type, STREAM_STDERR))
+
+    def wait(timeout: Optional[float] = None) -> bool:
+        return all(event.wait(timeout) for event in events)
+    return wait
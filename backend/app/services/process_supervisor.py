@@ -0,0 +1,205 @@
+"""
+taskrunner 进程守护
+
+- taskrunner 在独立的进程组中运行，停止时只向这个进程组发送信号，不会误杀主机上其它同名进程
+- 停止：先发送 SIGTERM，等待 PROCESS_DRAIN_SECONDS 秒让正在执行的任务完成，超时后 SIGKILL 整个进程组
+- 异常退出后按指数退避自动重启；连续运行超过 PROCESS_STABLE_SECONDS 秒后退避时间重置
+"""
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+
+from app.services.log_stream import add_log
+from app.services.pipe_reader import read_process_output
+
+PROCESS_DRAIN_SECONDS = float(os.getenv('PROCESS_DRAIN_SECONDS', '30'))
+PROCESS_AUTO_RESTART = os.getenv('PROCESS_AUTO_RESTART', 'True').lower() in ('1', 'true', 'yes')
+PROCESS_RESTART_BACKOFF = float(os.getenv('PROCESS_RESTART_BACKOFF', '1'))
+PROCESS_RESTART_BACKOFF_MAX = float(os.getenv('PROCESS_RESTART_BACKOFF_MAX', '60'))
+PROCESS_STABLE_SECONDS = float(os.getenv('PROCESS_STABLE_SECONDS', '60'))
+# 状态接口中保留的最近退出记录数
+PROCESS_EXIT_HISTORY = 20
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+logger = logging.getLogger(__name__)
+
+
+def describe_exit(returncode: int) -> str:
+    if returncode < 0:
+        try:
+            return f"被信号 {signal.Signals(-returncode).name} 结束"
+        except ValueError:
+            return f"被信号 {-returncode} 结束"
+    return f"退出码 {returncode}"
+
+
+class ProcessSupervisor:
+    def __init__(self, command: List[str], cwd: str, name: str = 'taskrunner',
+                 drain_seconds: float = PROCESS_DRAIN_SECONDS, auto_restart: bool = PROCESS_AUTO_RESTART,
+                 backoff: float = PROCESS_RESTART_BACKOFF, backoff_max: float = PROCESS_RESTART_BACKOFF_MAX,
+                 stable_seconds: float = PROCESS_STABLE_SECONDS):
+        self.command = command
+        self.cwd = cwd
+        self.name = name
+        self.drain_seconds = drain_seconds
+        self.auto_restart = auto_restart
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.stable_seconds = stable_seconds
+
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at: Optional[float] = None
+        self.restarts = 0
+        self.exits = deque(maxlen=PROCESS_EXIT_HISTORY)
+        self.next_restart_at: Optional[float] = None
+        # 期望状态：True 表示应当保持运行，异常退出后自动拉起
+        self._wanted = False
+        self._current_backoff = backoff
+        self._lock = threading.RLock()
+        # 停止时唤醒正在等待退避时间的重启线程
+        self._cancel_restart = threading.Event()
+
+    def _log(self, message: str):
+        logger.info(message)
+        add_log('process', f"[supervisor] {message}")
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def _spawn(self):
+        env = dict(os.environ)
+        # 子进程自己的排空时间略短于守护进程的等待时间，留出写完结果、退出的余量
+        env['RUNNER_DRAIN_SECONDS'] = str(max(1.0, self.drain_seconds - 5))
+        process = subprocess.Popen(self.command, cwd=self.cwd, env=env, start_new_session=True,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+        read_process_output(process, 'process')
+        self.process = process
+        self.started_at = time.time()
+        self.next_restart_at = None
+        threading.Thread(target=self._watch, args=(process,), name=f'{self.name}-watch', daemon=True).start()
+        self._log(f"{self.name} 已启动，pid={process.pid}")
+
+    def _watch(self, process: subprocess.Popen):
+        """等待进程退出，记录退出码；仍期望运行时按退避时间重启"""
+        started_at = self.started_at
+        returncode = process.wait()
+        with self._lock:
+            current = process is self.process
+            uptime = time.time() - started_at
+            self.exits.append({
+                'pid': process.pid,
+                'exit_code': returncode,
+                'uptime': round(uptime, 1),
+                'time': datetime.now().isoformat(timespec='seconds'),
+                # 通过 stop/restart 主动停止的退出
+                'expected': not (current and self._wanted),
+            })
+            if not current or not self._wanted:
+                return
+            self._log(f"{self.name} 异常退出（{describe_exit(returncode)}），运行了 {uptime:.1f} 秒")
+            if not self.auto_restart:
+                self._wanted = False
+                return
+            if uptime >= self.stable_seconds:
+                self._current_backoff = self.backoff
+            delay = self._current_backoff
+            self._current_backoff = min(self._current_backoff * 2, self.backoff_max)
+            self.next_restart_at = time.time() + delay
+            self._cancel_restart.clear()
+            self._log(f"{delay:.1f} 秒后自动重启")
+
+        if self._cancel_restart.wait(delay):
+            return
+        with self._lock:
+            if self._wanted and process is self.process:
+                self.restarts += 1
+                try:
+                    self._spawn()
+                except Exception as e:
+                    self.next_restart_at = None
+                    self._wanted = False
+                    self._log(f"{self.name} 自动重启失败: {e}")
+
+    def start(self, command: Optional[List[str]] = None) -> bool:
+        """启动进程；已在运行时返回 False。command 为本次及之后自动重启使用的命令"""
+        with self._lock:
+            if self.is_running():
+                return False
+            if command:
+                self.command = command
+            self._cancel_restart.set()
+            self._wanted = True
+            self._current_backoff = self.backoff
+            self._spawn()
+            return True
+
+    def stop(self, drain_seconds: Optional[float] = None) -> Optional[int]:
+        """
+        停止进程并返回退出码，进程未运行时返回 None
+
+        先向进程组发送 SIGTERM，等待 drain_seconds 秒后仍未退出再 SIGKILL 整个进程组。
+        阻塞直到进程退出，在接口中需放到线程池执行
+        """
+        drain_seconds = self.drain_seconds if drain_seconds is None else drain_seconds
+        with self._lock:
+            self._wanted = False
+            self._cancel_restart.set()
+            self.next_restart_at = None
+            process = self.process
+        if process is None or process.poll() is not None:
+            return None
+
+        self._log(f"正在停止 {self.name}（pid={process.pid}），最多等待 {drain_seconds:g} 秒让正在执行的任务完成")
+        self._signal_group(process, signal.SIGTERM)
+        try:
+            returncode = process.wait(drain_seconds)
+        except subprocess.TimeoutExpired:
+            self._log(f"{self.name} 未在 {drain_seconds:g} 秒内退出，强制结束进程组")
+            self._signal_group(process, signal.SIGKILL)
+            returncode = process.wait()
+        # 主进程退出后可能还有未退出的消费子进程
+        self._signal_group(process, signal.SIGKILL)
+        self._log(f"{self.name} 已停止（{describe_exit(returncode)}）")
+        return returncode
+
+    def restart(self, drain_seconds: Optional[float] = None, command: Optional[List[str]] = None) -> bool:
+        self.stop(drain_seconds)
+        return self.start(command)
+
+    @staticmethod
+    def _signal_group(process: subprocess.Popen, sig: int):
+        # start_new_session 后进程组号等于主进程 pid
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def status(self) -> dict:
+        with self._lock:
+            exits = list(self.exits)
+            data = {
+                'status': 'stopped',
+                'restarts': self.restarts,
+                'auto_restart': self.auto_restart,
+                'drain_seconds': self.drain_seconds,
+                'python': self.command[0],
+                'last_exit_code': exits[-1]['exit_code'] if exits else None,
+                'exits': exits,
+            }
+            if self.is_running():
+                data.update(status='running', pid=self.process.pid,
+                            uptime=round(time.time() - self.started_at, 1),
+                            started_at=datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'))
+            elif self._wanted and self.next_restart_at:
+                data.update(status='restarting', restart_in=round(max(0.0, self.next_restart_at - time.time()), 1))
+            return data
+
+
+supervisor = ProcessSupervisor(['python', '-u', 'taskrunner.py'], cwd=BACKEND_DIR)
@@ -0,0 +1,125 @@
+"""
+API 发起的性能分析：同时采样 API 进程和 taskrunner 的所有进程，结果合并为一份折叠栈，见 runner_profiler
+
+同一时间只运行一个分析；各进程的结果写到 RUNNER_PROFILE_DIR/<分析 id>/ 下，结束后（或超过等待时间后）合并。
+"""
+import glob
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from runner_profiler import (PROFILE_SIGNAL, RUNNER_PROFILE_DIR, SamplingProfiler, write_collapsed, write_request)
+from runner_topology import read_state
+
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '120'))
+PROFILE_MAX_HZ = float(os.getenv('PROFILE_MAX_HZ', '500'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '20'))
+# 分析结束后等待各进程写出结果的时间
+PROFILE_COLLECT_GRACE = 3.0
+
+
+class ProfileBusyError(RuntimeError):
+    pass
+
+
+class ProfileUnavailableError(RuntimeError):
+    pass
+
+
+class ProfileManager:
+    def __init__(self, profile_dir: str = RUNNER_PROFILE_DIR):
+        self.profile_dir = profile_dir
+        self.current: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    def start(self, seconds: float, hz: float, target: str, include_idle: bool = False,
+              runner_pid: Optional[int] = None) -> dict:
+        """target 为 all / api / runner；runner_pid 为 taskrunner 主进程，未运行时只分析 API 进程"""
+        with self._lock:
+            if self.current and not self._finished(self.current):
+                raise ProfileBusyError("已有性能分析正在进行")
+            consumers = None
+            if target in ('all', 'runner') and runner_pid:
+                if PROFILE_SIGNAL is None:
+                    raise ProfileUnavailableError("当前平台不支持分析 taskrunner 进程（没有 SIGUSR2）")
+                # 状态文件在 taskrunner 注册 SIGUSR2 处理之后才写入，写入前发信号会按默认处理结束进程
+                state = read_state()
+                if not state or state.get('pid') != runner_pid:
+                    raise ProfileUnavailableError("进程尚未就绪")
+                consumers = sum(len(unit['pids']) for unit in state['units'])
+            request = {'id': time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6], 'started_at': time.time(),
+                       'seconds': seconds, 'hz': hz, 'include_idle': include_idle}
+            write_request(request, self.profile_dir)
+            expected = 0
+            if target in ('all', 'api'):
+                label = f"api-{os.getpid()}"
+                output = os.path.join(self.profile_dir, request['id'], f"{label}.collapsed")
+                SamplingProfiler(hz, label, include_idle).start(
+                    seconds, lambda p: write_collapsed(output, p.collapsed()))
+                expected += 1
+            if consumers is not None:
+                # taskrunner 主进程收到信号后转发给各消费进程
+                os.kill(runner_pid, PROFILE_SIGNAL)
+                expected += 1 + consumers
+            self.current = dict(request, target=target, expected=expected)
+            self._prune()
+            return self.status(request['id'])
+
+    def _prune(self):
+        """只保留最近 PROFILE_KEEP 次分析的结果"""
+        for name in self._names()[PROFILE_KEEP:]:
+            shutil.rmtree(self._dir(name), ignore_errors=True)
+
+    def _names(self) -> list:
+        if not os.path.isdir(self.profile_dir):
+            return []
+        return sorted((name for name in os.listdir(self.profile_dir)
+                       if os.path.isdir(os.path.join(self.profile_dir, name))), reverse=True)
+
+    def _dir(self, profile_id: str) -> str:
+        return os.path.join(self.profile_dir, os.path.basename(profile_id))
+
+    def _files(self, profile_id: str) -> list:
+        return sorted(glob.glob(os.path.join(self._dir(profile_id), '*.collapsed')))
+
+    def _finished(self, session: dict) -> bool:
+        if time.time() >= session['started_at'] + session['seconds'] + PROFILE_COLLECT_GRACE:
+            return True
+        return time.time() >= session['started_at'] + session['seconds'] \
+            and len(self._files(session['id'])) >= session['expected']
+
+    def status(self, profile_id: str) -> Optional[dict]:
+        if not os.path.isdir(self._dir(profile_id)):
+            return None
+        session = self.current if self.current and self.current['id'] == profile_id else None
+        files = self._files(profile_id)
+        return {
+            'id': profile_id,
+            'finished': self._finished(session) if session else True,
+            'seconds': session['seconds'] if session else None,
+            'hz': session['hz'] if session else None,
+            'target': session['target'] if session else None,
+            'remaining': round(max(0.0, session['started_at'] + session['seconds'] - time.time()), 1) if session else 0,
+            'processes': [os.path.basename(path)[:-len('.collapsed')] for path in files],
+        }
+
+    def collapsed(self, profile_id: str) -> str:
+        """合并各进程的折叠栈，按样本数从多到少排列"""
+        stacks = Counter()
+        for path in self._files(profile_id):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if stack and count.isdigit():
+                        stacks[stack] += int(count)
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def list(self) -> list:
+        return [self.status(name) for name in self._names()]
+
+
+profiler = ProfileManager()
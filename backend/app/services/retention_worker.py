@@ -0,0 +1,78 @@
+"""
+后台保留期清理任务：定期归档并删除超过保留天数的消费结果
+"""
+import logging
+import os
+import threading
+from typing import Optional
+
+from app.crud import result_retention
+from app.database import SessionLocal
+
+RETENTION_INTERVAL = float(os.getenv('RETENTION_INTERVAL', '3600'))
+
+logger = logging.getLogger(__name__)
+
+
+def retention_configured() -> bool:
+    """默认保留天数和所有队列的保留天数都为 0 时不需要清理"""
+    return result_retention.RESULTS_RETENTION_DAYS > 0 or any(
+        days > 0 for days in result_retention.parse_queue_retention().values())
+
+
+class RetentionWorker:
+    def __init__(self, interval: float = RETENTION_INTERVAL):
+        self.interval = interval
+        self.last_report: Optional[dict] = None
+        self.last_error: Optional[str] = None
+        self._stop_event = threading.Event()
+        self._run_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='result-retention', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._run_lock.locked()
+
+    def run_once(self) -> Optional[dict]:
+        """执行一轮清理并返回报告；已有一轮在执行时返回 None"""
+        if not self._run_lock.acquire(blocking=False):
+            return None
+        db = SessionLocal()
+        try:
+            report = result_retention.run_retention(db)
+            self.last_report, self.last_error = report, None
+            return report
+        except Exception as e:
+            db.rollback()
+            self.last_error = str(e)
+            raise
+        finally:
+            db.close()
+            self._run_lock.release()
+
+    def _run(self):
+        while True:
+            try:
+                report = self.run_once()
+                if report and report['rows_deleted']:
+                    logger.info(f"结果保留期清理完成，删除 {report['rows_deleted']} 条，"
+                                f"归档 {report['archive_bytes']} 字节，约释放 {report['reclaimed_bytes']} 字节")
+            except Exception as e:
+                logger.warning(f"结果保留期清理失败: {e}")
+            if self._stop_event.wait(self.interval):
+                break
+
+
+retention_worker = RetentionWorker()
@@ -0,0 +1,59 @@
+"""
+后台聚合任务：定期把新的消费结果折叠进分钟/小时聚合表
+"""
+import logging
+import threading
+from typing import Optional
+
+from app.crud import result_rollup
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class RollupWorker:
+    def __init__(self, interval: float = result_rollup.ROLLUP_INTERVAL):
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._tables_ready = False
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='result-rollup', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run_once(self) -> int:
+        """执行一轮聚合，返回折叠的原始结果行数"""
+        if not self._tables_ready:
+            result_rollup.ensure_rollup_tables()
+            self._tables_ready = True
+        db = SessionLocal()
+        try:
+            return result_rollup.rollup_once(db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _run(self):
+        while True:
+            try:
+                processed = self.run_once()
+                if processed:
+                    logger.info(f"结果聚合完成，本轮折叠 {processed} 条结果")
+            except Exception as e:
+                logger.warning(f"结果聚合失败: {e}")
+            if self._stop_event.wait(self.interval):
+                break
+
+
+rollup_worker = RollupWorker()
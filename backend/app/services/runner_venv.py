@@ -0,0 +1,160 @@
+"""
+taskrunner 独立虚拟环境
+
+任务目录 requirements.txt 中的依赖安装到单独的 venv 中，taskrunner 用这个 venv 的 Python 启动，API 进程的
+site-packages 不再受任务依赖影响：
+
+- venv 按 requirements.txt 内容和 Python 版本的 sha256 命名，requirements.txt 不变时一直复用，变化后新建一个，
+  保留最近 RUNNER_VENV_KEEP 个，便于回退
+- 使用 --system-site-packages 创建，taskrunner 本身依赖的 funboost 等仍从系统环境导入
+- 安装完成后把 site-packages 中的文件按内容 sha256 硬链接到共享的 RUNNER_VENV_DIR/.store，多个 venv
+  （多个任务项目或多个版本）中相同的文件只占一份磁盘空间
+- 创建完成后写入标记文件，中途失败的 venv 下次会重新创建
+"""
+import hashlib
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import time
+from typing import Optional
+
+RUNNER_VENV = os.getenv('RUNNER_VENV', 'True').lower() in ('1', 'true', 'yes')
+RUNNER_VENV_DIR = os.getenv('RUNNER_VENV_DIR', os.path.join(os.getenv('LOGS_DIR', '/app/logs'), 'venvs'))
+RUNNER_VENV_KEEP = int(os.getenv('RUNNER_VENV_KEEP', '2'))
+# 小文件硬链接节省的空间有限，只链接不小于该大小的文件
+RUNNER_VENV_LINK_MIN_SIZE = int(os.getenv('RUNNER_VENV_LINK_MIN_SIZE', '4096'))
+
+READY_MARKER = '.taskrun-ready'
+
+
+def venv_key(tasks_dir: str) -> str:
+    req_file = os.path.join(tasks_dir, 'requirements.txt')
+    content = b''
+    if os.path.exists(req_file):
+        with open(req_file, 'rb') as f:
+            content = f.read()
+    return hashlib.sha256(sys.version.encode() + b'\0' + content).hexdigest()[:16]
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RunnerVenv:
+    def __init__(self, root: str, key: str):
+        self.key = key
+        self.path = os.path.join(root, key)
+
+    @property
+    def python(self) -> str:
+        return os.path.join(self.path, 'bin', 'python')
+
+    @property
+    def ready(self) -> bool:
+        return os.path.exists(os.path.join(self.path, READY_MARKER))
+
+    def site_packages(self) -> str:
+        return os.path.join(self.path, 'lib', f'python{sys.version_info.major}.{sys.version_info.minor}', 'site-packages')
+
+
+class RunnerVenvManager:
+    def __init__(self, root: str = RUNNER_VENV_DIR, keep: int = RUNNER_VENV_KEEP,
+                 link_min_size: int = RUNNER_VENV_LINK_MIN_SIZE):
+        self.root = root
+        self.store = os.path.join(root, '.store')
+        self.keep = keep
+        self.link_min_size = link_min_size
+
+    def for_tasks(self, tasks_dir: str) -> RunnerVenv:
+        return RunnerVenv(self.root, venv_key(tasks_dir))
+
+    def create(self, venv: RunnerVenv):
+        """创建空的 venv（带 pip），已有未完成的同名 venv 先删除"""
+        if os.path.exists(venv.path):
+            shutil.rmtree(venv.path)
+        os.makedirs(self.root, exist_ok=True)
+        subprocess.run([sys.executable, '-m', 'venv', '--system-site-packages', venv.path],
+                       check=True, capture_output=True, text=True)
+
+    def mark_ready(self, venv: RunnerVenv):
+        with open(os.path.join(venv.path, READY_MARKER), 'w') as f:
+            f.write(str(time.time()))
+
+    def dedupe(self, venv: RunnerVenv) -> dict:
+        """把 site-packages 中的文件硬链接到共享存储，返回 {'linked': 复用的文件数, 'stored': 新存入的文件数, 'saved_bytes': ...}"""
+        stats = {'linked': 0, 'stored': 0, 'saved_bytes': 0}
+        site_packages = venv.site_packages()
+        for dirpath, _, filenames in os.walk(site_packages):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                st = os.lstat(path)
+                if not stat.S_ISREG(st.st_mode) or st.st_nlink > 1 or st.st_size < self.link_min_size:
+                    continue
+                # 可执行权限不同的文件分开存放，硬链接共用同一个权限
+                digest = _file_sha256(path) + ('x' if st.st_mode & stat.S_IXUSR else '')
+                target = os.path.join(self.store, digest[:2], digest)
+                try:
+                    if os.path.exists(target):
+                        tmp = f"{path}.taskrun-link"
+                        os.link(target, tmp)
+                        os.replace(tmp, path)
+                        stats['linked'] += 1
+                        stats['saved_bytes'] += st.st_size
+                    else:
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        os.link(path, target)
+                        stats['stored'] += 1
+                except OSError as e:
+                    # 存储目录与 venv 不在同一文件系统等情况，不影响 venv 使用
+                    stats['error'] = str(e)
+                    return stats
+        return stats
+
+    def prune(self, current: RunnerVenv, in_use: Optional[str] = None) -> list:
+        """只保留最近的 keep 个 venv（当前和正在运行的不删除），并清理共享存储中不再被引用的文件"""
+        if not os.path.isdir(self.root):
+            return []
+        venvs = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            marker = os.path.join(path, READY_MARKER)
+            venvs.append((os.path.getmtime(marker) if os.path.exists(marker) else 0, path))
+        venvs.sort(reverse=True)
+        removed = []
+        for index, (_, path) in enumerate(venvs):
+            if index < self.keep or path == current.path or (in_use and in_use.startswith(path + os.sep)):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(os.path.basename(path))
+        if removed and os.path.isdir(self.store):
+            for dirpath, _, filenames in os.walk(self.store):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    if os.lstat(path).st_nlink == 1:
+                        os.remove(path)
+        return removed
+
+    def status(self, tasks_dir: str) -> dict:
+        venv = self.for_tasks(tasks_dir)
+        return {'enabled': RUNNER_VENV, 'key': venv.key, 'path': venv.path, 'ready': venv.ready}
+
+
+runner_venvs = RunnerVenvManager()
+
+
+def runner_python(tasks_dir: str) -> str:
+    """taskrunner 使用的 Python；启用独立 venv 但还没有创建好时抛出 RuntimeError"""
+    if not RUNNER_VENV:
+        return 'python'
+    venv = runner_venvs.for_tasks(tasks_dir)
+    if not venv.ready:
+        raise RuntimeError("任务运行环境未就绪，请先安装依赖")
+    return venv.python
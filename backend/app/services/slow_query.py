@@ -0,0 +1,159 @@
+"""
+慢查询记录
+
+SQLAlchemy cursor 事件记录执行时间超过 SLOW_QUERY_MS 的语句、绑定参数和调用时间，保存在内存中最近
+SLOW_QUERY_LOG_SIZE 条的环形缓冲区里，由 /api/db/slow-queries 查看。
+
+SELECT 语句另外由后台线程在单独的连接上执行 EXPLAIN（sqlite 为 EXPLAIN QUERY PLAN），不占用发出查询的连接，
+也不阻塞请求；EXPLAIN 本身不会被记录为慢查询。
+"""
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_LOG_SIZE = int(os.getenv('SLOW_QUERY_LOG_SIZE', '100'))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'True').lower() in ('1', 'true', 'yes')
+
+# 执行 EXPLAIN 的连接带上该选项，事件处理中据此跳过
+SKIP_OPTION = 'taskrun_skip_slow_query_log'
+EXPLAIN_PREFIXES = {'sqlite': 'EXPLAIN QUERY PLAN ', 'mysql': 'EXPLAIN ', 'mariadb': 'EXPLAIN ', 'postgresql': 'EXPLAIN '}
+# 记录的参数值和 SQL 的最大长度，避免 JSON、长文本占用过多内存
+MAX_PARAM_LENGTH = 200
+MAX_STATEMENT_LENGTH = 10000
+
+
+def _short(value):
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    text = str(value)
+    return text if len(text) <= MAX_PARAM_LENGTH else text[:MAX_PARAM_LENGTH] + '...'
+
+
+def _short_params(parameters):
+    if isinstance(parameters, dict):
+        return {key: _short(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_short(value) for value in parameters]
+    return _short(parameters)
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, size: int = SLOW_QUERY_LOG_SIZE,
+                 explain: bool = SLOW_QUERY_EXPLAIN):
+        self.threshold = threshold_ms / 1000
+        self.explain_enabled = explain
+        self.entries = deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # 与发出查询的引擎参数格式相同、可以在普通线程中使用的同步引擎，用于执行 EXPLAIN
+        self._explain_engines = {}
+        self._explain_queue = queue.Queue(maxsize=size)
+        self._worker: Optional[threading.Thread] = None
+
+    def instrument(self, engine, name: str, explain_engine=None):
+        """
+        给引擎加上慢查询记录；异步引擎传入 sync_engine，并通过 explain_engine 指定一个参数格式相同的同步引擎
+        执行 EXPLAIN（不指定或参数格式不同时不执行 EXPLAIN）
+        """
+        from sqlalchemy import event
+
+        if explain_engine is not None and explain_engine.dialect.paramstyle == engine.dialect.paramstyle:
+            self._explain_engines[name] = explain_engine
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._slow_query_started = time.perf_counter()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, '_slow_query_started', None)
+            if started is None:
+                return
+            elapsed = time.perf_counter() - started
+            if elapsed >= self.threshold and not conn.get_execution_options().get(SKIP_OPTION):
+                self.record(name, statement, parameters, elapsed, executemany)
+
+    def record(self, engine_name: str, statement: str, parameters, elapsed: float, executemany: bool = False):
+        entry = {
+            'id': next(self._ids),
+            'engine': engine_name,
+            'at': datetime.now().isoformat(timespec='milliseconds'),
+            'duration_ms': round(elapsed * 1000, 2),
+            'statement': statement[:MAX_STATEMENT_LENGTH],
+            # executemany 只保留第一组参数
+            'parameters': _short_params(parameters[0] if executemany and parameters else parameters),
+            'executemany': executemany,
+            'explain': None,
+        }
+        with self._lock:
+            self.entries.append(entry)
+        if not self.explain_enabled:
+            return
+        if engine_name not in self._explain_engines:
+            entry['explain'] = {'error': "该连接的参数格式与同步引擎不同，未执行 EXPLAIN"}
+        elif executemany or statement.lstrip()[:6].upper() != 'SELECT':
+            entry['explain'] = {'error': "只对 SELECT 执行 EXPLAIN"}
+        else:
+            try:
+                self._explain_queue.put_nowait((entry, statement, parameters))
+            except queue.Full:
+                entry['explain'] = {'error': "EXPLAIN 队列已满，跳过"}
+                return
+            self._ensure_worker()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._explain_loop, name='slow-query-explain', daemon=True)
+                self._worker.start()
+
+    def _explain_loop(self):
+        while True:
+            entry, statement, parameters = self._explain_queue.get()
+            try:
+                entry['explain'] = self.explain(self._explain_engines[entry['engine']], statement, parameters)
+            except Exception as e:
+                entry['explain'] = {'error': f"EXPLAIN 失败: {e}"}
+
+    def explain(self, engine, statement: str, parameters) -> dict:
+        prefix = EXPLAIN_PREFIXES.get(engine.dialect.name)
+        if prefix is None:
+            return {'error': f"不支持 {engine.dialect.name} 的 EXPLAIN"}
+        with engine.connect().execution_options(**{SKIP_OPTION: True}) as conn:
+            result = conn.exec_driver_sql(prefix + statement, parameters)
+            return {'columns': list(result.keys()), 'rows': [[_short(value) for value in row] for row in result]}
+
+    def list(self, limit: Optional[int] = None) -> list:
+        """最近的慢查询，新的在前"""
+        with self._lock:
+            entries = list(self.entries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def status(self) -> dict:
+        return {'threshold_ms': self.threshold * 1000, 'size': self.entries.maxlen, 'explain': self.explain_enabled,
+                'count': len(self.entries)}
+
+
+slow_query_log = SlowQueryLog()
+
+
+def setup_slow_query_log(engine, async_engine):
+    """SLOW_QUERY_MS 小于 0 时不记录"""
+    if SLOW_QUERY_MS < 0:
+        return
+    slow_query_log.instrument(engine, 'sync', explain_engine=engine)
+    slow_query_log.instrument(async_engine.sync_engine, 'async', explain_engine=engine)
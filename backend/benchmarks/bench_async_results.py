@@ -0,0 +1,143 @@
+"""
+结果列表接口并发压测：对比同步接口（占用 Starlette 线程池）与异步引擎接口在高并发下的吞吐和延迟
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_async_results.py --concurrency 200 --requests 2000 --latency-ms 100
+
+默认使用临时 SQLite 库，funboost_consume_results 被替换成一个视图，每条 SQL 执行时在驱动线程里
+sleep latency-ms 毫秒，模拟到 MySQL 的网络往返和查询耗时；设置 BENCH_DB_URL / BENCH_ASYNC_DB_URL
+可以直接压测已有数据的 MySQL 库（此时 --latency-ms 无效）。
+
+同步接口的并发受线程池（默认 40）和连接池限制，数据库越慢差距越明显；单个请求本身约有几毫秒的
+Python CPU 开销，延迟很小时两者都会先受 CPU 限制。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ['ROLLUP_ENABLED'] = 'False'
+
+
+def prepare_sqlite(url: str, rows: int, latency_ms: float):
+    from sqlalchemy import MetaData, create_engine, event, text
+    from sqlalchemy.pool import Pool
+
+    from app.models.funboost_result import FunboostConsumeResult
+
+    engine = create_engine(url)
+    data_table = FunboostConsumeResult.__table__.to_metadata(MetaData(), name='results_data')
+    for index in list(data_table.indexes):
+        index.name = f'{index.name}_data'
+    data_table.create(engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(data_table.insert(), [{
+            '_id': uuid.uuid4().hex,
+            'queue_name': f'queue_{i % 3}',
+            'function': 'f',
+            'insert_time': start + timedelta(seconds=i),
+            'success': i % 7 != 0,
+            'time_cost': 0.01 * (i % 100),
+        } for i in range(rows)])
+        # 不相关的标量子查询每条语句只执行一次，相当于每次数据库往返增加固定延迟
+        conn.execute(text(
+            f"CREATE VIEW {FunboostConsumeResult.__tablename__} AS "
+            f"SELECT * FROM results_data WHERE (SELECT bench_rtt({latency_ms}))"))
+    engine.dispose()
+
+    @event.listens_for(Pool, 'connect')
+    def register_rtt(dbapi_conn, _):
+        if hasattr(dbapi_conn, 'create_function'):
+            dbapi_conn.create_function('bench_rtt', 1, lambda ms: time.sleep(ms / 1000) or 1)
+
+
+async def run_load(client, url: str, headers: dict, concurrency: int, requests: int):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            i = queue.get_nowait()
+            t0 = time.perf_counter()
+            resp = await client.get(url, params={'page': i % 20 + 1, 'size': 20, 'queue_name': f'queue_{i % 3}'},
+                                    headers=headers)
+            latencies.append(time.perf_counter() - t0)
+            if resp.status_code != 200 or not resp.json().get('succ'):
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        'rps': requests / elapsed,
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--latency-ms', type=float, default=100)
+    args = parser.parse_args()
+
+    if os.getenv('BENCH_DB_URL'):
+        os.environ['SQLACHEMY_ENGINE_URL'] = os.environ['BENCH_DB_URL']
+        if os.getenv('BENCH_ASYNC_DB_URL'):
+            os.environ['SQLACHEMY_ASYNC_ENGINE_URL'] = os.environ['BENCH_ASYNC_DB_URL']
+    else:
+        # 需要在导入 app 之前设置，app.database 导入时就会创建引擎
+        os.environ['SQLACHEMY_ENGINE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+        prepare_sqlite(os.environ['SQLACHEMY_ENGINE_URL'], args.rows, args.latency_ms)
+
+    import httpx
+    from fastapi import Depends, Query
+    from sqlalchemy.orm import Session
+
+    from app.crud import funboost_result as crud
+    from app.crud.result_count import count_results
+    from app.database import get_db
+    from app.dependencies.auth import create_access_token
+    from app.main import app
+
+    # 改造前的同步实现，作为对照
+    @app.get('/bench/sync/results')
+    def sync_results(page: int = Query(1), size: int = Query(20), queue_name: str = None,
+                     db: Session = Depends(get_db)):
+        query = crud.apply_filters(crud.summary_query(db), None, queue_name, None)
+        total, _ = count_results(db, query, (None, queue_name, None), 'exact')
+        rows, _, _ = crud.fetch_page_by_offset(query, page, size)
+        return {'succ': True, 'data': {'total': total, 'data': crud.rows_to_dicts(rows)}}
+
+    headers = {'Authorization': 'Bearer ' + create_access_token({'sub': 'bench'})}
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=120) as client:
+            await client.get('/bench/sync/results', headers=headers)
+            await client.get('/api/funboost/results', headers=headers)
+            print(f"concurrency={args.concurrency} requests={args.requests} latency_ms={args.latency_ms}")
+            print(f"{'endpoint':>10} {'req/s':>10} {'p50(ms)':>10} {'p99(ms)':>10} {'errors':>8}")
+            for name, url in (('sync', '/bench/sync/results'), ('async', '/api/funboost/results?count_mode=exact')):
+                r = await run_load(client, url, headers, args.concurrency, args.requests)
+                print(f"{name:>10} {r['rps']:>10.1f} {r['p50']:>10.1f} {r['p99']:>10.1f} {r['errors']:>8}")
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
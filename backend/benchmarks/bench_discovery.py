@@ -0,0 +1,104 @@
+"""
+队列发现耗时对比：原来的 BoosterDiscovery.auto_discovery / 没有清单（首次启动）/ 清单命中 / 改动一个文件后
+
+在临时目录生成 N 个任务模块（每个定义一个队列）和 M 个不定义队列的脚本（每个执行时模拟
+--script-ms 毫秒的导入或初始化开销），每种情况在单独的进程中运行。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_discovery.py --tasks 50 --scripts 200 --script-ms 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+TASK_TEMPLATE = '''from funboost import boost, BoosterParams, BrokerEnum
+
+
+@boost(BoosterParams(queue_name='bench_q{i}', broker_kind=BrokerEnum.MEMORY_QUEUE, log_level=30))
+def bench_task_{i}(x):
+    return x
+'''
+
+SCRIPT_TEMPLATE = '''import time
+
+# 模拟脚本导入第三方库或做初始化的耗时
+time.sleep({seconds})
+VERSION = {version}
+'''
+
+
+def make_tree(tasks_dir: str, args):
+    for i in range(args.tasks):
+        with open(os.path.join(tasks_dir, f'bench_task_{i}.py'), 'w', encoding='utf-8') as f:
+            f.write(TASK_TEMPLATE.format(i=i))
+    scripts_dir = os.path.join(tasks_dir, 'scripts')
+    os.makedirs(scripts_dir, exist_ok=True)
+    for i in range(args.scripts):
+        with open(os.path.join(scripts_dir, f'script_{i}.py'), 'w', encoding='utf-8') as f:
+            f.write(SCRIPT_TEMPLATE.format(seconds=args.script_ms / 1000, version=0))
+
+
+def run_child(mode: str, tasks_dir: str, manifest: str):
+    sys.path.insert(0, BACKEND_DIR)
+    sys.path.insert(0, tasks_dir)
+    import runner_manifest
+    from funboost import BoostersManager
+    started = time.perf_counter()
+    if mode == 'auto_discovery':
+        from funboost import BoosterDiscovery
+        BoosterDiscovery(project_root_path=tasks_dir, booster_dirs=['.'], max_depth=3).auto_discovery()
+        stats = {}
+    else:
+        stats = runner_manifest.discover(tasks_dir, BoostersManager, max_depth=3, manifest_path=manifest)
+    stats.update(mode=mode, seconds=time.perf_counter() - started, queues=len(BoostersManager.get_all_queues()))
+    sys.stdout.write('BENCH_RESULT ' + json.dumps(stats) + '\n')
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=50)
+    parser.add_argument('--scripts', type=int, default=200)
+    parser.add_argument('--script-ms', type=float, default=20)
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tasks_dir:
+        make_tree(tasks_dir, args)
+        manifest = os.path.join(tasks_dir, '.manifest', 'discovery_manifest.json')
+
+        def run(label, mode):
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, tasks_dir, manifest],
+                                  cwd=BACKEND_DIR, capture_output=True, text=True)
+            line = next((l for l in proc.stdout.splitlines() if l.startswith('BENCH_RESULT ')), None)
+            if line is None:
+                print(f"{label} 运行失败:\n{proc.stderr[-2000:]}")
+                return
+            r = json.loads(line[len('BENCH_RESULT '):])
+            print(f"{label:>16} {r['seconds']:>9.3f} {r['queues']:>7} {r.get('executed', '-'):>9} {r.get('skipped', '-'):>8}")
+
+        print(f"{args.tasks} 个任务模块，{args.scripts} 个脚本（每个 {args.script_ms:g} ms）")
+        print(f"{'case':>16} {'time(s)':>9} {'queues':>7} {'executed':>9} {'skipped':>8}")
+        run('auto_discovery', 'auto_discovery')
+        run('no manifest', 'manifest')
+        run('manifest hit', 'manifest')
+        # 改动一个脚本和一个任务模块，只有这两个文件需要重新执行
+        with open(os.path.join(tasks_dir, 'scripts', 'script_0.py'), 'w', encoding='utf-8') as f:
+            f.write(SCRIPT_TEMPLATE.format(seconds=args.script_ms / 1000, version=1))
+        with open(os.path.join(tasks_dir, 'bench_task_0.py'), 'a', encoding='utf-8') as f:
+            f.write('\n# changed\n')
+        run('2 files changed', 'manifest')
+        run('manifest hit', 'manifest')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+日志 SSE 扇出基准：50 个订阅者、10k 行/秒突发输出时事件循环的调度延迟
+
+对比改造前的逐行推送（无界 asyncio.Queue + 每行每个订阅者一次 call_soon_threadsafe）
+与当前的有界缓冲 + 合并推送。订阅者中有一部分是慢消费者（模拟后台标签页），用来观察内存是否有界。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_log_fanout.py --subscribers 50 --rate 10000 --seconds 3
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.log_stream import LogRingBuffer, LogStreamManager
+
+
+class PerLineStreamManager:
+    """改造前的实现：每个订阅者一个无界队列，每行调度一次回调，每行一个 SSE 事件"""
+
+    def __init__(self, buffers: dict):
+        self.buffers = buffers
+        self.subscribers = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    async def subscribe(self, log_type: str, last_event_id=None):
+        queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.subscribers[log_type][id(queue)] = (loop, queue)
+        try:
+            while True:
+                seq, line = await queue.get()
+                yield {"id": seq, "data": line}
+        finally:
+            with self._lock:
+                self.subscribers[log_type].pop(id(queue), None)
+
+    def broadcast(self, log_type: str, seq: int, line: str):
+        with self._lock:
+            for loop, queue in self.subscribers[log_type].values():
+                loop.call_soon_threadsafe(queue.put_nowait, (seq, line))
+
+    def pending(self, log_type: str) -> int:
+        return max((q.qsize() for _, q in self.subscribers[log_type].values()), default=0)
+
+
+def pending_of(manager) -> int:
+    if isinstance(manager, PerLineStreamManager):
+        return manager.pending('process')
+    return max((len(s) for s in manager.subscribers['process'].values()), default=0)
+
+
+async def run_case(manager_cls, subscribers: int, slow: int, rate: int, seconds: float):
+    buffer = LogRingBuffer()
+    manager = manager_cls({'process': buffer})
+    stats = {'events': 0, 'lines': 0, 'max_pending': 0}
+    loop_lags = []
+    stop = asyncio.Event()
+
+    async def consume(slow_consumer: bool):
+        gen = manager.subscribe('process')
+        try:
+            async for event in gen:
+                stats['events'] += 1
+                stats['lines'] += event['data'].count('\n') + 1
+                if slow_consumer:
+                    await asyncio.sleep(0.5)
+                if stop.is_set():
+                    break
+        finally:
+            await gen.aclose()
+
+    async def probe():
+        # 每 1ms 醒来一次，实际醒来时间与预期的差值即事件循环的调度延迟
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(0.001)
+            loop_lags.append(time.perf_counter() - t0 - 0.001)
+            stats['max_pending'] = max(stats['max_pending'], pending_of(manager))
+
+    def produce():
+        total = int(rate * seconds)
+        chunk = max(1, rate // 100)
+        t0 = time.perf_counter()
+        for i in range(0, total, chunk):
+            for j in range(i, min(i + chunk, total)):
+                line = f"2024-01-01 00:00:00 - task2 - INFO - line {j} " + 'x' * 60
+                manager.broadcast('process', buffer.append(line), line)
+            delay = t0 + (i + chunk) / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    tasks = [asyncio.ensure_future(consume(i < slow)) for i in range(subscribers)]
+    probe_task = asyncio.ensure_future(probe())
+    await asyncio.sleep(0.1)
+    t0 = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(None, produce)
+    await asyncio.sleep(0.2)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, probe_task, return_exceptions=True)
+
+    loop_lags.sort()
+    return {
+        'lag_p50': loop_lags[len(loop_lags) // 2] * 1000,
+        'lag_p99': loop_lags[int(len(loop_lags) * 0.99) - 1] * 1000,
+        'lag_max': loop_lags[-1] * 1000,
+        'events': stats['events'],
+        'lines_per_s': stats['lines'] / elapsed,
+        'max_pending': stats['max_pending'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, default=50)
+    parser.add_argument('--slow', type=int, default=5, help='慢消费者数量')
+    parser.add_argument('--rate', type=int, default=10000, help='每秒输出行数')
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+
+    print(f"subscribers={args.subscribers} slow={args.slow} rate={args.rate}/s seconds={args.seconds}")
+    print(f"{'mode':>10} {'lag p50(ms)':>12} {'lag p99(ms)':>12} {'lag max(ms)':>12} "
+          f"{'events':>10} {'lines/s':>12} {'max pending':>12}")
+    for name, manager_cls in (('per-line', PerLineStreamManager), ('batched', LogStreamManager)):
+        r = asyncio.run(run_case(manager_cls, args.subscribers, args.slow, args.rate, args.seconds))
+        print(f"{name:>10} {r['lag_p50']:>12.2f} {r['lag_p99']:>12.2f} {r['lag_max']:>12.2f} "
+              f"{r['events']:>10} {r['lines_per_s']:>12.0f} {r['max_pending']:>12}")
+
+
+if __name__ == '__main__':
+    main()
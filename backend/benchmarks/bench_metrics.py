@@ -0,0 +1,104 @@
+"""
+指标采集的开销：同一个 FastAPI 应用加/不加 MetricsMiddleware 的单请求耗时，SQL 计时事件对 sqlite 查询的影响，
+以及 Histogram.observe 本身的耗时
+
+请求直接调用 ASGI 应用（不经过网络和 uvicorn），差值即中间件的开销。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_metrics.py --requests 20000 --queries 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def make_app(with_metrics: bool):
+    from fastapi import FastAPI
+    from app.services.metrics import MetricsMiddleware
+    app = FastAPI()
+
+    @app.get('/api/items/{item_id}')
+    async def get_item(item_id: int):
+        return {'id': item_id}
+
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def run_requests(app, count: int) -> float:
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        pass
+
+    def scope(i):
+        return {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': f'/api/items/{i}', 'raw_path': f'/api/items/{i}'.encode(),
+                'root_path': '', 'query_string': b'', 'headers': [], 'client': ('127.0.0.1', 1),
+                'server': ('127.0.0.1', 80), 'state': {}}
+
+    for i in range(200):
+        await app(scope(i), receive, send)
+    started = time.perf_counter()
+    for i in range(count):
+        await app(scope(i), receive, send)
+    return (time.perf_counter() - started) / count
+
+
+def run_queries(instrumented: bool, count: int) -> float:
+    from sqlalchemy import create_engine, text
+    from app.services.metrics import instrument_engine
+    engine = create_engine('sqlite://')
+    if instrumented:
+        instrument_engine(engine, 'bench')
+    with engine.connect() as conn:
+        statement = text('SELECT 1')
+        for _ in range(200):
+            conn.execute(statement)
+        started = time.perf_counter()
+        for _ in range(count):
+            conn.execute(statement)
+        return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    from app.services.metrics import HTTP_BUCKETS, Histogram
+
+    results = {}
+    for label, with_metrics in (('plain', False), ('metrics', True)):
+        app = make_app(with_metrics)
+        results[f'request_{label}_us'] = min(asyncio.run(run_requests(app, args.requests))
+                                             for _ in range(args.rounds)) * 1e6
+    for label, instrumented in (('plain', False), ('metrics', True)):
+        results[f'query_{label}_us'] = min(run_queries(instrumented, args.queries) for _ in range(args.rounds)) * 1e6
+
+    histogram = Histogram('bench', 'bench', ('method', 'route', 'status'), HTTP_BUCKETS)
+    count = 200000
+    started = time.perf_counter()
+    for i in range(count):
+        histogram.observe(0.003, 'GET', '/api/items/{item_id}', '200')
+    results['observe_us'] = (time.perf_counter() - started) / count * 1e6
+
+    sys.stdout.write(f"{'':>10} {'plain(us)':>10} {'metrics(us)':>12} {'overhead(us)':>13}\n")
+    for kind in ('request', 'query'):
+        plain, measured = results[f'{kind}_plain_us'], results[f'{kind}_metrics_us']
+        sys.stdout.write(f"{kind:>10} {plain:>10.2f} {measured:>12.2f} {measured - plain:>13.2f}\n")
+    sys.stdout.write(f"Histogram.observe: {results['observe_us']:.3f} us\n")
+    sys.stdout.write('BENCH_RESULT ' + json.dumps(results) + '\n')
+
+
+if __name__ == '__main__':
+    main()
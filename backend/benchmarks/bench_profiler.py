@@ -0,0 +1,86 @@
+"""
+采样性能分析对业务的影响：模拟消费进程（若干个执行纯 Python 计算的线程加若干个空闲等待的线程），
+对比不分析 / 按不同频率采样时计算线程的吞吐，以及单次采样的耗时
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_profiler.py --busy 4 --idle 50 --seconds 3
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from runner_profiler import SamplingProfiler
+
+
+def nested(depth: int) -> int:
+    if depth:
+        return nested(depth - 1)
+    total = 0
+    for i in range(2000):
+        total += i * i
+    return total
+
+
+def measure(args, hz: float = 0) -> dict:
+    stop = threading.Event()
+    counts = [0] * args.busy
+
+    def busy(index):
+        while not stop.is_set():
+            nested(args.depth)
+            counts[index] += 1
+
+    threads = [threading.Thread(target=busy, args=(i,), daemon=True) for i in range(args.busy)]
+    threads += [threading.Thread(target=stop.wait, daemon=True) for _ in range(args.idle)]
+    for thread in threads:
+        thread.start()
+    profiler = SamplingProfiler(hz) if hz else None
+    if profiler:
+        profiler.start(args.seconds)
+    time.sleep(args.seconds)
+    stop.set()
+    result = {'hz': hz, 'calls_per_second': sum(counts) / args.seconds}
+    if profiler:
+        profiler._thread.join()
+        result.update(samples=profiler.samples, stacks=len(profiler.stacks))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--busy', type=int, default=4)
+    parser.add_argument('--idle', type=int, default=50)
+    parser.add_argument('--depth', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+
+    baseline = measure(args)
+    results = [baseline] + [measure(args, hz) for hz in (100, 500)]
+    sys.stdout.write(f"{args.busy} 个计算线程（调用深度 {args.depth}），{args.idle} 个空闲线程\n")
+    sys.stdout.write(f"{'hz':>6} {'calls/s':>10} {'slowdown':>9} {'samples':>8}\n")
+    for r in results:
+        slowdown = 1 - r['calls_per_second'] / baseline['calls_per_second']
+        sys.stdout.write(f"{r['hz'] or '-':>6} {r['calls_per_second']:>10.0f} {slowdown:>8.1%} {r.get('samples', '-'):>8}\n")
+
+    # 单次采样耗时（包含丢弃空闲线程的判断）
+    stop = threading.Event()
+    threads = [threading.Thread(target=stop.wait, daemon=True) for _ in range(args.idle)]
+    for thread in threads:
+        thread.start()
+    profiler = SamplingProfiler(include_idle=True)
+    started = time.perf_counter()
+    for _ in range(500):
+        profiler.sample()
+    per_sample = (time.perf_counter() - started) / 500
+    stop.set()
+    sys.stdout.write(f"单次采样（{args.idle} 个线程，保留空闲线程）: {per_sample * 1e6:.0f} us\n")
+    sys.stdout.write('BENCH_RESULT ' + json.dumps({'runs': results, 'sample_us': per_sample * 1e6}) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+结果列表分页基准：对比 offset 分页与 keyset(游标) 分页在不同页深度下的延迟
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_results_pagination.py --rows 200000 --size 20
+
+默认使用临时 SQLite 库；设置 BENCH_DB_URL 可以指向一个已有数据的 MySQL 库（只读）。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('SQLACHEMY_ENGINE_URL', 'sqlite://')
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.funboost_result import FunboostConsumeResult
+from app.crud import funboost_result as crud
+
+
+def prepare_sqlite(rows: int):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    start = datetime(2024, 1, 1)
+    queues = ['queue_a', 'queue_b', 'queue_c']
+    with engine.begin() as conn:
+        batch = []
+        for i in range(rows):
+            batch.append({
+                '_id': uuid.uuid4().hex,
+                'queue_name': queues[i % len(queues)],
+                'function': 'f',
+                'insert_time': start + timedelta(seconds=i // 3),
+                'success': i % 7 != 0,
+                'time_cost': 0.01 * (i % 100),
+                'result': 'x' * 64,
+            })
+            if len(batch) >= 10000:
+                conn.execute(FunboostConsumeResult.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(FunboostConsumeResult.__table__.insert(), batch)
+    return engine
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--size', type=int, default=20)
+    parser.add_argument('--queue-name', default=None)
+    args = parser.parse_args()
+
+    db_url = os.getenv('BENCH_DB_URL')
+    engine = create_engine(db_url) if db_url else prepare_sqlite(args.rows)
+    db = sessionmaker(bind=engine)()
+    query = crud.apply_filters(db.query(FunboostConsumeResult), queue_name=args.queue_name)
+    total = query.count()
+    last_page = max(1, total // args.size)
+
+    pages = sorted({p for p in (1, 10, 100, 1000, 5000, last_page // 2, last_page) if 1 <= p <= last_page})
+    print(f"rows={total} size={args.size} queue_name={args.queue_name}")
+    print(f"{'page':>8} {'offset(ms)':>12} {'cursor(ms)':>12}")
+    for page in pages:
+        # 先用 offset 定位到目标页的前一页，拿到它的 next_cursor，再单独测量游标翻页
+        if page > 1:
+            _, _, cursor = crud.fetch_page_by_offset(query, page - 1, args.size)
+        else:
+            cursor = None
+        offset_ms = timed(lambda: crud.fetch_page_by_offset(query, page, args.size))
+        if cursor:
+            cursor_ms = timed(lambda: crud.fetch_page_by_cursor(query, cursor, args.size))
+        else:
+            cursor_ms = offset_ms
+        print(f"{page:>8} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+taskrunner 消费进程启动耗时对比：spawn（每个子进程重新导入）/ fork（原来的方式）/ prefork（runner_prefork 预热 fork）
+
+在临时目录生成 N 个任务模块（每个一个 MEMORY_QUEUE 队列），每种模式在单独的 taskrunner 进程中通过
+ConsumerPool 为每个队列启动 1 个消费进程，子进程先往自己的队列推送一条消息再开始消费。统计从开始启动
+到每个队列执行完第一条消息的时间（time-to-first-consume），以及子进程的独占内存（USS）。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_runner_startup.py --queues 20 --repeat 3
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MODES = ('spawn', 'fork', 'prefork')
+
+TASK_TEMPLATE = '''import os
+import time
+from funboost import boost, BoosterParams, BrokerEnum
+
+
+@boost(BoosterParams(queue_name='bench_q{i}', broker_kind=BrokerEnum.MEMORY_QUEUE, concurrent_num=5, log_level=30))
+def bench_task_{i}(x):
+    with open(os.environ['BENCH_RESULTS'], 'a') as f:
+        f.write(f"bench_q{i} {{time.time()}}\\n")
+'''
+
+
+def make_tasks(tasks_dir: str, n: int):
+    for i in range(n):
+        with open(os.path.join(tasks_dir, f'bench_task_{i}.py'), 'w', encoding='utf-8') as f:
+            f.write(TASK_TEMPLATE.format(i=i))
+
+
+def uss_mb(pid: int):
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None
+    kb = sum(int(fields[key].split()[0]) for key in ('Private_Clean', 'Private_Dirty') if key in fields)
+    return kb / 1024
+
+
+def bench_child(unit):
+    """与 taskrunner.consume_queues 相同，只是开始消费前先往队列推送一条消息"""
+    import taskrunner
+    from funboost import BoostersManager
+    from funboost.core.helper_funs import run_forever
+    if not all(q in BoostersManager.queue_name__boost_params_map for q in unit['queues']):
+        taskrunner.discover_boosters()
+        taskrunner.apply_concurrency(unit)
+    for queue_name in unit['queues']:
+        booster = BoostersManager.get_or_create_booster_by_queue_name(queue_name)
+        booster.push(0)
+        booster.consume()
+    run_forever()
+
+
+def run_mode(mode: str, n: int, timeout: float):
+    """在当前进程中扮演 taskrunner 主进程"""
+    import multiprocessing
+    import runner_prefork
+    runner_prefork.RUNNER_PREFORK = mode == 'prefork'
+    import taskrunner
+    from funboost import BoostersManager
+    from runner_topology import build_plan, parse_topology
+
+    taskrunner.discover_boosters()
+    queues = BoostersManager.get_all_queues()
+    runner_prefork.warm_up(queues)
+    plan = build_plan(parse_topology({'default': {'processes': 1}}), {q: None for q in queues})
+    pool = taskrunner.ConsumerPool(plan, None)
+    if mode != 'prefork':
+        pool._mp = multiprocessing.get_context(mode)
+    for unit in plan:
+        taskrunner.apply_concurrency(unit)
+    taskrunner.consume_queues = bench_child
+
+    results = os.environ['BENCH_RESULTS']
+    started = time.time()
+    for unit in plan:
+        pool.scale(unit, 1)
+    spawned = time.time() - started
+    first = {}
+    while len(first) < n and time.time() - started < timeout:
+        time.sleep(0.01)
+        with open(results) as f:
+            for line in f:
+                queue_name, t = line.split()
+                first.setdefault(queue_name, float(t) - started)
+    time.sleep(0.5)
+    pids = [pid for unit in plan for pid in unit['pids']]
+    uss = [m for m in (uss_mb(pid) for pid in pids) if m is not None]
+    for pid in pids:
+        os.kill(pid, signal.SIGKILL)
+    for child in multiprocessing.active_children():
+        child.join()
+    times = sorted(first.values())
+    return {
+        'mode': mode,
+        'consumed': len(times),
+        'spawn_seconds': spawned,
+        'first_seconds': times[0] if times else None,
+        'median_seconds': statistics.median(times) if times else None,
+        'all_seconds': times[-1] if times else None,
+        'uss_mb': statistics.mean(uss) if uss else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queues', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, BACKEND_DIR)
+        result = run_mode(args.child, args.queues, args.timeout)
+        sys.stdout.write('BENCH_RESULT ' + json.dumps(result) + '\n')
+        sys.stdout.flush()
+        return
+
+    rows = {}
+    with tempfile.TemporaryDirectory() as tasks_dir:
+        make_tasks(tasks_dir, args.queues)
+        for _ in range(args.repeat):
+            for mode in args.modes.split(','):
+                results = os.path.join(tasks_dir, 'results.txt')
+                open(results, 'w').close()
+                env = dict(os.environ, TASKS_DIR=tasks_dir, BENCH_RESULTS=results, RUNNER_HOT_RELOAD='False',
+                           RUNNER_STATE_FILE=os.path.join(tasks_dir, 'state', 'runner_state.json'))
+                proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode,
+                                       '--queues', str(args.queues), '--timeout', str(args.timeout)],
+                                      cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+                line = next((l for l in proc.stdout.splitlines() if l.startswith('BENCH_RESULT ')), None)
+                if line is None:
+                    print(f"{mode} 运行失败:\n{proc.stderr[-2000:]}")
+                    continue
+                rows.setdefault(mode, []).append(json.loads(line[len('BENCH_RESULT '):]))
+
+    print(f"{args.queues} 个队列，每种模式运行 {args.repeat} 次取中位数")
+    print(f"{'mode':>8} {'consumed':>9} {'start(s)':>9} {'first(s)':>9} {'median(s)':>10} {'all(s)':>8} {'USS(MB)':>8}")
+    for mode, runs in rows.items():
+        def med(key):
+            values = [r[key] for r in runs if r[key] is not None]
+            return statistics.median(values) if values else float('nan')
+        print(f"{mode:>8} {min(r['consumed'] for r in runs):>9} {med('spawn_seconds'):>9.3f} {med('first_seconds'):>9.3f} "
+              f"{med('median_seconds'):>10.3f} {med('all_seconds'):>8.3f} {med('uss_mb'):>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
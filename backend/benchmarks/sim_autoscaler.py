@@ -0,0 +1,92 @@
+"""
+自动扩缩容策略模拟：不依赖 Redis，用 FakeBacklogSource 和虚拟时钟验证扩缩容决策
+
+模拟一个突发负载的队列：平时每秒到达 base 个任务，每隔 period 秒有一段持续 burst-seconds 秒、
+每秒 burst 个任务的高峰；每个消费进程每秒处理 per-process 个任务。对比固定进程数与自动扩缩容的
+最大积压、积压超过阈值的时长和消耗的进程·小时，并打印每一次扩缩容决策。
+
+用法（在 backend 目录下）:
+    python benchmarks/sim_autoscaler.py --hours 6 --min 1 --max 8
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import runner_autoscaler
+from runner_autoscaler import Autoscaler, FakeBacklogSource
+
+
+def arrivals(t: float, args) -> float:
+    in_burst = (t % args.period) < args.burst_seconds
+    return args.burst if in_burst else args.base
+
+
+def simulate(args, autoscale: bool, fixed: int, verbose: bool):
+    clock = [0.0]
+    source = FakeBacklogSource()
+    unit = {'queues': ['q'], 'group': None, 'processes': fixed,
+            'min_processes': args.min if autoscale else fixed, 'max_processes': args.max if autoscale else fixed}
+    processes = [unit['processes']]
+    log = print if verbose else (lambda message: None)
+    scaler = Autoscaler([unit], source, count=lambda u: processes[0],
+                        scale=lambda u, n: processes.__setitem__(0, n), clock=lambda: clock[0],
+                        log=lambda message: log(f"[{clock[0] / 3600:6.2f}h] {message}"))
+
+    backlog = 0.0
+    max_backlog = 0.0
+    over_seconds = 0
+    process_seconds = 0.0
+    done_window = []
+    total = int(args.hours * 3600)
+    for second in range(total):
+        clock[0] = float(second)
+        backlog += arrivals(second, args)
+        done = min(backlog, processes[0] * args.per_process)
+        backlog -= done
+        done_window.append(done)
+        # 与 funboost 一致，消费速度按最近 10 秒的执行次数计算
+        done_window = done_window[-10:]
+        process_seconds += processes[0]
+        max_backlog = max(max_backlog, backlog)
+        if backlog > args.per_process * 60:
+            over_seconds += 1
+        if second % int(runner_autoscaler.AUTOSCALE_INTERVAL) == 0:
+            source.set('q', int(backlog), sum(done_window) / len(done_window))
+            scaler.tick()
+    return {
+        'max_backlog': max_backlog,
+        'behind_minutes': over_seconds / 60,
+        'process_hours': process_seconds / 3600,
+        'decisions': sum(1 for d in scaler.decisions if d['applied']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hours', type=float, default=6)
+    parser.add_argument('--base', type=float, default=1, help='平时每秒到达的任务数')
+    parser.add_argument('--burst', type=float, default=20, help='高峰每秒到达的任务数')
+    parser.add_argument('--period', type=float, default=3600, help='高峰间隔（秒）')
+    parser.add_argument('--burst-seconds', type=float, default=600, help='每次高峰持续时间（秒）')
+    parser.add_argument('--per-process', type=float, default=2, help='单个进程每秒处理的任务数')
+    parser.add_argument('--min', type=int, default=1)
+    parser.add_argument('--max', type=int, default=8)
+    parser.add_argument('--fixed', type=int, default=4, help='对照组的固定进程数')
+    parser.add_argument('--quiet', action='store_true', help='不打印每次扩缩容决策')
+    args = parser.parse_args()
+
+    results = [
+        (f'fixed-{args.fixed}', simulate(args, False, args.fixed, False)),
+        (f'fixed-{args.max}', simulate(args, False, args.max, False)),
+        (f'auto-{args.min}~{args.max}', simulate(args, True, args.min, not args.quiet)),
+    ]
+    print(f"{'mode':>12} {'max backlog':>12} {'behind(min)':>12} {'proc·h':>10} {'scalings':>9}")
+    for name, r in results:
+        print(f"{name:>12} {r['max_backlog']:>12.0f} {r['behind_minutes']:>12.1f} "
+              f"{r['process_hours']:>10.1f} {r['decisions']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+缓冲批量写入消费结果到 funboost_consume_results
+
+funboost 自带的 save_result_status_to_sqlalchemy 每消费一条消息就在当前消费线程里 merge 一次，
+消息量大时每行一次的数据库往返成为瓶颈。这里每个进程维护一个缓冲区，由后台线程在攒够
+RESULT_WRITER_FLUSH_SIZE 条或每隔 RESULT_WRITER_FLUSH_INTERVAL 秒时用多行 INSERT 一次写入。
+
+在 @boost 里指定 user_custom_record_process_info_func=save_result_status_buffered 即可使用。本模块只在 backend
+目录下，taskrunner 以 backend 为工作目录运行时才能导入，任务文件需要单独运行时回退到 funboost 自带的函数，例如
+
+    try:
+        from result_status_saver import save_result_status_buffered as save_result_status
+    except ImportError:
+        from funboost.contrib.save_function_result_status.save_result_status_to_sqldb import \
+            save_result_status_to_sqlalchemy as save_result_status
+
+    class MyBoosterParams(BoosterParams):
+        user_custom_record_process_info_func = save_result_status
+
+数据库变慢或不可用时，未写入的记录保留在有界队列中（最多 RESULT_WRITER_MAX_PENDING 条，超出丢弃最旧的），
+进程正常退出时由 atexit 写完剩余记录；taskrunner 的消费进程收到 SIGTERM 后由排空处理函数调用 close_writer。
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, List, Optional
+
+from sqlalchemy import MetaData, Table, create_engine
+
+from funboost import FunctionResultStatus
+from funboost_config import BrokerConnConfig
+
+RESULT_WRITER_FLUSH_SIZE = int(os.getenv('RESULT_WRITER_FLUSH_SIZE', '200'))
+RESULT_WRITER_FLUSH_INTERVAL = float(os.getenv('RESULT_WRITER_FLUSH_INTERVAL', '1'))
+RESULT_WRITER_MAX_PENDING = int(os.getenv('RESULT_WRITER_MAX_PENDING', '10000'))
+
+TABLE_NAME = 'funboost_consume_results'
+# 与 app.crud.result_count 中的同名常量一致；消费进程不导入 app 包，避免创建 API 的数据库引擎
+RESULTS_WRITE_VERSION_KEY = 'taskrun:results_write_version'
+
+logger = logging.getLogger(__name__)
+
+
+def _upsert_statement(table: Table, dialect_name: str):
+    """同一个 task_id 重试会产生相同的 _id，按主键覆盖旧记录，与 funboost 原来的 merge 语义一致"""
+    if dialect_name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        return stmt.on_duplicate_key_update({c.name: stmt.inserted[c.name] for c in table.columns if not c.primary_key})
+    if dialect_name in ('sqlite', 'postgresql'):
+        if dialect_name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[c.name for c in table.primary_key.columns],
+            set_={c.name: stmt.excluded[c.name] for c in table.columns if not c.primary_key},
+        )
+    return table.insert()
+
+
+class BufferedResultWriter:
+    def __init__(self, engine_url: str = BrokerConnConfig.SQLACHEMY_ENGINE_URL,
+                 flush_size: int = RESULT_WRITER_FLUSH_SIZE,
+                 flush_interval: float = RESULT_WRITER_FLUSH_INTERVAL,
+                 max_pending: int = RESULT_WRITER_MAX_PENDING):
+        self.engine_url = engine_url
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self._pending: Deque[dict] = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._engine = None
+        self._table: Optional[Table] = None
+        self._statement = None
+        self._thread = threading.Thread(target=self._run, name='result-writer', daemon=True)
+        self._thread.start()
+
+    def _prepare(self):
+        if self._table is None:
+            # 只有刷新线程使用连接，一个进程一到两个连接就够了
+            self._engine = create_engine(self.engine_url, pool_size=1, max_overflow=1, pool_recycle=3600,
+                                         pool_pre_ping=True)
+            self._table = Table(TABLE_NAME, MetaData(), autoload_with=self._engine)
+            self._statement = _upsert_statement(self._table, self._engine.dialect.name)
+
+    def record(self, status_dict: dict):
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(status_dict)
+            if len(self._pending) >= self.flush_size:
+                self._wakeup.set()
+
+    def _take_batch(self) -> List[dict]:
+        with self._lock:
+            count = min(len(self._pending), self.flush_size)
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _requeue(self, batch: List[dict]):
+        """写入失败的批次放回队首，队列已满时丢弃放不下的最旧记录"""
+        with self._lock:
+            space = self._pending.maxlen - len(self._pending)
+            if space < len(batch):
+                self.dropped += len(batch) - space
+                batch = batch[len(batch) - space:] if space else []
+            self._pending.extendleft(reversed(batch))
+
+    def flush(self) -> int:
+        """把当前所有待写入记录写入数据库，返回写入行数"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    break
+                try:
+                    self._prepare()
+                    columns = self._table.columns.keys()
+                    rows = [{k: row.get(k) for k in columns} for row in batch]
+                    with self._engine.begin() as conn:
+                        conn.execute(self._statement, rows)
+                except Exception as e:
+                    self._requeue(batch)
+                    logger.warning(f"批量写入消费结果失败，{len(batch)} 条记录稍后重试: {e}")
+                    raise
+                written += len(batch)
+                self.written += len(batch)
+                self._mark_written(batch)
+        return written
+
+    @staticmethod
+    def _mark_written(batch: List[dict]):
+        """递增写入队列的版本号，使 API 各进程中相关队列的计数缓存失效"""
+        queue_names = {row.get('queue_name') for row in batch} - {None, ''}
+        if not queue_names:
+            return
+        try:
+            from funboost.utils.redis_manager import RedisMixin
+            pipe = RedisMixin().redis_db_frame.pipeline(transaction=False)
+            for queue_name in queue_names:
+                pipe.hincrby(RESULTS_WRITE_VERSION_KEY, queue_name, 1)
+            pipe.execute()
+        except Exception:
+            # redis 不可用时计数缓存退化为只依赖 TTL
+            pass
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # 数据库异常时退避一个周期再重试，记录保留在有界队列中
+                time.sleep(self.flush_interval)
+
+    def close(self, timeout: float = 10):
+        """停止后台线程并尽量写完剩余记录"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception:
+            pass
+        if self.dropped:
+            logger.warning(f"消费结果写入队列溢出，共丢弃 {self.dropped} 条记录")
+
+
+_writer: Optional[BufferedResultWriter] = None
+_writer_pid: Optional[int] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> BufferedResultWriter:
+    """每个进程一个写入器；fork 出的子进程不能复用父进程的线程和连接，需要重新创建"""
+    global _writer, _writer_pid
+    if _writer is None or _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer_pid != os.getpid():
+                _writer = BufferedResultWriter()
+                _writer_pid = os.getpid()
+    return _writer
+
+
+def close_writer():
+    if _writer is not None and _writer_pid == os.getpid():
+        _writer.close()
+
+
+def save_result_status_buffered(function_result_status: FunctionResultStatus):
+    """
+    用户自定义记录函数消费信息的钩子函数，替代 save_result_status_to_sqlalchemy
+
+    例如  @boost('test_user_custom', user_custom_record_process_info_func=save_result_status_buffered)
+    """
+    status_dict = function_result_status.get_status_dict()
+    for k, v in status_dict.items():
+        if isinstance(v, dict):
+            status_dict[k] = json.dumps(v)
+    get_writer().record(status_dict)
+
+
+# SIGTERM 默认直接结束进程，不会执行 atexit；taskrunner 的消费进程由 runner_drain 在退出前调用 close_writer
+atexit.register(close_writer)
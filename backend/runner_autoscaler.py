@@ -0,0 +1,238 @@
+"""
+taskrunner 消费进程自动扩缩容
+
+按队列积压量和消费速度估算排空积压需要的时间，在拓扑配置的 min_processes ~ max_processes 之间
+增减消费进程：
+
+- 扩容：预计排空时间超过 AUTOSCALE_UP_DRAIN_SECONDS，且连续 AUTOSCALE_UP_SAMPLES 次采样都满足，
+  按比例一次扩到需要的进程数（不超过 max_processes）
+- 缩容：预计排空时间低于 AUTOSCALE_DOWN_DRAIN_SECONDS（没有积压也算），且连续 AUTOSCALE_DOWN_SAMPLES
+  次采样都满足，每次减少一个进程（不低于 min_processes）
+- 两个阈值之间不做调整（滞回），扩容/缩容后分别经过 AUTOSCALE_UP_COOLDOWN / AUTOSCALE_DOWN_COOLDOWN
+  秒才会再次调整
+- 每个扩缩容决策（包括因冷却时间或上下限被拦下的）都会打印并保留在 decisions 中
+
+积压数据来源可替换：默认读取 funboost 写入 Redis 的队列消息数和消费者心跳；FakeBacklogSource
+不依赖 Redis，可以直接构造数据或从 JSON 文件读取，用于本地验证扩缩容策略。
+"""
+import json
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+AUTOSCALE_INTERVAL = float(os.getenv('AUTOSCALE_INTERVAL', '10'))
+AUTOSCALE_UP_DRAIN_SECONDS = float(os.getenv('AUTOSCALE_UP_DRAIN_SECONDS', '60'))
+AUTOSCALE_DOWN_DRAIN_SECONDS = float(os.getenv('AUTOSCALE_DOWN_DRAIN_SECONDS', '5'))
+AUTOSCALE_UP_SAMPLES = int(os.getenv('AUTOSCALE_UP_SAMPLES', '2'))
+AUTOSCALE_DOWN_SAMPLES = int(os.getenv('AUTOSCALE_DOWN_SAMPLES', '6'))
+AUTOSCALE_UP_COOLDOWN = float(os.getenv('AUTOSCALE_UP_COOLDOWN', '60'))
+AUTOSCALE_DOWN_COOLDOWN = float(os.getenv('AUTOSCALE_DOWN_COOLDOWN', '300'))
+# 不依赖 Redis 的积压数据文件，设置后使用 FakeBacklogSource
+AUTOSCALE_FAKE_BACKLOG_FILE = os.getenv('AUTOSCALE_FAKE_BACKLOG_FILE', '')
+AUTOSCALE_DECISION_HISTORY = 100
+
+
+class QueueLoad(NamedTuple):
+    # 中间件中的消息数，未知时为 None
+    backlog: Optional[int]
+    # 最近一段时间所有消费者合计每秒完成的任务数
+    rate: float
+
+
+class BacklogSource:
+    def sample(self, queue_names: List[str]) -> Dict[str, QueueLoad]:
+        raise NotImplementedError
+
+
+class FunboostRedisBacklogSource(BacklogSource):
+    """读取 funboost 消费者上报到 Redis 的队列消息数和最近 10 秒的执行次数"""
+
+    def __init__(self):
+        from funboost.core.active_cousumer_info_getter import QueuesConusmerParamsGetter
+        from funboost.consumers.base_consumer import MetricCalculation
+        self._getter = QueuesConusmerParamsGetter()
+        self._unit_seconds = MetricCalculation.UNIT_TIME_FOR_COUNT
+
+    def sample(self, queue_names: List[str]) -> Dict[str, QueueLoad]:
+        infos = self._getter.get_queues_params_and_active_consumers()
+        loads = {}
+        for queue_name in queue_names:
+            info = infos.get(queue_name)
+            if info is None:
+                continue
+            loads[queue_name] = QueueLoad(info['msg_num_in_broker'],
+                                          (info['all_consumers_last_x_s_execute_count'] or 0) / self._unit_seconds)
+        return loads
+
+
+class FakeBacklogSource(BacklogSource):
+    """
+    不依赖 Redis 的积压数据，用于验证扩缩容策略
+
+    直接调用 set 设置，或者传入 JSON 文件路径（每次采样重新读取），文件格式:
+    {"队列名": {"backlog": 1000, "rate": 2.5}}
+    """
+
+    def __init__(self, loads: Optional[Dict[str, QueueLoad]] = None, path: Optional[str] = None):
+        self.loads = dict(loads or {})
+        self.path = path
+
+    def set(self, queue_name: str, backlog: Optional[int], rate: float = 0.0):
+        self.loads[queue_name] = QueueLoad(backlog, rate)
+
+    def sample(self, queue_names: List[str]) -> Dict[str, QueueLoad]:
+        if self.path:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+                self.loads = {q: QueueLoad(v.get('backlog'), float(v.get('rate', 0))) for q, v in data.items()}
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"⚠️ 读取积压数据文件失败: {e}", flush=True)
+        return {q: self.loads[q] for q in queue_names if q in self.loads}
+
+
+def default_backlog_source() -> BacklogSource:
+    if AUTOSCALE_FAKE_BACKLOG_FILE:
+        return FakeBacklogSource(path=AUTOSCALE_FAKE_BACKLOG_FILE)
+    return FunboostRedisBacklogSource()
+
+
+def unit_label(unit: dict) -> str:
+    return f"分组 {unit['group']}" if unit['group'] else unit['queues'][0]
+
+
+class Autoscaler:
+    """
+    units 为 runner_topology.build_plan 生成的进程组，min_processes < max_processes 的才参与扩缩容；
+    count 返回进程组当前存活的进程数，scale 把进程组调整到指定进程数
+    """
+
+    def __init__(self, units: List[dict], source: BacklogSource,
+                 count: Callable[[dict], int], scale: Callable[[dict, int], None],
+                 clock: Callable[[], float] = time.monotonic, log: Callable[[str], None] = None):
+        self.units = [unit for unit in units if unit['max_processes'] > unit['min_processes']]
+        self.source = source
+        self.count = count
+        self.scale = scale
+        self.clock = clock
+        self.log = log or (lambda message: print(message, flush=True))
+        self.decisions = deque(maxlen=AUTOSCALE_DECISION_HISTORY)
+        # 每个进程组连续满足扩容/缩容条件的采样次数、上次调整时间、上次被拦下的原因
+        self._streaks = {id(unit): [0, 0] for unit in self.units}
+        self._last_scaled = {id(unit): None for unit in self.units}
+        self._last_blocked = {}
+
+    def track(self, unit: dict):
+        """热更新新增的进程组"""
+        if unit['max_processes'] > unit['min_processes']:
+            self.units.append(unit)
+            self._streaks[id(unit)] = [0, 0]
+            self._last_scaled[id(unit)] = None
+
+    def untrack(self, unit: dict):
+        self.units = [u for u in self.units if u is not unit]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.units)
+
+    @staticmethod
+    def drain_seconds(backlog: int, rate: float) -> float:
+        """按当前消费速度排空积压需要的秒数"""
+        if backlog <= 0:
+            return 0.0
+        return backlog / rate if rate > 0 else math.inf
+
+    def _record(self, unit: dict, current: int, target: int, load: QueueLoad, drain: float, reason: str, applied: bool):
+        decision = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'unit': unit_label(unit),
+            'from': current,
+            'to': target,
+            'backlog': load.backlog,
+            'rate': round(load.rate, 3),
+            'drain_seconds': None if math.isinf(drain) else round(drain, 1),
+            'reason': reason,
+            'applied': applied,
+        }
+        self.decisions.append(decision)
+        arrow = f"{current} -> {target}" if applied else f"保持 {current}"
+        drain_text = '∞' if decision['drain_seconds'] is None else decision['drain_seconds']
+        self.log(f"📈 自动扩缩容 [{decision['unit']}] {arrow}：{reason}"
+                 f"（积压 {load.backlog}，速度 {load.rate:.2f}/s，预计排空 {drain_text} 秒）")
+        return decision
+
+    def _blocked(self, unit: dict, current: int, load: QueueLoad, drain: float, reason: str):
+        # 同样的原因只记录一次，避免冷却期间每次采样都刷日志
+        if self._last_blocked.get(id(unit)) != reason:
+            self._last_blocked[id(unit)] = reason
+            self._record(unit, current, current, load, drain, reason, applied=False)
+
+    def _load_of(self, unit: dict, loads: Dict[str, QueueLoad]) -> Optional[QueueLoad]:
+        """共用进程的分组按组内所有队列合计"""
+        parts = [loads.get(q) for q in unit['queues']]
+        if any(part is None or part.backlog is None for part in parts):
+            return None
+        return QueueLoad(sum(part.backlog for part in parts), sum(part.rate for part in parts))
+
+    def tick(self) -> List[dict]:
+        """采样一次并做出扩缩容决策，返回本次实际执行的调整"""
+        if not self.units:
+            return []
+        loads = self.source.sample([q for unit in self.units for q in unit['queues']])
+        now = self.clock()
+        applied = []
+        for unit in self.units:
+            load = self._load_of(unit, loads)
+            current = self.count(unit)
+            if current < unit['min_processes']:
+                # 消费进程异常退出后补足到下限
+                self.scale(unit, unit['min_processes'])
+                applied.append(self._record(unit, current, unit['min_processes'], load or QueueLoad(None, 0), 0,
+                                            '存活进程数低于下限', applied=True))
+                continue
+            if load is None:
+                continue
+            drain = self.drain_seconds(load.backlog, load.rate)
+            streak = self._streaks[id(unit)]
+            if drain > AUTOSCALE_UP_DRAIN_SECONDS:
+                streak[0], streak[1] = streak[0] + 1, 0
+            elif drain < AUTOSCALE_DOWN_DRAIN_SECONDS:
+                streak[0], streak[1] = 0, streak[1] + 1
+            else:
+                streak[0] = streak[1] = 0
+                self._last_blocked.pop(id(unit), None)
+                continue
+
+            last = self._last_scaled[id(unit)]
+            if streak[0] >= AUTOSCALE_UP_SAMPLES:
+                if current >= unit['max_processes']:
+                    self._blocked(unit, current, load, drain, '积压持续增长，但已达到进程数上限')
+                    continue
+                if last is not None and now - last < AUTOSCALE_UP_COOLDOWN:
+                    self._blocked(unit, current, load, drain, '积压持续增长，扩容冷却中')
+                    continue
+                # 按比例估算需要的进程数：排空时间缩短到扩容阈值以内
+                wanted = current + 1 if math.isinf(drain) else math.ceil(current * drain / AUTOSCALE_UP_DRAIN_SECONDS)
+                target = min(unit['max_processes'], max(current + 1, wanted))
+                reason = f"连续 {streak[0]} 次预计排空时间超过 {AUTOSCALE_UP_DRAIN_SECONDS:g} 秒"
+            elif streak[1] >= AUTOSCALE_DOWN_SAMPLES:
+                if current <= unit['min_processes']:
+                    continue
+                if last is not None and now - last < AUTOSCALE_DOWN_COOLDOWN:
+                    self._blocked(unit, current, load, drain, '负载较低，缩容冷却中')
+                    continue
+                target = current - 1
+                reason = f"连续 {streak[1]} 次预计排空时间低于 {AUTOSCALE_DOWN_DRAIN_SECONDS:g} 秒"
+            else:
+                continue
+
+            self.scale(unit, target)
+            self._last_scaled[id(unit)] = now
+            self._last_blocked.pop(id(unit), None)
+            streak[0] = streak[1] = 0
+            applied.append(self._record(unit, current, target, load, drain, reason, applied=True))
+        return applied
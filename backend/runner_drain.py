@@ -0,0 +1,172 @@
+"""
+taskrunner 收到 SIGTERM 后的优雅退出
+
+- 消费子进程：本进程内的消费者不再提交新取到的消息（放回队列后阻塞拉取线程），等待已提交的任务
+  执行完再退出。不使用 funboost 的 _pause_flag：发送心跳的线程每 10 秒按 redis 中的暂停标记重新设置它，
+  redis 中没有暂停标记时会清除，排空期间消费者又会开始拉取消息
+- taskrunner 主进程：等待所有消费子进程退出后再退出
+
+未执行完的任务数在提交到并发池时计数、任务结束时减少，各种并发模式（threading、gevent、eventlet、
+async、single_thread）都一样，不依赖并发池的内部状态。
+
+最长等待 RUNNER_DRAIN_SECONDS 秒（由 API 的进程守护设置为略小于它的排空时间），超时后直接退出，
+剩余的任务由守护进程的 SIGKILL 兜底结束。
+"""
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+RUNNER_DRAIN_SECONDS = float(os.getenv('RUNNER_DRAIN_SECONDS', '25'))
+
+# 收到退出信号后设置，自动扩缩容等不再启动新的消费进程
+draining = threading.Event()
+
+# 本进程中已经取到、还没执行完的任务数（包括正在提交和在并发池中排队的）
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def _count(delta: int):
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight += delta
+
+
+def in_flight() -> int:
+    return _in_flight
+
+
+def _local_consumers():
+    from funboost import BoostersManager
+    pid = os.getpid()
+    return [booster.consumer for (booster_pid, _), booster in list(BoostersManager.pid_queue_name__booster_map.items())
+            if booster_pid == pid and getattr(booster, 'consumer', None) is not None]
+
+
+def _counted(func):
+    """包装提交到并发池的函数，任务结束（包括抛出异常）时减少计数；返回的 finish 只会生效一次"""
+    done = []
+
+    def _finish():
+        if not done:
+            done.append(True)
+            _count(-1)
+
+    if asyncio.iscoroutinefunction(func):
+        async def _run_async(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _finish()
+        return _run_async, _finish
+
+    def _run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _finish()
+    return _run, _finish
+
+
+def _track_pool(pool):
+    """同一个并发池可能被多个队列共用（specify_concurrent_pool），只包装一次"""
+    if getattr(pool, '_drain_tracked', False):
+        return
+    submit = pool.submit
+
+    def _submit(func, *args, **kwargs):
+        _count(1)
+        run, finish = _counted(func)
+        try:
+            return submit(run, *args, **kwargs)
+        except BaseException:
+            finish()
+            raise
+
+    pool.submit = _submit
+    pool._drain_tracked = True
+
+
+def _hold(consumer, kw):
+    """排空开始后取到的消息放回队列，由其它进程或重启后的进程消费，拉取线程一直阻塞到进程退出"""
+    try:
+        consumer._requeue(kw)
+    except Exception as e:
+        print(f"⚠️ 进程 {os.getpid()} 排空期间取到的消息放回队列 {consumer.queue_name} 失败: {e}", flush=True)
+    threading.Event().wait()
+
+
+def track(consumer):
+    """
+    在 consume() 之前调用：统计消费者提交的任务，排空开始后拦截拉取线程提交的消息
+
+    一次拉取多条消息到内存中的中间件（例如 REDIS），被阻塞的拉取线程中剩余的消息仍会在进程退出时丢失，
+    需要不丢消息时使用支持确认消费的中间件（例如 REDIS_ACK_ABLE）
+    """
+    _track_pool(consumer.concurrent_pool)
+    submit_task = consumer._submit_task
+
+    def _submit_task(kw):
+        # 先计数再检查排空标记：排空开始后读到的计数一定包含已经通过检查、正在提交的消息
+        _count(1)
+        if draining.is_set():
+            _count(-1)
+            _hold(consumer, kw)
+        try:
+            return submit_task(kw)
+        finally:
+            _count(-1)
+
+    consumer._submit_task = _submit_task
+
+
+def drain(deadline: float):
+    consumers = _local_consumers()
+    if consumers:
+        print(f"🛑 进程 {os.getpid()} 收到退出信号，停止拉取新消息，等待 {len(consumers)} 个队列的任务执行完成", flush=True)
+    while time.monotonic() < deadline:
+        if not in_flight() and not multiprocessing.active_children():
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def close_result_writer():
+    """os._exit 不执行 atexit，任务使用了 result_status_saver 时先写完缓冲的消费结果；没有导入过则不导入"""
+    saver = sys.modules.get('result_status_saver')
+    if saver is None:
+        return
+    try:
+        saver.close_writer()
+    except Exception as e:
+        print(f"⚠️ 进程 {os.getpid()} 写入缓冲的消费结果失败: {e}", flush=True)
+
+
+_installed = False
+
+
+def drain_handler_installed() -> bool:
+    """fork 出的子进程继承了主进程的模块状态和信号处理；spawn 启动的子进程重新导入本模块，为 False"""
+    return _installed
+
+
+def install_drain_handler():
+    """在启动消费子进程前调用，fork 出的子进程会继承该信号处理"""
+    global _installed
+    _installed = True
+
+    def _on_sigterm(signum, frame):
+        # 排空期间再次收到信号不重复处理
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        draining.set()
+        if not drain(time.monotonic() + RUNNER_DRAIN_SECONDS):
+            print(f"⚠️ 进程 {os.getpid()} 等待任务完成超时，直接退出", flush=True)
+        close_result_writer()
+        sys.stdout.flush()
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, _on_sigterm)
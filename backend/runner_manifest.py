@@ -0,0 +1,130 @@
+"""
+taskrunner 队列发现清单
+
+BoosterDiscovery.auto_discovery 每次启动都会执行任务目录下所有 .py 文件。这里把每个文件定义了哪些队列
+缓存到清单文件 RUNNER_DISCOVERY_MANIFEST 中（按 mtime、大小和内容 sha1 判断文件是否变化）：
+
+- 没有变化、且没有定义队列的文件（公共模块、脚本等）不再执行，被任务模块 import 时照常导入
+- 没有变化、定义了队列的文件照常执行，@boost 才会注册
+- 新增或有变化的文件照常执行，并重新记录其中定义的队列；删除的文件从清单中移除
+
+mtime 变化但内容 sha1 相同（例如重新 checkout）仍视为没有变化。RUNNER_DISCOVERY_CACHE=False 时
+与原来一致，执行所有文件。
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, Optional
+
+RUNNER_DISCOVERY_CACHE = os.getenv('RUNNER_DISCOVERY_CACHE', 'True').lower() in ('1', 'true', 'yes')
+RUNNER_DISCOVERY_MANIFEST = os.getenv('RUNNER_DISCOVERY_MANIFEST',
+                                      os.path.join(os.getenv('LOGS_DIR', '/app/logs'), 'discovery_manifest.json'))
+MANIFEST_VERSION = 1
+
+
+def module_name(tasks_dir: str, path: str) -> str:
+    """与 BoosterDiscovery 相同的模块名：相对任务目录的路径，用 . 连接"""
+    return Path(path).relative_to(Path(tasks_dir)).with_suffix('').as_posix().replace('/', '.')
+
+
+def exec_task_file(tasks_dir: str, path: str):
+    """按 BoosterDiscovery 的方式执行任务文件，@boost 在执行时注册队列"""
+    spec = importlib.util.spec_from_file_location(module_name(tasks_dir, path), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def registered_since(params_map: dict, before: dict) -> set:
+    """before 之后（重新）注册的队列，重新注册时消费函数对象会被替换"""
+    return {q for q, p in params_map.items() if p.consuming_function is not before.get(q)}
+
+
+def file_sha1(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def scan_py_files(tasks_dir: str, max_depth: int = 3) -> List[str]:
+    from funboost import BoosterDiscovery
+    discovery = BoosterDiscovery(project_root_path=tasks_dir, booster_dirs=['.'], max_depth=max_depth)
+    discovery.get_py_files_recursively(Path(tasks_dir))
+    return sorted(os.path.abspath(path) for path in discovery.py_files)
+
+
+def load_manifest(tasks_dir: str, path: str = RUNNER_DISCOVERY_MANIFEST) -> dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # 任务目录改变或清单格式升级后整体失效
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('tasks_dir') != os.path.abspath(tasks_dir):
+        return {}
+    return manifest.get('files', {})
+
+
+def save_manifest(tasks_dir: str, files: dict, path: str = RUNNER_DISCOVERY_MANIFEST):
+    """清单只是启动加速用的缓存，目录不存在或不可写时给出警告，不影响启动"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'tasks_dir': os.path.abspath(tasks_dir), 'files': files},
+                      f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ 队列发现清单写入失败，下次启动仍会执行全部文件: {e}", flush=True)
+
+
+def _unchanged(entry: Optional[dict], path: str, stat: os.stat_result) -> bool:
+    if entry is None:
+        return False
+    if entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+        return True
+    if entry['size'] != stat.st_size or entry['sha1'] != file_sha1(path):
+        return False
+    entry['mtime'] = stat.st_mtime
+    return True
+
+
+def discover(tasks_dir: str, boosters_manager, max_depth: int = 3,
+             manifest_path: str = RUNNER_DISCOVERY_MANIFEST) -> dict:
+    """
+    按清单执行任务文件并更新清单，返回统计:
+    {'files': 文件总数, 'executed': 执行的文件数, 'skipped': 跳过的文件数, 'changed': 新增或变化的文件数, 'seconds': 耗时}
+    """
+    started = time.perf_counter()
+    tasks_dir = os.path.abspath(tasks_dir)
+    cached = load_manifest(tasks_dir, manifest_path) if RUNNER_DISCOVERY_CACHE else {}
+    params_map = boosters_manager.queue_name__boost_params_map
+    files = {}
+    executed = changed = 0
+    dirty = False
+    for path in scan_py_files(tasks_dir, max_depth):
+        rel = os.path.relpath(path, tasks_dir)
+        stat = os.stat(path)
+        entry = cached.get(rel)
+        cached_mtime = entry['mtime'] if entry else None
+        if _unchanged(entry, path, stat):
+            files[rel] = entry
+            # 内容没变只更新了 mtime，也写回清单，下次不用再算 sha1
+            dirty = dirty or entry['mtime'] != cached_mtime
+            if RUNNER_DISCOVERY_CACHE and not entry['queues']:
+                continue
+        else:
+            changed += 1
+            entry = files[rel] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha1': file_sha1(path), 'queues': []}
+        before = {q: p.consuming_function for q, p in params_map.items()}
+        exec_task_file(tasks_dir, path)
+        executed += 1
+        queues = sorted(registered_since(params_map, before))
+        dirty = dirty or queues != entry['queues']
+        entry['queues'] = queues
+    if RUNNER_DISCOVERY_CACHE and (dirty or changed or files.keys() != cached.keys()):
+        save_manifest(tasks_dir, files, manifest_path)
+    return {'files': len(files), 'executed': executed, 'skipped': len(files) - executed, 'changed': changed,
+            'seconds': time.perf_counter() - started}
@@ -0,0 +1,52 @@
+"""
+taskrunner 预热 fork 模式（zygote）
+
+taskrunner 主进程已经导入了 funboost、nb_log 和所有任务模块，消费子进程直接从主进程 fork 出来就不需要
+重复导入。在此基础上：
+
+- 固定使用 fork 启动子进程，不受平台默认值（macOS / Python 3.14 起的 spawn、forkserver）影响，
+  spawn 模式下每个子进程都要重新导入 funboost、nb_log 和所有任务模块并打印一遍启动横幅
+- fork 前在主进程中导入用到的中间件消费者/发布者模块（funboost 按需延迟导入，否则每个子进程各导入一次）
+- fork 前 gc.freeze()，把主进程已有的对象移出垃圾回收跟踪，子进程的 GC 不会去写这些对象的头部，
+  copy-on-write 共享的内存页不会被逐渐复制
+
+RUNNER_PREFORK=False 时使用 multiprocessing 的默认启动方式，与原来一致。
+"""
+import gc
+import multiprocessing
+import os
+import time
+from typing import Iterable
+
+RUNNER_PREFORK = os.getenv('RUNNER_PREFORK', 'True').lower() in ('1', 'true', 'yes')
+
+
+def mp_context():
+    """消费子进程使用的 multiprocessing 上下文"""
+    if RUNNER_PREFORK and 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def warm_up(queue_names: Iterable[str]) -> float:
+    """在主进程中导入各队列的中间件模块，返回耗时（秒）"""
+    if not RUNNER_PREFORK:
+        return 0.0
+    from funboost import BoostersManager
+    from funboost.factories.broker_kind__publsiher_consumer_type_map import regist_to_funboost
+    started = time.perf_counter()
+    for broker_kind in {BoostersManager.get_boost_params(q).broker_kind for q in queue_names}:
+        try:
+            regist_to_funboost(broker_kind)
+        except ImportError as e:
+            # 中间件依赖没有安装时留给子进程创建消费者时报错，与不预热时一致
+            print(f"⚠️ 预热中间件 {broker_kind} 失败: {e}", flush=True)
+    # 导入和扫描任务模块产生的垃圾先回收掉，不要冻结进共享内存
+    gc.collect()
+    return time.perf_counter() - started
+
+
+def freeze():
+    """每次 fork 子进程前调用，只移动 GC 链表，耗时很短；之后新建的对象仍正常回收"""
+    if RUNNER_PREFORK:
+        gc.freeze()
@@ -0,0 +1,173 @@
+"""
+按需采样的性能分析
+
+- 采样线程按 hz 频率读取 sys._current_frames()，把每个线程的调用栈累计为 flamegraph.pl / speedscope
+  可直接使用的折叠栈格式（collapsed stacks）：`进程;线程;外层函数;...;内层函数 次数`
+- 只在分析期间运行，不分析时没有任何开销；线程阻塞在 Event.wait、Queue.get、select 等处的样本
+  默认丢弃，只保留在执行的线程
+- taskrunner 通过 SIGUSR2 控制：API 把本次分析的参数写入 RUNNER_PROFILE_DIR/current.json 后向
+  taskrunner 主进程发送 SIGUSR2，主进程开始采样并把信号转发给所有消费进程；每个进程采样结束后把
+  结果写到 RUNNER_PROFILE_DIR/<分析 id>/<进程>.collapsed
+"""
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+RUNNER_PROFILE_DIR = os.getenv('RUNNER_PROFILE_DIR', os.path.join(os.getenv('LOGS_DIR', '/app/logs'), 'profiles'))
+# Windows 没有 SIGUSR2，只能分析 API 进程
+PROFILE_SIGNAL = getattr(signal, 'SIGUSR2', None)
+
+# 叶子帧为这些函数时视为线程空闲（文件名, 函数名）
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'accept'),
+    ('connection.py', '_poll'),
+    ('base_events.py', '_run_once'),
+}
+
+_THREAD_NUMBER = re.compile(r'[-_]\d+')
+
+
+class SamplingProfiler:
+    def __init__(self, hz: float = 100, label: str = '', include_idle: bool = False):
+        self.interval = 1.0 / hz
+        self.label = label
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._names: Dict[object, str] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def _frame_name(self, code) -> str:
+        name = self._names.get(code)
+        if name is None:
+            # 折叠栈用 ; 分隔帧、最后一个空格分隔次数，帧名中不能出现这两个字符
+            name = self._names[code] = f"{code.co_name}({os.path.basename(code.co_filename)}:{code.co_firstlineno})" \
+                .replace(';', ':').replace(' ', '_')
+        return name
+
+    def sample(self):
+        me = threading.get_ident()
+        # 线程池中的线程名带序号（Thread-12），去掉序号后同一个池的样本合并在一起
+        threads = {thread.ident: _THREAD_NUMBER.sub('', thread.name) for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                continue
+            names = []
+            while frame is not None:
+                names.append(self._frame_name(frame.f_code))
+                frame = frame.f_back
+            names.append(threads.get(ident, str(ident)).replace(';', ':').replace(' ', '_'))
+            if self.label:
+                names.append(self.label)
+            self.stacks[';'.join(reversed(names))] += 1
+        self.samples += 1
+
+    def run(self, seconds: float):
+        deadline = time.monotonic() + seconds
+        next_at = time.monotonic()
+        while True:
+            self.sample()
+            next_at += self.interval
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            if next_at > now:
+                time.sleep(min(next_at, deadline) - now)
+            else:
+                # 采样本身跟不上频率时不补采，避免占满 CPU
+                next_at = now
+
+    def start(self, seconds: float, on_done: Callable[['SamplingProfiler'], None] = None) -> threading.Thread:
+        def _run():
+            self.run(seconds)
+            if on_done:
+                on_done(self)
+
+        self._thread = threading.Thread(target=_run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def write_collapsed(path: str, text: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def write_request(request: dict, profile_dir: str = RUNNER_PROFILE_DIR):
+    """写入本次分析的参数，taskrunner 各进程收到 SIGUSR2 后读取"""
+    os.makedirs(os.path.join(profile_dir, request['id']), exist_ok=True)
+    tmp = os.path.join(profile_dir, 'current.json.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(request, f)
+    os.replace(tmp, os.path.join(profile_dir, 'current.json'))
+
+
+def read_request(profile_dir: str = RUNNER_PROFILE_DIR) -> Optional[dict]:
+    try:
+        with open(os.path.join(profile_dir, 'current.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+_started_ids = set()
+
+
+def start_from_request(label: str, profile_dir: str = RUNNER_PROFILE_DIR) -> Optional[dict]:
+    """按 current.json 开始采样，同一个分析 id 在一个进程里只执行一次；请求已过期时忽略"""
+    request = read_request(profile_dir)
+    if not request or request['id'] in _started_ids or time.time() > request['started_at'] + request['seconds']:
+        return None
+    _started_ids.add(request['id'])
+    output = os.path.join(profile_dir, request['id'], f"{label}.collapsed")
+    profiler = SamplingProfiler(request['hz'], label, request.get('include_idle', False))
+    remaining = request['started_at'] + request['seconds'] - time.time()
+    profiler.start(remaining, lambda p: write_collapsed(output, p.collapsed()))
+    return request
+
+
+def install_profile_handler(label: Callable[[], str], forward: Callable[[], list] = None,
+                            profile_dir: str = RUNNER_PROFILE_DIR):
+    """
+    收到 SIGUSR2 时按 current.json 开始采样；forward 返回需要转发信号的进程（taskrunner 主进程转发给消费进程）。
+    信号处理函数中只启动线程，读文件和采样都在线程中进行；没有 SIGUSR2 的平台不注册
+    """
+    if PROFILE_SIGNAL is None:
+        return
+    owner = os.getpid()
+
+    def _start():
+        try:
+            start_from_request(f"{label()}-{os.getpid()}", profile_dir)
+        except Exception as e:
+            print(f"⚠️ 进程 {os.getpid()} 启动性能分析失败: {e}", flush=True)
+        # fork 出的子进程在重新注册前继承的是主进程的处理函数，不转发
+        for pid in (forward() if forward and os.getpid() == owner else []):
+            try:
+                os.kill(pid, PROFILE_SIGNAL)
+            except OSError:
+                pass
+
+    def _on_signal(signum, frame):
+        threading.Thread(target=_start, name='profile-request', daemon=True).start()
+
+    signal.signal(PROFILE_SIGNAL, _on_signal)
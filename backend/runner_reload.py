@@ -0,0 +1,174 @@
+"""
+taskrunner 任务代码热更新
+
+每隔 RUNNER_RELOAD_INTERVAL 秒用 BoosterDiscovery 重新扫描任务目录，发现 .py 文件新增、修改或删除后：
+
+- 在 taskrunner 主进程中重新执行变化的模块（与 BoosterDiscovery 的导入方式一致），@boost 重新注册，
+  新的消费子进程从主进程 fork 出来，因此使用的是新代码
+- 根据消费函数所在的文件找出受影响的队列；变化的是被任务模块 import 的公共模块（如 public.py）时，
+  先 reload 该模块，再重新执行 import 了它的任务模块
+- 只回收受影响队列的消费进程（先启动新进程，再让旧进程排空后退出），其它队列不受影响
+
+模块执行失败（例如保存了语法错误的代码）时只打印错误，保持旧进程继续运行。
+"""
+import ast
+import importlib
+import inspect
+import os
+import sys
+import traceback
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from runner_manifest import exec_task_file, registered_since, scan_py_files
+
+RUNNER_HOT_RELOAD = os.getenv('RUNNER_HOT_RELOAD', 'True').lower() in ('1', 'true', 'yes')
+RUNNER_RELOAD_INTERVAL = float(os.getenv('RUNNER_RELOAD_INTERVAL', '2'))
+
+
+class ReloadResult(NamedTuple):
+    # 代码有变化、需要回收进程的队列
+    changed: Set[str]
+    # 新增的队列
+    added: Set[str]
+    # 从代码中删除的队列
+    removed: Set[str]
+    # 执行失败的文件及错误
+    errors: Dict[str, str]
+
+
+def queue_source_file(params) -> Optional[str]:
+    """@boost 装饰的消费函数所在的文件"""
+    func = getattr(params, 'consuming_function', None)
+    if func is None:
+        return None
+    try:
+        func = inspect.unwrap(func)
+    except ValueError:
+        pass
+    code = getattr(func, '__code__', None)
+    return os.path.abspath(code.co_filename) if code else None
+
+
+def imported_names(path: str) -> Set[str]:
+    """文件中 import 的模块名（包括 from x.y import z 中的 x 和 x.y）"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules = [node.module]
+        else:
+            continue
+        for module in modules:
+            parts = module.split('.')
+            names.update('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+    return names
+
+
+class TaskReloader:
+    def __init__(self, tasks_dir: str, boosters_manager, max_depth: int = 3):
+        self.tasks_dir = os.path.abspath(tasks_dir)
+        self.boosters_manager = boosters_manager
+        self.max_depth = max_depth
+        self._mtimes = self.scan()
+        # 上一次轮询发现、但还没有稳定下来的变化，连续两次轮询 mtime 不变再处理，避免读到写了一半的文件
+        self._pending: Dict[str, Optional[float]] = {}
+
+    def scan(self) -> Dict[str, float]:
+        mtimes = {}
+        for path in scan_py_files(self.tasks_dir, self.max_depth):
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                pass
+        return mtimes
+
+    def poll(self) -> List[str]:
+        """返回自上次处理以来有变化且已经稳定的文件（包括新增和删除的）"""
+        current = self.scan()
+        changed = {path for path in current.keys() | self._mtimes.keys()
+                   if current.get(path) != self._mtimes.get(path)}
+        ready = [path for path in changed if path in self._pending and self._pending[path] == current.get(path)]
+        self._pending = {path: current.get(path) for path in changed if path not in ready}
+        for path in ready:
+            if path in current:
+                self._mtimes[path] = current[path]
+            else:
+                self._mtimes.pop(path, None)
+        return sorted(ready)
+
+    def _queue_files(self) -> Dict[str, Optional[str]]:
+        return {q: queue_source_file(p) for q, p in self.boosters_manager.queue_name__boost_params_map.items()}
+
+    def reload(self, paths: List[str]) -> ReloadResult:
+        params_map = self.boosters_manager.queue_name__boost_params_map
+        queue_files = self._queue_files()
+        booster_files = {f for f in queue_files.values() if f}
+        helpers = self._imported_helpers()
+        targets = set()
+        for path in paths:
+            if path in booster_files or path not in helpers:
+                targets.add(path)
+                continue
+            # 公共模块：先 reload，再重新执行 import 了它的任务模块
+            module_name = helpers[path]
+            if os.path.exists(path):
+                try:
+                    importlib.reload(sys.modules[module_name])
+                except Exception:
+                    return ReloadResult(set(), set(), set(), {path: traceback.format_exc(limit=5)})
+            targets.update(f for f in booster_files if module_name in imported_names(f))
+
+        errors = {}
+        changed, added, removed = set(), set(), set()
+        for path in sorted(targets):
+            old_queues = {q for q, f in queue_files.items() if f == path}
+            before = {q: p.consuming_function for q, p in params_map.items()}
+            if os.path.exists(path):
+                try:
+                    exec_task_file(self.tasks_dir, path)
+                except Exception:
+                    errors[path] = traceback.format_exc(limit=5)
+                    continue
+            registered = registered_since(params_map, before)
+            changed |= registered & old_queues
+            added |= registered - set(before)
+            gone = old_queues - registered
+            for queue_name in gone:
+                params_map.pop(queue_name, None)
+            removed |= gone
+        return ReloadResult(changed, added, removed, errors)
+
+    def _imported_helpers(self) -> Dict[str, str]:
+        """任务目录下被 import 进主进程的普通模块：文件路径 -> 模块名"""
+        helpers = {}
+        for name, module in list(sys.modules.items()):
+            file = getattr(module, '__file__', None)
+            if file and os.path.abspath(file).startswith(self.tasks_dir + os.sep):
+                helpers[os.path.abspath(file)] = name
+        return helpers
+
+
+def watch(reloader: TaskReloader, apply, stop_event, interval: float = RUNNER_RELOAD_INTERVAL):
+    """轮询任务目录，有变化时重新加载并调用 apply(ReloadResult)"""
+    while not stop_event.wait(interval):
+        try:
+            paths = reloader.poll()
+            if not paths:
+                continue
+            names = [os.path.relpath(p, reloader.tasks_dir) for p in paths]
+            print(f"♻️ 检测到任务代码变化: {names}", flush=True)
+            result = reloader.reload(paths)
+            for path, error in result.errors.items():
+                print(f"❌ 重新加载 {os.path.relpath(path, reloader.tasks_dir)} 失败，继续使用旧代码:\n{error}", flush=True)
+            if result.changed or result.added or result.removed:
+                apply(result)
+            elif not result.errors:
+                print("♻️ 没有队列受影响", flush=True)
+        except Exception:
+            print(f"❌ 热更新失败:\n{traceback.format_exc(limit=5)}", flush=True)
@@ -0,0 +1,166 @@
+"""
+taskrunner 进程拓扑配置
+
+在任务目录下放置 topology.json（文件名可通过 RUNNER_TOPOLOGY_FILE 修改），按队列和 booster_group
+设置消费进程数、并发模式和并发数，未提及的队列使用 default：
+
+    {
+      "default": {"processes": 1},
+      "groups": {
+        "test_group1": {"processes": 2, "shared": true}
+      },
+      "queues": {
+        "主要任务": {"processes": 2, "min_processes": 1, "max_processes": 8, "concurrent_num": 50},
+        "每日任务3": {"processes": 1, "concurrent_mode": "single_thread"}
+      }
+    }
+
+- 优先级：queues > groups > default；processes 为 0（且没有设置 max_processes）表示不启动该队列
+- 设置 min_processes / max_processes 后由 runner_autoscaler 按积压在上下限之间自动扩缩容，
+  processes 为启动时的进程数
+- 分组设置 shared 为 true 时，组内（没有单独配置的）队列共用同一批进程，每个进程消费组内所有队列
+- 没有配置文件时与原来一致：每个队列 4 个进程，并发参数使用 @boost 中的设置
+
+taskrunner 启动后把实际的进程分布写入 RUNNER_STATE_FILE，供 /api/process/status 展示。
+"""
+import json
+import os
+from typing import Dict, List, Optional
+
+TOPOLOGY_FILE_NAME = os.getenv('RUNNER_TOPOLOGY_FILE', 'topology.json')
+RUNNER_STATE_FILE = os.getenv('RUNNER_STATE_FILE', os.path.join(os.getenv('LOGS_DIR', '/app/logs'), 'runner_state.json'))
+DEFAULT_PROCESSES = 4
+
+CONCURRENT_MODES = ('threading', 'gevent', 'eventlet', 'async', 'single_thread')
+SPEC_KEYS = {'processes', 'min_processes', 'max_processes', 'concurrent_mode', 'concurrent_num'}
+
+
+class TopologyError(ValueError):
+    pass
+
+
+def topology_path(tasks_dir: str) -> str:
+    return TOPOLOGY_FILE_NAME if os.path.isabs(TOPOLOGY_FILE_NAME) else os.path.join(tasks_dir, TOPOLOGY_FILE_NAME)
+
+
+def _check_spec(where: str, spec, allow_shared: bool = False) -> dict:
+    if not isinstance(spec, dict):
+        raise TopologyError(f"{where} 必须是对象")
+    allowed = SPEC_KEYS | {'shared'} if allow_shared else SPEC_KEYS
+    unknown = set(spec) - allowed
+    if unknown:
+        raise TopologyError(f"{where} 包含未知配置项: {', '.join(sorted(unknown))}")
+    for key in ('processes', 'min_processes', 'max_processes'):
+        value = spec.get(key)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            raise TopologyError(f"{where}.{key} 必须是大于等于 0 的整数")
+    if spec.get('min_processes') is not None and spec.get('max_processes') is not None \
+            and spec['min_processes'] > spec['max_processes']:
+        raise TopologyError(f"{where}.min_processes 不能大于 max_processes")
+    mode = spec.get('concurrent_mode')
+    if mode is not None and mode not in CONCURRENT_MODES:
+        raise TopologyError(f"{where}.concurrent_mode 必须是 {'/'.join(CONCURRENT_MODES)} 之一")
+    num = spec.get('concurrent_num')
+    if num is not None and (not isinstance(num, int) or isinstance(num, bool) or num < 1):
+        raise TopologyError(f"{where}.concurrent_num 必须是大于 0 的整数")
+    if 'shared' in spec and not isinstance(spec['shared'], bool):
+        raise TopologyError(f"{where}.shared 必须是布尔值")
+    return dict(spec)
+
+
+def parse_topology(data) -> dict:
+    if not isinstance(data, dict):
+        raise TopologyError("拓扑配置必须是 JSON 对象")
+    unknown = set(data) - {'default', 'groups', 'queues'}
+    if unknown:
+        raise TopologyError(f"拓扑配置包含未知配置项: {', '.join(sorted(unknown))}")
+    topology = {'default': _check_spec('default', data.get('default', {})), 'groups': {}, 'queues': {}}
+    for section in ('groups', 'queues'):
+        items = data.get(section, {})
+        if not isinstance(items, dict):
+            raise TopologyError(f"{section} 必须是对象")
+        for name, spec in items.items():
+            topology[section][name] = _check_spec(f"{section}.{name}", spec, allow_shared=section == 'groups')
+    topology['default'].setdefault('processes', DEFAULT_PROCESSES)
+    return topology
+
+
+def load_topology(tasks_dir: str) -> dict:
+    """读取并校验任务目录下的拓扑配置，文件不存在时返回默认拓扑"""
+    path = topology_path(tasks_dir)
+    if not os.path.exists(path):
+        topology = parse_topology({})
+        topology.update(path=path, exists=False)
+        return topology
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise TopologyError(f"{path} 不是合法的 JSON: {e}")
+    topology = parse_topology(data)
+    topology.update(path=path, exists=True)
+    return topology
+
+
+def resolve_queue(topology: dict, queue_name: str, group: Optional[str]) -> dict:
+    """合并 default、分组和队列配置，得到单个队列的最终设置"""
+    spec = {key: topology['default'].get(key) for key in SPEC_KEYS}
+    for override in (topology['groups'].get(group, {}) if group else {}, topology['queues'].get(queue_name, {})):
+        spec.update({key: value for key, value in override.items() if key in SPEC_KEYS and value is not None})
+    # 没有设置上下限时进程数固定，不参与自动扩缩容；启动时的进程数限制在上下限之间
+    if spec['min_processes'] is None:
+        spec['min_processes'] = min(spec['processes'], spec['max_processes'] or spec['processes'])
+    if spec['max_processes'] is None:
+        spec['max_processes'] = max(spec['processes'], spec['min_processes'])
+    if spec['min_processes'] > spec['max_processes']:
+        raise TopologyError(f"队列 {queue_name} 的 min_processes 大于 max_processes")
+    spec['processes'] = min(max(spec['processes'], spec['min_processes']), spec['max_processes'])
+    return spec
+
+
+def build_plan(topology: dict, queue_groups: Dict[str, Optional[str]]) -> List[dict]:
+    """
+    按拓扑生成启动计划，每一项为一组使用相同设置的进程:
+    {'queues': [...], 'group': 分组名或 None, 'processes': n, 'min_processes': ..., 'max_processes': ...,
+     'concurrent_mode': ..., 'concurrent_num': ...}
+    """
+    plan = []
+    shared: Dict[str, dict] = {}
+    for queue_name, group in queue_groups.items():
+        spec = resolve_queue(topology, queue_name, group)
+        group_spec = topology['groups'].get(group, {}) if group else {}
+        if group_spec.get('shared') and queue_name not in topology['queues']:
+            unit = shared.get(group)
+            if unit is None:
+                unit = shared[group] = {'queues': [], 'group': group, **spec}
+                plan.append(unit)
+            unit['queues'].append(queue_name)
+        else:
+            plan.append({'queues': [queue_name], 'group': None, **spec})
+    return [unit for unit in plan if unit['max_processes'] > 0]
+
+
+_state_write_failed = False
+
+
+def write_state(state: dict, path: str = RUNNER_STATE_FILE):
+    """状态文件只用于 API 展示进程分布，目录不存在或不可写时只警告一次，不影响 taskrunner 运行"""
+    global _state_write_failed
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        if not _state_write_failed:
+            _state_write_failed = True
+            print(f"⚠️ 进程状态文件写入失败，API 中将看不到进程分布: {e}", flush=True)
+
+
+def read_state(path: str = RUNNER_STATE_FILE) -> Optional[dict]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
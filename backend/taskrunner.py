@@ -12,26 +12,257 @@ sys.path.insert(0, tasks_dir)  # 🎯 将任务目录添加到Python路径最前
 print(f"📁 任务目录: {tasks_dir}")
 print(f"🐍 Python路径: {sys.path[:3]}...")  # 显示前3个路径
 
-from funboost import BoosterDiscovery, BoostersManager
+import multiprocessing
+import signal
+import threading
+import time
+
+from funboost import BoostersManager, ctrl_c_recv
+from funboost.core.helper_funs import run_forever
+from runner_autoscaler import AUTOSCALE_INTERVAL, Autoscaler, default_backlog_source
+from runner_drain import drain_handler_installed, draining, install_drain_handler, track
+from runner_manifest import RUNNER_DISCOVERY_CACHE, discover
+from runner_profiler import install_profile_handler
+from runner_prefork import RUNNER_PREFORK, freeze, mp_context, warm_up
+from runner_reload import RUNNER_HOT_RELOAD, RUNNER_RELOAD_INTERVAL, ReloadResult, TaskReloader, watch
+from runner_topology import build_plan, load_topology, write_state
+
+
+def discover_boosters():
+    """按队列发现清单执行任务目录下的 .py 文件，没有变化且没有定义队列的文件跳过，见 runner_manifest"""
+    return discover(tasks_dir, BoostersManager, max_depth=3)
+
+
+def consume_queues(unit):
+    """消费子进程：在本进程内创建 booster 并消费给定的队列"""
+    queue_names = unit['queues']
+    # 🔬 收到 SIGUSR2 时按 API 的请求采样本进程，见 runner_profiler
+    install_profile_handler(lambda: f"consumer[{','.join(queue_names)}]")
+    if not all(q in BoostersManager.queue_name__boost_params_map for q in queue_names):
+        # 关闭预热 fork 且平台默认使用 spawn 时，子进程需要重新导入任务模块
+        discover_boosters()
+        apply_concurrency(unit)
+    if not drain_handler_installed():
+        # spawn 启动的子进程没有继承主进程的 SIGTERM 处理，在导入任务模块之后注册
+        install_drain_handler()
+    for queue_name in queue_names:
+        booster = BoostersManager.get_or_create_booster_by_queue_name(queue_name)
+        # 🛑 收到 SIGTERM 后不再提交新取到的消息，见 runner_drain
+        track(booster.consumer)
+        booster.consume()
+    run_forever()
+
+
+def apply_concurrency(unit):
+    """把拓扑中的并发设置写回队列的 @boost 参数，子进程按这些参数创建 booster"""
+    updates = {key: unit[key] for key in ('concurrent_mode', 'concurrent_num') if unit[key] is not None}
+    if unit['concurrent_mode'] == 'single_thread':
+        updates['concurrent_num'] = 1
+    for queue_name in unit['queues']:
+        params = BoostersManager.get_boost_params(queue_name)
+        if updates:
+            params = BoostersManager.queue_name__boost_params_map[queue_name] = params.model_copy(update=updates)
+        unit.update(concurrent_mode=params.concurrent_mode, concurrent_num=params.concurrent_num)
+
+
+class ConsumerPool:
+    """按拓扑启动的消费进程，自动扩缩容通过 scale 增减进程"""
+
+    def __init__(self, plan, topology_path):
+        self.plan = plan
+        self.topology_path = topology_path
+        self.started_at = time.time()
+        self._procs = {id(unit): [] for unit in plan}
+        # 默认从已经导入了所有模块的主进程 fork 子进程，见 runner_prefork
+        self._mp = mp_context()
+        # 自动扩缩容决策记录，随进程分布一起写入状态文件
+        self.decisions = []
+        self._lock = threading.Lock()
+
+    def count(self, unit) -> int:
+        with self._lock:
+            procs = self._procs[id(unit)] = [p for p in self._procs.get(id(unit), []) if p.is_alive()]
+            return len(procs)
+
+    def scale(self, unit, target: int):
+        if draining.is_set():
+            return
+        with self._lock:
+            procs = self._procs[id(unit)] = [p for p in self._procs.get(id(unit), []) if p.is_alive()]
+            if len(procs) < target:
+                freeze()
+            while len(procs) < target:
+                process = self._mp.Process(target=consume_queues, args=(dict(unit, pids=[]),))
+                process.start()
+                procs.append(process)
+            while len(procs) > target:
+                # 先退出最新的进程；SIGTERM 由 runner_drain 处理，等正在执行的任务完成后退出
+                process = procs.pop()
+                os.kill(process.pid, signal.SIGTERM)
+            unit['processes'] = len(procs)
+            unit['pids'] = [p.pid for p in procs]
+        self.write_state()
+
+    def recycle(self, unit):
+        """代码更新后替换进程组的所有进程：先启动同样数量的新进程，再让旧进程排空后退出"""
+        if draining.is_set():
+            return
+        with self._lock:
+            old = [p for p in self._procs.get(id(unit), []) if p.is_alive()]
+            procs = []
+            freeze()
+            for _ in range(len(old) or unit['processes']):
+                process = self._mp.Process(target=consume_queues, args=(dict(unit, pids=[]),))
+                process.start()
+                procs.append(process)
+            for process in old:
+                os.kill(process.pid, signal.SIGTERM)
+            self._procs[id(unit)] = procs
+            unit['processes'] = len(procs)
+            unit['pids'] = [p.pid for p in procs]
+        self.write_state()
+
+    def retire(self, unit):
+        """队列已从代码中删除，退出整个进程组"""
+        self.scale(unit, 0)
+        with self._lock:
+            self._procs.pop(id(unit), None)
+            self.plan[:] = [u for u in self.plan if u is not unit]
+        self.write_state()
+
+    def pids(self) -> list:
+        with self._lock:
+            return [p.pid for procs in self._procs.values() for p in procs if p.is_alive()]
+
+    def write_state(self):
+        write_state({
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'topology_path': self.topology_path,
+            'units': self.plan,
+            'autoscale_decisions': list(self.decisions),
+        })
+
+
+def autoscale_loop(autoscaler: Autoscaler, pool: ConsumerPool):
+    last_decision = None
+    while not draining.wait(AUTOSCALE_INTERVAL):
+        try:
+            autoscaler.tick()
+            # 被冷却时间或上下限拦下的决策也写入状态文件
+            if autoscaler.decisions and autoscaler.decisions[-1] is not last_decision:
+                last_decision = autoscaler.decisions[-1]
+                pool.write_state()
+        except Exception as e:
+            print(f"⚠️ 自动扩缩容采样失败: {e}", flush=True)
+        # 回收已退出的子进程
+        multiprocessing.active_children()
+
+
+def apply_reload(result: ReloadResult, pool: ConsumerPool, topology: dict, autoscaler: Autoscaler = None):
+    """只回收代码有变化的队列所在的进程组，新增的队列按拓扑启动，删除的队列退出"""
+    affected = []
+    for unit in list(pool.plan):
+        queues = set(unit['queues'])
+        if queues & result.removed:
+            unit['queues'] = [q for q in unit['queues'] if q not in result.removed]
+            if not unit['queues']:
+                pool.retire(unit)
+                if autoscaler:
+                    autoscaler.untrack(unit)
+                print(f"🗑️ 队列 {sorted(queues)} 已从代码中删除，进程已退出", flush=True)
+                continue
+            affected.append(unit)
+        elif queues & result.changed:
+            affected.append(unit)
+
+    new_units = build_plan(topology, {q: BoostersManager.get_boost_params(q).booster_group for q in sorted(result.added)})
+    warm_up(result.added)
+    for new_unit in new_units:
+        # 共用进程的分组已经在运行时，新队列加入该分组并回收分组的进程
+        shared = next((u for u in pool.plan if new_unit['group'] and u['group'] == new_unit['group']), None)
+        if shared is not None:
+            shared['queues'].extend(new_unit['queues'])
+            if shared not in affected:
+                affected.append(shared)
+            continue
+        apply_concurrency(new_unit)
+        pool.plan.append(new_unit)
+        pool.scale(new_unit, new_unit['processes'])
+        if autoscaler:
+            autoscaler.track(new_unit)
+        print(f"🆕 新队列 {new_unit['queues']}: 启动 {new_unit['processes']} 个进程，pid={new_unit['pids']}", flush=True)
+
+    for unit in affected:
+        # 重新注册后 @boost 参数被覆盖，需要重新应用拓扑中的并发设置
+        apply_concurrency(unit)
+        old_pids = unit.get('pids', [])
+        pool.recycle(unit)
+        print(f"♻️ 重新加载 {unit['queues']}: 进程 {old_pids} 排空后退出，新进程 pid={unit['pids']}", flush=True)
+    skipped = result.added - {q for unit in new_units for q in unit['queues']}
+    if skipped:
+        print(f"⏸️ 新队列进程数为 0，不启动: {sorted(skipped)}", flush=True)
+
 
 def main():
+    # 📐 读取任务目录下的进程拓扑配置，配置错误直接退出
+    topology = load_topology(tasks_dir)
+    if topology['exists']:
+        print(f"📐 进程拓扑: {topology['path']}")
+    else:
+        print(f"📐 未找到进程拓扑配置 {topology['path']}，每个队列默认 {topology['default']['processes']} 个进程")
+
     # 🚀 自动发现所有消费函数
-    discovery = BoosterDiscovery(
-        project_root_path=tasks_dir,  # 🎯 直接设置为任务目录
-        booster_dirs=['.'],           # 🎯 扫描当前目录
-        max_depth=3,                  # 扫描3层子目录
-    )
-    discovery.auto_discovery()
+    stats = discover_boosters()
+    cache_note = f"，跳过 {stats['skipped']} 个没有队列的文件" if RUNNER_DISCOVERY_CACHE else ''
+    print(f"🔍 扫描 {stats['files']} 个文件，执行 {stats['executed']} 个（{stats['changed']} 个有变化）{cache_note}，"
+          f"耗时 {stats['seconds'] * 1000:.0f} ms")
     
     # 📋 显示所有发现的队列
     all_queues = BoostersManager.get_all_queues()
     print(f"✅ 发现了 {len(all_queues)} 个队列: {all_queues}")
     
-    # 🚀🚀🚀🚀 一次性启动所有消费函数，每个队列开4个进程！
-    print("🔥 正在启动所有消费函数，每个队列4个进程...")
-    BoostersManager.mp_consume_all(4)
-    
-    print("🎉 所有消费者已启动！按 Ctrl+C 退出")
+    # 🔥 fork 消费进程前在主进程中导入中间件模块，子进程直接继承
+    if RUNNER_PREFORK:
+        print(f"🔥 预热 fork 模式，中间件模块预热耗时 {warm_up(all_queues) * 1000:.0f} ms")
+
+    # 🛑 收到 SIGTERM 时先停止拉取新消息，等正在执行的任务完成后再退出
+    install_drain_handler()
+
+    # 🚀🚀🚀🚀 按拓扑启动消费进程
+    plan = build_plan(topology, {q: BoostersManager.get_boost_params(q).booster_group for q in all_queues})
+    skipped = set(all_queues) - {q for unit in plan for q in unit['queues']}
+    if skipped:
+        print(f"⏸️ 进程数为 0，不启动: {sorted(skipped)}")
+    pool = ConsumerPool(plan, topology['path'] if topology['exists'] else None)
+    # 🔬 性能分析请求由主进程转发给所有消费进程
+    install_profile_handler(lambda: 'taskrunner', forward=pool.pids)
+    for unit in plan:
+        apply_concurrency(unit)
+        pool.scale(unit, unit['processes'])
+        label = f"分组 {unit['group']} 共用" if unit['group'] else "队列"
+        scaling = f"（自动扩缩容 {unit['min_processes']}~{unit['max_processes']}）" \
+            if unit['max_processes'] > unit['min_processes'] else ''
+        print(f"🔥 {label} {unit['queues']}: {unit['processes']} 个进程{scaling}，"
+              f"{unit['concurrent_mode']} 并发 {unit['concurrent_num']}，pid={unit['pids']}")
+
+    # 📈 设置了 min_processes/max_processes 的队列按积压自动扩缩容
+    autoscaler = None
+    if any(unit['max_processes'] > unit['min_processes'] for unit in plan):
+        autoscaler = Autoscaler(plan, default_backlog_source(), pool.count, pool.scale)
+        pool.decisions = autoscaler.decisions
+        threading.Thread(target=autoscale_loop, args=(autoscaler, pool), name='autoscaler', daemon=True).start()
+        print(f"📈 自动扩缩容已启用，每 {AUTOSCALE_INTERVAL:g} 秒采样一次队列积压")
+
+    # ♻️ 任务代码变化时只重新加载受影响的队列
+    if RUNNER_HOT_RELOAD:
+        reloader = TaskReloader(tasks_dir, BoostersManager, max_depth=3)
+        threading.Thread(target=watch, name='task-reloader', daemon=True,
+                         args=(reloader, lambda result: apply_reload(result, pool, topology, autoscaler), draining)).start()
+        print(f"♻️ 任务代码热更新已启用，每 {RUNNER_RELOAD_INTERVAL:g} 秒检查一次")
+
+    print(f"🎉 所有消费者已启动！共 {sum(pool.count(unit) for unit in plan)} 个消费进程，按 Ctrl+C 退出")
+    ctrl_c_recv()
 
 if __name__ == '__main__':
     main()
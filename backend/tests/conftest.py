@@ -0,0 +1,34 @@
+"""
+测试环境：在导入任何业务模块前指定本地 sqlite 和临时日志目录，不依赖 MySQL / Docker 中的 /app/logs
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault('SQLACHEMY_ENGINE_URL', 'sqlite://')
+os.environ.setdefault('LOGS_DIR', tempfile.mkdtemp(prefix='taskrun-test-logs-'))
+
+
+@pytest.fixture
+def db():
+    """每个测试独立的内存 sqlite 会话，建好结果表和汇总表"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    import app.models.funboost_result  # noqa: F401
+    import app.models.funboost_result_rollup  # noqa: F401
+    from app.database import Base
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
@@ -0,0 +1,98 @@
+import sys
+
+import pytest
+
+from app.services import dependency_installer
+from app.services.dependency_installer import DependencyInstaller, requirements_hash, unsatisfied_requirements
+
+
+def _requirements(tmp_path, text):
+    path = tmp_path / 'requirements.txt'
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_satisfied_requirements(tmp_path):
+    req_file = _requirements(tmp_path, "\n".join([
+        "# 注释",
+        "",
+        "numpy>=1.0",
+        "pytest  # 行尾注释",
+        "NumPy[extra]>=1.0",
+    ]))
+    assert unsatisfied_requirements(req_file) == []
+
+
+def test_missing_and_mismatched_requirements(tmp_path):
+    import numpy
+    req_file = _requirements(tmp_path, "\n".join([
+        "taskrun-surely-not-installed==1.0",
+        "numpy<1.0",
+        "pytest",
+    ]))
+    assert unsatisfied_requirements(req_file) == [
+        'taskrun-surely-not-installed',
+        f"numpy=={numpy.__version__} (需要 <1.0)",
+    ]
+
+
+def test_unverifiable_lines_are_ignored(tmp_path):
+    req_file = _requirements(tmp_path, "\n".join([
+        "-r other.txt",
+        "-e ./local-package",
+        "--index-url https://example.com/simple",
+        "some-package @ https://example.com/some_package-1.0-py3-none-any.whl",
+        "not a valid requirement ===",
+        'taskrun-surely-not-installed; python_version < "3"',
+    ]))
+    assert unsatisfied_requirements(req_file) == []
+
+
+def test_requirements_hash_tracks_content_and_python(tmp_path, monkeypatch):
+    req_file = _requirements(tmp_path, "numpy\n")
+    digest = requirements_hash(req_file)
+    assert requirements_hash(req_file) == digest
+    monkeypatch.setattr(sys, 'version', sys.version + ' changed')
+    assert requirements_hash(req_file) != digest
+
+
+@pytest.fixture
+def installs():
+    """记录 _install_requirements 被调用的任务目录"""
+    return []
+
+
+@pytest.fixture
+def installer(tmp_path, monkeypatch, installs):
+    installer = DependencyInstaller(wheelhouse=str(tmp_path / 'wheelhouse'), state_file=str(tmp_path / 'state.json'))
+    installer.current = {'started_at': 0, 'total': 3}
+    monkeypatch.setattr(installer, '_install_requirements',
+                        lambda tasks_dir, python, first_step: installs.append(tasks_dir) or 'offline')
+    monkeypatch.setattr(dependency_installer, 'add_log', lambda log_type, line: None)
+    return installer
+
+
+def test_install_skipped_only_when_unchanged_and_satisfied(tmp_path, installer, installs):
+    tasks_dir = tmp_path / 'tasks'
+    tasks_dir.mkdir()
+    assert installer._install(str(tasks_dir), False) == {'status': 'missing'}
+
+    _requirements(tasks_dir, "pytest\n")
+    assert installer._install(str(tasks_dir), False)['status'] == 'installed'
+    assert installer._install(str(tasks_dir), False)['status'] == 'skipped'
+    assert installer._install(str(tasks_dir), True)['status'] == 'installed'
+
+    # 内容变化后重新安装
+    _requirements(tasks_dir, "pytest\nnumpy\n")
+    assert installer._install(str(tasks_dir), False)['status'] == 'installed'
+    assert len(installs) == 3
+
+
+def test_install_repeated_when_requirement_went_missing(tmp_path, installer, installs):
+    tasks_dir = tmp_path / 'tasks'
+    tasks_dir.mkdir()
+    _requirements(tasks_dir, "taskrun-surely-not-installed\n")
+    assert installer._install(str(tasks_dir), False)['status'] == 'installed'
+    # 与上次安装成功时相同，但依赖实际不存在（例如容器重建）
+    assert installer._install(str(tasks_dir), False)['status'] == 'installed'
+    assert len(installs) == 2
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.crud import funboost_result as crud
+from app.models.funboost_result import FunboostConsumeResult
+
+
+def test_cursor_round_trip():
+    insert_time = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    for direction in (crud.CURSOR_NEXT, crud.CURSOR_PREV):
+        cursor = crud.encode_cursor(insert_time, 'id/with+chars', direction)
+        assert '=' not in cursor
+        assert crud.decode_cursor(cursor) == (insert_time, 'id/with+chars', direction)
+
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    'not-base64!!',
+    crud.encode_cursor(datetime(2024, 1, 1), 'a', 'next')[:-4],
+    # 合法 base64 但方向不对 / 字段数不对 / 时间格式不对
+    crud.base64.urlsafe_b64encode(b'["2024-01-01T00:00:00","a","up"]').decode(),
+    crud.base64.urlsafe_b64encode(b'["2024-01-01T00:00:00","a"]').decode(),
+    crud.base64.urlsafe_b64encode(b'["yesterday","a","next"]').decode(),
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match='无效的游标'):
+        crud.decode_cursor(cursor)
+
+
+def _add_rows(db, count, start=datetime(2024, 1, 1)):
+    # 每两行共用一个 insert_time，检查同一时间点内按 _id 翻页
+    for i in range(count):
+        db.add(FunboostConsumeResult(_id=f"{i:03d}", queue_name='q', insert_time=start + timedelta(seconds=i // 2)))
+    db.add(FunboostConsumeResult(_id='no-time', queue_name='q', insert_time=None))
+    db.commit()
+
+
+def test_cursor_pages_cover_all_rows_once(db):
+    _add_rows(db, 7)
+    query = crud.list_query(db)
+    rows, prev_cursor, next_cursor = crud.fetch_page_by_offset(query, 1, 3)
+    assert prev_cursor is None
+    seen = [row._id for row in rows]
+    while next_cursor:
+        rows, prev_cursor, next_cursor = crud.fetch_page_by_cursor(query, next_cursor, 3)
+        seen += [row._id for row in rows]
+    assert seen == [f"{i:03d}" for i in reversed(range(7))]
+
+    # 从最后一页向前翻回到第一页
+    rows, prev_cursor, _ = crud.fetch_page_by_cursor(query, prev_cursor, 3)
+    assert [row._id for row in rows] == ['003', '002', '001']
+    rows, prev_cursor, _ = crud.fetch_page_by_cursor(query, prev_cursor, 3)
+    assert [row._id for row in rows] == ['006', '005', '004']
+    assert prev_cursor is None
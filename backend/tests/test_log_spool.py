@@ -0,0 +1,96 @@
+import uuid
+from datetime import datetime, timedelta
+
+from app.services import log_spool
+from app.services.log_spool import LogSpool
+
+T0 = datetime(2024, 1, 1, 12, 0)
+
+
+def _task_ids(n):
+    return [str(uuid.UUID(int=i + 1)) for i in range(n)]
+
+
+def _write(spool, lines):
+    for i, line in enumerate(lines):
+        spool.write(line, now=T0 + timedelta(seconds=i))
+
+
+def test_task_lines_across_segments(tmp_path):
+    a, b = _task_ids(2)
+    spool = LogSpool(str(tmp_path), segment_bytes=200, index_task_ids=True)
+    lines = [f"{a} start", "no task here", f"{b} start", f"{a} {b} both", f"{a} done"] * 3
+    _write(spool, lines)
+    assert len(spool.segments) > 1
+
+    result = spool.task_lines(a)
+    assert [line['line'] for line in result['lines']] == [line for line in lines if a in line]
+    assert result['lines'][0]['time'] == '2024-01-01T12:00:00.000'
+    assert not result['truncated']
+    assert len(spool.task_lines(b)['lines']) == 6
+    assert spool.task_lines(str(uuid.UUID(int=999)))['lines'] == []
+
+    truncated = spool.task_lines(a, limit=2)
+    assert truncated['truncated'] and [line['line'] for line in truncated['lines']] == [f"{a} start", f"{a} {b} both"]
+
+
+def test_evicted_task_ids_fall_back_to_index_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_spool, 'LOG_TASK_INDEX_MAX_TASKS', 2)
+    ids = _task_ids(4)
+    spool = LogSpool(str(tmp_path), segment_bytes=150, index_task_ids=True)
+    # ids[3] 首次出现在发生淘汰之后，内存中的记录被标记为不完整
+    _write(spool, [f"{ids[3]} early", ids[0], ids[1], ids[2], f"{ids[3]} late"])
+    assert ids[0] not in spool._recent_tasks
+    assert [line['line'] for line in spool.task_lines(ids[0])['lines']] == [ids[0]]
+    assert [line['line'] for line in spool.task_lines(ids[3])['lines']] == [f"{ids[3]} early", f"{ids[3]} late"]
+
+
+def test_task_lines_after_restart(tmp_path):
+    task_id = _task_ids(1)[0]
+    spool = LogSpool(str(tmp_path), index_task_ids=True)
+    _write(spool, [f"{task_id} before restart"])
+    spool.close()
+
+    spool = LogSpool(str(tmp_path), index_task_ids=True)
+    spool.write(f"{task_id} after restart", now=T0 + timedelta(minutes=1))
+    assert [line['line'] for line in spool.task_lines(task_id)['lines']] == [
+        f"{task_id} before restart", f"{task_id} after restart"]
+
+
+def test_rotated_segments_are_dropped(tmp_path):
+    task_id = _task_ids(1)[0]
+    spool = LogSpool(str(tmp_path), segment_bytes=100, max_segments=2, index_task_ids=True)
+    _write(spool, [f"{task_id} {i}" for i in range(10)])
+    assert len(spool.segments) == 2
+    remaining = [line['line'] for line in spool.task_lines(task_id)['lines']]
+    assert remaining and remaining == [f"{task_id} {i}" for i in range(10)][-len(remaining):]
+
+
+def test_time_range_query_uses_sparse_index(tmp_path):
+    spool = LogSpool(str(tmp_path), segment_bytes=2000, index_interval=100)
+    _write(spool, [f"line {i}" for i in range(100)])
+    result = spool.query(T0 + timedelta(seconds=40), T0 + timedelta(seconds=45))
+    assert [line['line'] for line in result['lines']] == [f"line {i}" for i in range(40, 45)]
+    result = spool.query(keyword='line 9', limit=5)
+    assert [line['line'] for line in result['lines']] == ['line 9'] + [f"line {i}" for i in range(90, 94)]
+    assert result['truncated']
+
+
+def test_task_offsets_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_spool, 'LOG_TASK_INDEX_MAX_OFFSETS', 3)
+    noisy, quiet = _task_ids(2)
+    spool = LogSpool(str(tmp_path), segment_bytes=200, index_task_ids=True)
+    _write(spool, [f"{noisy} {i}" for i in range(5)] + [f"{quiet} once"])
+    assert spool._recent_tasks[noisy] == [False, []]
+    assert [line['line'] for line in spool.task_lines(noisy)['lines']] == [f"{noisy} {i}" for i in range(5)]
+    assert spool._recent_tasks[quiet][0]
+
+
+def test_rotated_segments_are_removed_from_memory_index(tmp_path):
+    old, recent = _task_ids(2)
+    spool = LogSpool(str(tmp_path), segment_bytes=100, max_segments=2, index_task_ids=True)
+    _write(spool, [f"{old} {i}" for i in range(3)] + [f"{recent} {i}" for i in range(6)])
+    names = {segment.name for segment in spool.segments}
+    assert old not in spool._recent_tasks
+    assert all(name in names for name, _ in spool._recent_tasks[recent][1])
+    assert set(spool._segment_tasks) <= names
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from app.services import log_stream
+from app.services.log_stream import LogRingBuffer, LogStreamManager, parse_last_event_id, skipped_marker
+
+
+def test_ring_buffer_sequence_and_wrap():
+    buffer = LogRingBuffer(capacity=3)
+    assert (buffer.first_seq, buffer.last_seq, buffer.since(0)) == (1, 0, [])
+    assert [buffer.append(f"line{i}", 'stdout' if i % 2 else 'stderr') for i in range(1, 6)] == [1, 2, 3, 4, 5]
+    # 写满后覆盖最旧的行，序号不重复使用
+    assert (buffer.first_seq, buffer.last_seq) == (3, 5)
+    assert buffer.since(0) == [(3, 'line3'), (4, 'line4'), (5, 'line5')]
+    assert buffer.since(4) == [(5, 'line5')]
+    assert buffer.since(5) == []
+    assert buffer.tail(2) == [(4, 'line4'), (5, 'line5')]
+    assert buffer.lines() == ['line3', 'line4', 'line5']
+    assert buffer.streams() == ['stdout', 'stderr', 'stdout']
+
+
+@pytest.mark.parametrize('value, expected', [(None, None), ('', None), ('42', 42), ('abc', None)])
+def test_parse_last_event_id(value, expected):
+    assert parse_last_event_id(value) == expected
+
+
+def _collect_replay(manager, last_event_id):
+    """订阅并取出回放历史的所有事件，不等待新日志"""
+    async def run():
+        events = []
+        stream = manager.subscribe('process', last_event_id)
+        buffer = manager.buffers['process']
+        while not events or events[-1]['id'] < buffer.last_seq:
+            events.append(await asyncio.wait_for(stream.__anext__(), 1))
+        await stream.aclose()
+        return events
+    return asyncio.run(run())
+
+
+def _manager(lines, capacity=100):
+    buffer = LogRingBuffer(capacity=capacity)
+    for i in range(1, lines + 1):
+        buffer.append(f"line{i}")
+    return LogStreamManager({'process': buffer})
+
+
+def test_replay_resumes_after_last_event_id():
+    events = _collect_replay(_manager(10), 7)
+    assert events == [{'id': 10, 'data': 'line8\nline9\nline10'}]
+
+
+def test_replay_without_last_event_id_sends_recent_lines(monkeypatch):
+    monkeypatch.setattr(log_stream, 'LOG_REPLAY_LINES', 4)
+    events = _collect_replay(_manager(10), None)
+    assert events == [{'id': 10, 'data': 'line7\nline8\nline9\nline10'}]
+
+
+def test_replay_after_restart_ignores_stale_id(monkeypatch):
+    monkeypatch.setattr(log_stream, 'LOG_REPLAY_LINES', 2)
+    # Last-Event-ID 大于当前最新序号：服务重启过，按新订阅者处理
+    events = _collect_replay(_manager(5), 500)
+    assert events == [{'id': 5, 'data': 'line4\nline5'}]
+
+
+def test_replay_marks_overwritten_lines(monkeypatch):
+    monkeypatch.setattr(log_stream, 'LOG_BATCH_MAX_LINES', 2)
+    events = _collect_replay(_manager(10, capacity=3), 2)
+    # 3..7 已被覆盖，第一个事件带跳过提示，历史按批次拆分
+    assert events == [
+        {'id': 9, 'data': f"{skipped_marker(5)}\nline8\nline9"},
+        {'id': 10, 'data': 'line10'},
+    ]
+
+
+def test_live_lines_follow_replay_without_duplicates(monkeypatch):
+    monkeypatch.setattr(log_stream, 'LOG_BATCH_INTERVAL', 0)
+    manager = _manager(3)
+    buffer = manager.buffers['process']
+
+    async def run():
+        stream = manager.subscribe('process', 1)
+        first = await stream.__anext__()
+        # 订阅后写入的行，以及已经在历史中发送过的行重复广播时
+        manager.broadcast_many('process', [(3, 'line3'), (buffer.append('line4'), 'line4')])
+        second = await asyncio.wait_for(stream.__anext__(), 1)
+        await stream.aclose()
+        return first, second, manager.subscribers['process']
+
+    first, second, subscribers = asyncio.run(run())
+    assert first == {'id': 3, 'data': 'line2\nline3'}
+    assert second == {'id': 4, 'data': 'line4'}
+    assert subscribers == {}
+
+
+def test_add_logs_does_not_wait_for_slow_spool(monkeypatch):
+    import threading
+
+    from app.services import log_spool
+
+    release = threading.Event()
+    written = []
+
+    def slow_write(log_type, line, now):
+        release.wait(5)
+        written.append(line)
+
+    writer = log_spool.SpoolWriter(max_pending=10)
+    monkeypatch.setattr(log_spool, '_write_line', slow_write)
+    monkeypatch.setattr(log_spool, 'spool_writer', writer)
+    monkeypatch.setitem(log_stream.logs_store, 'process', LogRingBuffer(capacity=100))
+
+    log_stream.add_logs('process', [f"line{i}" for i in range(5)])
+    log_stream.add_log('process', 'line5')
+    assert log_stream.logs_store['process'].lines() == [f"line{i}" for i in range(6)]
+    assert written == []
+
+    release.set()
+    writer.join()
+    assert written == [f"line{i}" for i in range(6)]
+
+
+def test_spool_queue_drops_when_full(monkeypatch):
+    import threading
+
+    from app.services import log_spool
+
+    release = threading.Event()
+    monkeypatch.setattr(log_spool, '_write_line', lambda log_type, line, now: release.wait(5))
+    writer = log_spool.SpoolWriter(max_pending=2)
+    try:
+        for i in range(10):
+            writer.submit('process', f"line{i}", None)
+        # 后台线程最多取走一行，队列中最多再保留两行
+        assert writer.dropped >= 7
+    finally:
+        release.set()
+        writer.join()
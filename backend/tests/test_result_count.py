@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+
+from app.crud import funboost_result as crud
+from app.crud import result_count
+from app.crud.result_count import ResultCountCache, WriteVersions
+from app.models.funboost_result import FunboostConsumeResult
+
+
+@pytest.fixture
+def versions(monkeypatch):
+    """用字典代替 redis 中的写入版本号表"""
+    table = {}
+    local = WriteVersions(max_age=0)
+    monkeypatch.setattr(result_count, 'write_versions', local)
+
+    class FakeRedis:
+        def hgetall(self, key):
+            assert key == result_count.RESULTS_WRITE_VERSION_KEY
+            return dict(table)
+
+    monkeypatch.setattr(result_count, '_redis', FakeRedis)
+    local.refresh(force=True)
+    return table, local
+
+
+def test_hit_until_ttl(monkeypatch, versions):
+    now = [100.0]
+    monkeypatch.setattr(result_count.time, 'monotonic', lambda: now[0])
+    cache = ResultCountCache(ttl=30)
+    key = (None, 'q', None)
+    cache.set(key, 5, cache.current_version(key))
+    assert cache.get(key)[0] == 5
+    now[0] += 30
+    assert cache.get(key)[0] is None
+
+
+def test_local_invalidate_by_queue(versions):
+    cache = ResultCountCache(ttl=30)
+    keys = [(None, 'a', None), (None, 'b', True), (None, None, None), ('t', None, None)]
+    for key in keys:
+        cache.set(key, 1, cache.current_version(key))
+    cache.invalidate('a')
+    # 队列 a 和不带队列过滤的条目都会受队列 a 写入的影响
+    assert [cache.get(key)[0] for key in keys] == [None, 1, None, None]
+    cache.invalidate()
+    assert cache.get((None, 'b', True))[0] is None
+
+
+def test_write_version_invalidates_matching_queue(versions):
+    table, local = versions
+    table['a'] = '1'
+    local.refresh(force=True)
+    cache = ResultCountCache(ttl=30)
+    a, b, everything = (None, 'a', None), (None, 'b', None), (None, None, None)
+    for key in (a, b, everything):
+        cache.set(key, 1, cache.current_version(key))
+
+    # 另一个进程写入了队列 a
+    table['a'] = '2'
+    assert cache.get(a)[0] == 1  # 本地版本表刷新前仍使用旧版本
+    local.refresh(force=True)
+    assert cache.get(a)[0] is None
+    assert cache.get(b)[0] == 1
+    assert cache.get(everything)[0] is None
+
+
+def test_redis_unavailable_falls_back_to_ttl(monkeypatch):
+    def broken():
+        raise ConnectionError('redis down')
+
+    local = WriteVersions(max_age=0)
+    monkeypatch.setattr(result_count, 'write_versions', local)
+    monkeypatch.setattr(result_count, '_redis', broken)
+    assert local.refresh() is None
+    cache = ResultCountCache(ttl=30)
+    key = (None, 'a', None)
+    cache.set(key, 3, cache.current_version(key))
+    assert cache.get(key)[0] == 3
+    result_count.mark_results_written(['a'])  # 不抛出异常
+
+
+def test_count_results_marks_cached_totals_inexact(db, monkeypatch, versions):
+    monkeypatch.setattr(result_count, 'count_cache', ResultCountCache(ttl=30))
+    db.add(FunboostConsumeResult(_id='1', queue_name='q', insert_time=datetime(2024, 1, 1)))
+    db.commit()
+    key = (None, 'q', None)
+    query = crud.list_query(db, queue_name='q')
+    assert result_count.count_results(db, query, key) == (1, True)
+    assert result_count.count_results(db, query, key) == (1, False)
+    assert result_count.count_results(db, query, key, result_count.COUNT_MODE_EXACT) == (1, True)
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.crud import result_retention
+from app.models.funboost_result import FunboostConsumeResult
+
+T0 = datetime(2024, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_retention, 'ARCHIVE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def _add(db, n, queue_name='q'):
+    for i in range(n):
+        db.add(FunboostConsumeResult(_id=f'{queue_name}-{i}', task_id=f'{queue_name}-{i}', queue_name=queue_name,
+                                     insert_time=T0 + timedelta(minutes=i), success=True))
+    db.commit()
+
+
+def test_rerun_after_failed_delete_does_not_duplicate_archive(db, archive_dir, monkeypatch):
+    _add(db, 5)
+    commit = db.commit
+    calls = []
+
+    def failing_commit():
+        calls.append(True)
+        if len(calls) == 2:
+            db.rollback()
+            raise RuntimeError('connection lost')
+        commit()
+
+    # 第二批写完归档后 DELETE 提交失败，重跑时同一批结果覆盖同一个归档文件
+    monkeypatch.setattr(db, 'commit', failing_commit)
+    with pytest.raises(RuntimeError):
+        result_retention.archive_and_delete_queue(db, 'q', T0 + timedelta(days=1), batch_size=2)
+    monkeypatch.setattr(db, 'commit', commit)
+    deleted, _ = result_retention.archive_and_delete_queue(db, 'q', T0 + timedelta(days=1), batch_size=2)
+
+    assert deleted == 3
+    assert db.query(FunboostConsumeResult).count() == 0
+    archived = sorted(row['_id'] for row in result_retention.iter_archived_results('q'))
+    assert archived == [f'q-{i}' for i in range(5)]
+    assert not list(archive_dir.glob('**/*.tmp'))
+
+
+def test_dropped_partitions_invalidate_counts(db, archive_dir, monkeypatch):
+    _add(db, 2, 'a')
+    _add(db, 1, 'b')
+    marked = []
+    monkeypatch.setattr(result_retention, 'mark_results_written', lambda names: marked.append(set(names)))
+    executed = []
+    execute = db.execute
+
+    def fake_execute(statement, *args, **kwargs):
+        # sqlite 不支持分区，只记录 DDL
+        if str(statement).startswith('ALTER TABLE'):
+            executed.append(str(statement))
+            return None
+        return execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(db, 'execute', fake_execute)
+    partitions = [
+        {'name': 'p20240101', 'upper': T0 + timedelta(days=1), 'rows': 3, 'bytes': 100},
+        {'name': 'pmax', 'upper': None, 'rows': 0, 'bytes': 0},
+    ]
+    dropped, rows, _, reclaimed = result_retention.drop_expired_partitions(db, partitions, T0 + timedelta(days=2))
+
+    assert dropped == ['p20240101'] and rows == 3 and reclaimed == 100
+    assert executed == [f'ALTER TABLE {result_retention.TABLE_NAME} DROP PARTITION p20240101']
+    assert marked == [{'a', 'b'}]
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.crud import result_rollup, result_stats
+from app.crud.result_rollup import HIST_BOUNDS, hist_index, hist_percentiles
+from app.models.funboost_result import FunboostConsumeResult
+from app.models.funboost_result_rollup import FunboostResultRollupHour, FunboostResultRollupMinute
+
+START = datetime(2024, 1, 1, 10, 0)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(result_stats, 'stats_cache', result_stats.StatsBucketCache())
+
+
+def _hist(values):
+    indexes, counts = np.unique(hist_index(values), return_counts=True)
+    return {str(i): int(c) for i, c in zip(indexes.tolist(), counts.tolist())}
+
+
+def test_hist_index_bounds():
+    assert hist_index(np.array([0.0, 0.0005, 0.001, 0.0012, 1e9])).tolist() == [0, 0, 1, 2, len(HIST_BOUNDS) - 1]
+
+
+@pytest.mark.parametrize('sampler', [
+    lambda rng: rng.lognormal(mean=-3, sigma=1.5, size=20000),
+    lambda rng: rng.uniform(0.5, 2.0, size=20000),
+    lambda rng: rng.exponential(0.05, size=20000),
+])
+def test_hist_percentiles_close_to_numpy(sampler):
+    values = sampler(np.random.default_rng(0))
+    qs = [0.5, 0.95, 0.99]
+    estimated = hist_percentiles(_hist(values), qs, values.min(), values.max())
+    # 桶宽为 1.2 倍，估算值与真实分位数在同一个桶内
+    np.testing.assert_allclose(estimated, np.percentile(values, [q * 100 for q in qs]), rtol=0.2)
+
+
+def test_hist_percentiles_clamped_to_min_max():
+    assert hist_percentiles({}, [0.5]) == [None]
+    values = np.array([0.3, 0.3, 0.3])
+    assert hist_percentiles(_hist(values), [0.01, 0.5, 0.99], 0.3, 0.3) == [0.3, 0.3, 0.3]
+
+
+def _add_results(db, count, rng):
+    costs = []
+    for i in range(count):
+        insert_time = START + timedelta(seconds=int(rng.integers(0, 3 * 3600)))
+        cost = float(rng.lognormal(-2, 1))
+        db.add(FunboostConsumeResult(_id=str(i), queue_name='q', function='f', host_name='h',
+                                     insert_time=insert_time, insert_minutes=insert_time.strftime('%Y-%m-%d %H:%M'),
+                                     time_cost=cost, success=i % 4 != 0))
+        costs.append((insert_time, cost))
+    db.commit()
+    return costs
+
+
+def test_rollup_once_is_incremental_and_idempotent(db, monkeypatch):
+    monkeypatch.setattr(result_rollup, 'ROLLUP_BATCH_MINUTES', 45)
+    _add_results(db, 500, np.random.default_rng(1))
+
+    # 第一次只追到 11:30 之前
+    assert result_rollup.rollup_once(db, now=datetime(2024, 1, 1, 11, 32)) > 0
+    assert result_rollup.get_high_water(db) == datetime(2024, 1, 1, 11, 30)
+    result_rollup.rollup_once(db, now=datetime(2024, 1, 1, 14, 0))
+    minute_total = sum(row.executions for row in db.query(FunboostResultRollupMinute))
+    hour_total = sum(row.executions for row in db.query(FunboostResultRollupHour))
+    assert minute_total == hour_total == 500
+
+    # 已追平时不再处理；回退 high_water 后重算结果不变
+    assert result_rollup.rollup_once(db, now=datetime(2024, 1, 1, 14, 0)) == 0
+    state = db.get(result_rollup.FunboostResultRollupState, result_rollup.ROLLUP_STATE_NAME)
+    state.high_water = START
+    db.commit()
+    result_rollup.rollup_once(db, now=datetime(2024, 1, 1, 14, 0))
+    assert sum(row.executions for row in db.query(FunboostResultRollupMinute)) == 500
+    assert sum(row.executions for row in db.query(FunboostResultRollupHour)) == 500
+
+
+def test_stats_from_rollup_match_raw_table(db, monkeypatch):
+    costs = _add_results(db, 2000, np.random.default_rng(2))
+    end = START + timedelta(hours=3)
+    raw = result_stats.get_result_stats(db, START, end, bucket_minutes=60)
+
+    result_rollup.rollup_once(db, now=datetime(2024, 1, 1, 14, 0))
+    monkeypatch.setattr(result_stats, 'stats_cache', result_stats.StatsBucketCache())
+    rolled = result_stats.get_result_stats(db, START, end, bucket_minutes=60)
+
+    [raw_series], [rolled_series] = raw['series'], rolled['series']
+    assert len(rolled_series['points']) == len(raw_series['points']) == 3
+    for raw_point, point in zip(raw_series['points'], rolled_series['points']):
+        assert point['executions'] == raw_point['executions']
+        assert point['failures'] == raw_point['failures']
+        assert point['avg_time_cost'] == pytest.approx(raw_point['avg_time_cost'])
+        hour = [cost for insert_time, cost in costs if point['bucket_start'] <= insert_time
+                < point['bucket_start'] + timedelta(hours=1)]
+        for q in result_stats.PERCENTILES:
+            assert point[f'p{int(q * 100)}'] == pytest.approx(np.percentile(hour, q * 100), rel=0.2)
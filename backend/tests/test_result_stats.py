@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.crud import result_stats
+from app.crud.result_stats import floor_to_bucket, grouped_percentiles
+from app.models.funboost_result import FunboostConsumeResult
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(result_stats, 'stats_cache', result_stats.StatsBucketCache())
+
+
+def test_grouped_percentiles_match_numpy():
+    rng = np.random.default_rng(0)
+    group_ids = rng.integers(0, 50, size=5000)
+    values = rng.lognormal(size=5000)
+    qs = (0, 0.5, 0.95, 0.99, 1)
+    groups, matrix = grouped_percentiles(group_ids, values, qs)
+    assert groups.tolist() == sorted(set(group_ids.tolist()))
+    for group, row in zip(groups, matrix):
+        expected = np.percentile(values[group_ids == group], [q * 100 for q in qs])
+        np.testing.assert_allclose(row, expected)
+
+
+def test_grouped_percentiles_single_value_group():
+    groups, matrix = grouped_percentiles(np.array([7, 3, 3]), np.array([2.5, 1.0, 3.0]), (0.5, 0.99))
+    assert groups.tolist() == [3, 7]
+    np.testing.assert_allclose(matrix, [[2.0, 2.98], [2.5, 2.5]])
+
+
+def test_floor_to_bucket():
+    assert floor_to_bucket(datetime(2024, 1, 1, 10, 7, 59), 1) == datetime(2024, 1, 1, 10, 7)
+    assert floor_to_bucket(datetime(2024, 1, 1, 10, 7, 59), 5) == datetime(2024, 1, 1, 10, 5)
+    assert floor_to_bucket(datetime(2024, 1, 1, 10, 7), 60) == datetime(2024, 1, 1, 10, 0)
+
+
+def test_get_result_stats_from_raw_rows(db):
+    rng = np.random.default_rng(1)
+    start = datetime(2024, 1, 1, 10, 0)
+    costs = {}
+    for i in range(300):
+        insert_time = start + timedelta(seconds=int(rng.integers(0, 600)))
+        cost = float(rng.exponential())
+        success = i % 10 != 0
+        db.add(FunboostConsumeResult(_id=str(i), queue_name='q', function='f', insert_time=insert_time,
+                                     insert_minutes=insert_time.strftime('%Y-%m-%d %H:%M'),
+                                     time_cost=cost, success=success))
+        costs.setdefault(floor_to_bucket(insert_time, 5), []).append(cost)
+    db.commit()
+
+    stats = result_stats.get_result_stats(db, start, start + timedelta(minutes=10), bucket_minutes=5)
+    [series] = stats['series']
+    assert (series['queue_name'], series['function']) == ('q', 'f')
+    assert sum(point['executions'] for point in series['points']) == 300
+    assert sum(point['failures'] for point in series['points']) == 30
+    for point in series['points']:
+        values = costs[point['bucket_start']]
+        assert point['executions'] == len(values)
+        for q in result_stats.PERCENTILES:
+            assert point[f'p{int(q * 100)}'] == pytest.approx(np.percentile(values, q * 100), abs=1e-6)
+
+
+def test_too_many_buckets_rejected(db):
+    start = datetime(2024, 1, 1)
+    with pytest.raises(ValueError):
+        result_stats.get_result_stats(db, start, start + timedelta(days=30), bucket_minutes=1)
@@ -0,0 +1,155 @@
+import pytest
+
+import runner_autoscaler
+from runner_autoscaler import Autoscaler, FakeBacklogSource
+
+
+@pytest.fixture(autouse=True)
+def thresholds(monkeypatch):
+    monkeypatch.setattr(runner_autoscaler, 'AUTOSCALE_UP_DRAIN_SECONDS', 60)
+    monkeypatch.setattr(runner_autoscaler, 'AUTOSCALE_DOWN_DRAIN_SECONDS', 5)
+    monkeypatch.setattr(runner_autoscaler, 'AUTOSCALE_UP_SAMPLES', 2)
+    monkeypatch.setattr(runner_autoscaler, 'AUTOSCALE_DOWN_SAMPLES', 3)
+    monkeypatch.setattr(runner_autoscaler, 'AUTOSCALE_UP_COOLDOWN', 60)
+    monkeypatch.setattr(runner_autoscaler, 'AUTOSCALE_DOWN_COOLDOWN', 300)
+
+
+class Harness:
+    def __init__(self, processes=2, min_processes=1, max_processes=8):
+        self.now = 0.0
+        self.processes = processes
+        self.unit = {'queues': ['q'], 'group': None, 'processes': processes,
+                     'min_processes': min_processes, 'max_processes': max_processes}
+        self.source = FakeBacklogSource()
+        self.scaler = Autoscaler([self.unit], self.source, count=lambda unit: self.processes,
+                                 scale=self._scale, clock=lambda: self.now, log=lambda message: None)
+
+    def _scale(self, unit, target):
+        self.processes = target
+
+    def tick(self, backlog, rate, advance=10):
+        self.now += advance
+        self.source.set('q', backlog, rate)
+        return self.scaler.tick()
+
+
+def test_scale_up_needs_consecutive_samples():
+    h = Harness(processes=2)
+    # 预计排空 1000 / 5 = 200 秒，超过 60 秒
+    assert h.tick(1000, 5) == []
+    assert h.processes == 2
+    applied = h.tick(1000, 5)
+    # 按比例扩到 ceil(2 * 200 / 60) = 7
+    assert h.processes == 7
+    assert applied[0]['from'] == 2 and applied[0]['to'] == 7
+
+
+def test_hysteresis_band_resets_streak():
+    h = Harness(processes=2)
+    h.tick(1000, 5)
+    # 排空 20 秒，位于两个阈值之间，不调整且清零连续计数
+    h.tick(100, 5)
+    h.tick(1000, 5)
+    assert h.processes == 2
+    h.tick(1000, 5)
+    assert h.processes > 2
+
+
+def test_scale_down_one_step_after_samples():
+    h = Harness(processes=4)
+    for _ in range(2):
+        h.tick(0, 5)
+    assert h.processes == 4
+    h.tick(0, 5)
+    assert h.processes == 3
+
+
+def test_up_cooldown_blocks_second_scale_up():
+    h = Harness(processes=1, max_processes=20)
+    h.tick(120, 1)
+    h.tick(120, 1)
+    first = h.processes
+    assert first == 2
+    h.tick(120, 1)
+    h.tick(120, 1)
+    assert h.processes == first
+    assert h.scaler.decisions[-1]['applied'] is False
+    assert h.scaler.decisions[-1]['reason'] == '积压持续增长，扩容冷却中'
+    # 冷却期间重复被拦下只记录一次
+    recorded = len(h.scaler.decisions)
+    h.tick(120, 1)
+    assert len(h.scaler.decisions) == recorded
+    # 冷却结束后继续扩容
+    h.tick(120, 1, advance=60)
+    h.tick(120, 1)
+    assert h.processes == 4
+
+
+def test_down_cooldown_after_scale_up():
+    h = Harness(processes=2)
+    h.tick(1000, 5)
+    h.tick(1000, 5)
+    scaled = h.processes
+    for _ in range(3):
+        h.tick(0, 5)
+    assert h.processes == scaled
+    assert h.scaler.decisions[-1]['reason'] == '负载较低，缩容冷却中'
+    h.now += 300
+    for _ in range(3):
+        h.tick(0, 5)
+    assert h.processes == scaled - 1
+
+
+def test_clamped_to_max_processes():
+    h = Harness(processes=2, max_processes=3)
+    h.tick(100000, 1)
+    h.tick(100000, 1)
+    assert h.processes == 3
+    h.now += 1000
+    h.tick(100000, 1)
+    h.tick(100000, 1)
+    assert h.processes == 3
+    assert h.scaler.decisions[-1]['reason'] == '积压持续增长，但已达到进程数上限'
+
+
+def test_never_below_min_processes():
+    h = Harness(processes=2, min_processes=2)
+    for _ in range(10):
+        h.tick(0, 1, advance=1000)
+    assert h.processes == 2
+
+
+def test_restores_min_processes_after_crash():
+    h = Harness(processes=3, min_processes=3)
+    h.processes = 1
+    applied = h.tick(None, 0)
+    assert h.processes == 3
+    assert applied[0]['reason'] == '存活进程数低于下限'
+
+
+def test_no_rate_with_backlog_scales_by_one():
+    h = Harness(processes=2)
+    h.tick(10, 0)
+    h.tick(10, 0)
+    assert h.processes == 3
+
+
+def test_shared_group_sums_queue_loads():
+    source = FakeBacklogSource()
+    unit = {'queues': ['a', 'b'], 'group': 'g', 'processes': 1, 'min_processes': 1, 'max_processes': 4}
+    processes = [1]
+    scaler = Autoscaler([unit], source, count=lambda u: processes[0],
+                        scale=lambda u, n: processes.__setitem__(0, n), clock=lambda: 0.0, log=lambda m: None)
+    # 单个队列都不到阈值（各 50 秒），合计 100 秒超过阈值
+    source.set('a', 50, 0.5)
+    source.set('b', 50, 0.5)
+    scaler.tick()
+    scaler.tick()
+    assert processes[0] == 2
+
+
+def test_fake_source_reads_json_file(tmp_path):
+    path = tmp_path / 'backlog.json'
+    path.write_text('{"q": {"backlog": 7, "rate": 1.5}}', encoding='utf-8')
+    loads = FakeBacklogSource(path=str(path)).sample(['q', 'missing'])
+    assert loads == {'q': runner_autoscaler.QueueLoad(7, 1.5)}
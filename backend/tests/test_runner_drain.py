@@ -0,0 +1,185 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import runner_drain
+
+
+@pytest.fixture(autouse=True)
+def reset(monkeypatch):
+    monkeypatch.setattr(runner_drain, '_in_flight', 0)
+    monkeypatch.setattr(runner_drain, 'draining', threading.Event())
+    monkeypatch.setattr(runner_drain, '_local_consumers', lambda: [])
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+class SoloPool:
+    """与 single_thread 模式的 SoloExecutor 一样，在提交的线程中直接执行"""
+
+    def submit(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+class FakeConsumer:
+    """按 funboost AbstractConsumer 的方式拉取和提交消息：提交到并发池后，_pause_flag 设置时暂停拉取"""
+
+    def __init__(self, pool):
+        self.queue_name = 'q'
+        self.concurrent_pool = pool
+        self._pause_flag = threading.Event()
+        self.broker = queue.Queue()
+        self.started, self.requeued = [], []
+        self.release = threading.Event()
+
+    def _run(self, kw):
+        self.started.append(kw['body'])
+        self.release.wait(5)
+
+    def _requeue(self, kw):
+        self.requeued.append(kw['body'])
+
+    def _submit_task(self, kw):
+        self.concurrent_pool.submit(self._run, kw)
+        while self._pause_flag.is_set():
+            time.sleep(0.01)
+
+    def dispatch(self):
+        while True:
+            self._submit_task({'body': self.broker.get()})
+
+    def heartbeat(self, stop):
+        # redis 中没有暂停标记时，funboost 的心跳线程会清除 _pause_flag
+        while not stop.wait(0.01):
+            self._pause_flag.clear()
+
+
+def test_no_new_message_taken_while_draining_with_heartbeat():
+    pool = ThreadPoolExecutor(4)
+    consumer = FakeConsumer(pool)
+    runner_drain.track(consumer)
+    stop = threading.Event()
+    threading.Thread(target=consumer.dispatch, daemon=True).start()
+    threading.Thread(target=consumer.heartbeat, args=(stop,), daemon=True).start()
+    try:
+        consumer.broker.put('m1')
+        wait_for(lambda: consumer.started == ['m1'])
+        assert runner_drain.in_flight() == 1
+
+        runner_drain.draining.set()
+        consumer.broker.put('m2')
+        consumer.broker.put('m3')
+        # m1 还在执行，排空等待超时
+        assert runner_drain.drain(time.monotonic() + 0.5) is False
+        # 排空开始后取到的 m2 放回队列，拉取线程阻塞，m3 留在队列中
+        assert consumer.requeued == ['m2']
+        assert consumer.started == ['m1']
+        assert consumer.broker.qsize() == 1
+
+        consumer.release.set()
+        assert runner_drain.drain(time.monotonic() + 2) is True
+        assert runner_drain.in_flight() == 0
+        assert consumer.started == ['m1']
+    finally:
+        stop.set()
+        consumer.release.set()
+        pool.shutdown(wait=True)
+
+
+def test_idle_single_thread_consumer_drains_immediately():
+    consumer = FakeConsumer(SoloPool())
+    consumer.release.set()
+    runner_drain.track(consumer)
+    consumer._submit_task({'body': 'm1'})
+    assert consumer.started == ['m1']
+    assert runner_drain.in_flight() == 0
+    started = time.monotonic()
+    assert runner_drain.drain(started + 5) is True
+    assert time.monotonic() - started < 1
+
+
+def test_async_tasks_are_counted_until_finished():
+    release = threading.Event()
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    class AsyncPool:
+        """与 AsyncPoolExecutor 一样，提交协程函数，在事件循环中执行"""
+
+        def submit(self, func, *args, **kwargs):
+            assert asyncio.iscoroutinefunction(func)
+            asyncio.run_coroutine_threadsafe(func(*args, **kwargs), loop)
+
+    async def task(kw):
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+
+    pool = AsyncPool()
+    runner_drain._track_pool(pool)
+    runner_drain._track_pool(pool)  # 共用的并发池只包装一次
+    pool.submit(task, {'body': 'm1'})
+    assert runner_drain.in_flight() == 1
+    release.set()
+    wait_for(lambda: runner_drain.in_flight() == 0)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def test_failed_submit_does_not_leak_count():
+    class BrokenPool:
+        def submit(self, fn, *args, **kwargs):
+            raise RuntimeError('pool closed')
+
+    pool = BrokenPool()
+    runner_drain._track_pool(pool)
+    with pytest.raises(RuntimeError):
+        pool.submit(lambda: None)
+    assert runner_drain.in_flight() == 0
+
+
+def _report_installed(conn):
+    import runner_drain as module
+    conn.send(module.drain_handler_installed())
+
+
+@pytest.mark.parametrize('method, expected', [('fork', True), ('spawn', False)])
+def test_handler_inherited_only_through_fork(monkeypatch, method, expected):
+    import multiprocessing
+    import signal
+
+    previous = signal.getsignal(signal.SIGTERM)
+    monkeypatch.setattr(runner_drain, '_installed', False)
+    try:
+        runner_drain.install_drain_handler()
+        ctx = multiprocessing.get_context(method)
+        parent, child = ctx.Pipe()
+        process = ctx.Process(target=_report_installed, args=(child,))
+        process.start()
+        assert parent.recv() is expected
+        process.join(10)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+
+def test_close_result_writer_only_when_saver_imported(monkeypatch):
+    import sys
+    import types
+
+    monkeypatch.delitem(sys.modules, 'result_status_saver', raising=False)
+    runner_drain.close_result_writer()
+    assert 'result_status_saver' not in sys.modules
+
+    closed = []
+    saver = types.ModuleType('result_status_saver')
+    saver.close_writer = lambda: closed.append(True)
+    monkeypatch.setitem(sys.modules, 'result_status_saver', saver)
+    runner_drain.close_result_writer()
+    assert closed == [True]
@@ -0,0 +1,113 @@
+import os
+import sys
+import types
+
+import pytest
+
+import runner_manifest
+
+
+class FakeBoostersManager:
+    """代替 funboost 的 BoostersManager，任务文件执行时通过 fake_boost 注册队列"""
+
+    def __init__(self):
+        self.queue_name__boost_params_map = {}
+        self.executed = []
+
+    def boost(self, queue_name):
+        def register(func):
+            self.queue_name__boost_params_map[queue_name] = types.SimpleNamespace(consuming_function=func)
+            return func
+        return register
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = FakeBoostersManager()
+    monkeypatch.setitem(sys.modules, 'fake_boost', manager)
+    monkeypatch.setattr(runner_manifest, 'RUNNER_DISCOVERY_CACHE', True)
+    # 只统计执行过的文件，不依赖 funboost 的目录扫描
+    monkeypatch.setattr(runner_manifest, 'scan_py_files', lambda tasks_dir, max_depth=3: sorted(
+        os.path.join(root, name) for root, _, names in os.walk(tasks_dir) for name in names if name.endswith('.py')))
+    original = runner_manifest.exec_task_file
+
+    def exec_task_file(tasks_dir, path):
+        manager.executed.append(os.path.relpath(path, tasks_dir))
+        return original(tasks_dir, path)
+
+    monkeypatch.setattr(runner_manifest, 'exec_task_file', exec_task_file)
+    return manager
+
+
+TASK = "import fake_boost\n\n@fake_boost.boost({queue!r})\ndef task():\n    pass\n"
+
+
+@pytest.fixture
+def tasks(tmp_path):
+    tasks_dir = tmp_path / 'tasks'
+    (tasks_dir / 'sub').mkdir(parents=True)
+    (tasks_dir / 'a.py').write_text(TASK.format(queue='qa'), encoding='utf-8')
+    (tasks_dir / 'sub' / 'b.py').write_text(TASK.format(queue='qb'), encoding='utf-8')
+    (tasks_dir / 'util.py').write_text("VALUE = 1\n", encoding='utf-8')
+    return tasks_dir
+
+
+def _discover(tasks_dir, manager, tmp_path):
+    manager.executed.clear()
+    return runner_manifest.discover(str(tasks_dir), manager, manifest_path=str(tmp_path / 'manifest.json'))
+
+
+def test_first_run_executes_everything_and_records_queues(tasks, manager, tmp_path):
+    stats = _discover(tasks, manager, tmp_path)
+    assert (stats['files'], stats['executed'], stats['changed']) == (3, 3, 3)
+    files = runner_manifest.load_manifest(str(tasks), str(tmp_path / 'manifest.json'))
+    assert {rel: entry['queues'] for rel, entry in files.items()} == {
+        'a.py': ['qa'], os.path.join('sub', 'b.py'): ['qb'], 'util.py': []}
+
+
+def test_unchanged_files_without_queues_are_skipped(tasks, manager, tmp_path):
+    _discover(tasks, manager, tmp_path)
+    stats = _discover(tasks, manager, tmp_path)
+    assert (stats['executed'], stats['skipped'], stats['changed']) == (2, 1, 0)
+    # 定义了队列的文件仍要执行，@boost 才会注册
+    assert sorted(manager.executed) == ['a.py', os.path.join('sub', 'b.py')]
+
+
+def test_changed_file_is_executed_and_rerecorded(tasks, manager, tmp_path):
+    _discover(tasks, manager, tmp_path)
+    (tasks / 'util.py').write_text(TASK.format(queue='qu'), encoding='utf-8')
+    stats = _discover(tasks, manager, tmp_path)
+    assert stats['changed'] == 1 and 'util.py' in manager.executed
+    files = runner_manifest.load_manifest(str(tasks), str(tmp_path / 'manifest.json'))
+    assert files['util.py']['queues'] == ['qu']
+
+
+def test_touched_file_with_same_content_is_unchanged(tasks, manager, tmp_path):
+    _discover(tasks, manager, tmp_path)
+    util = tasks / 'util.py'
+    stat = util.stat()
+    os.utime(util, (stat.st_atime + 100, stat.st_mtime + 100))
+    stats = _discover(tasks, manager, tmp_path)
+    assert stats['changed'] == 0 and 'util.py' not in manager.executed
+    files = runner_manifest.load_manifest(str(tasks), str(tmp_path / 'manifest.json'))
+    assert files['util.py']['mtime'] == stat.st_mtime + 100
+
+
+def test_deleted_file_is_removed(tasks, manager, tmp_path):
+    _discover(tasks, manager, tmp_path)
+    (tasks / 'util.py').unlink()
+    assert _discover(tasks, manager, tmp_path)['files'] == 2
+    assert 'util.py' not in runner_manifest.load_manifest(str(tasks), str(tmp_path / 'manifest.json'))
+
+
+def test_manifest_for_other_tasks_dir_is_ignored(tasks, manager, tmp_path):
+    _discover(tasks, manager, tmp_path)
+    path = str(tmp_path / 'manifest.json')
+    assert runner_manifest.load_manifest(str(tmp_path / 'elsewhere'), path) == {}
+    assert runner_manifest.load_manifest(str(tasks), str(tmp_path / 'missing.json')) == {}
+
+
+def test_cache_disabled_executes_everything(tasks, manager, tmp_path, monkeypatch):
+    _discover(tasks, manager, tmp_path)
+    monkeypatch.setattr(runner_manifest, 'RUNNER_DISCOVERY_CACHE', False)
+    assert _discover(tasks, manager, tmp_path)['executed'] == 3
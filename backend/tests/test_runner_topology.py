@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+import runner_topology
+from runner_topology import TopologyError, build_plan, load_topology, parse_topology, resolve_queue
+
+
+def _write_topology(tmp_path, data):
+    (tmp_path / runner_topology.TOPOLOGY_FILE_NAME).write_text(
+        data if isinstance(data, str) else json.dumps(data), encoding='utf-8')
+    return str(tmp_path)
+
+
+def test_missing_file_uses_default(tmp_path):
+    topology = load_topology(str(tmp_path))
+    assert topology['exists'] is False
+    assert topology['default']['processes'] == runner_topology.DEFAULT_PROCESSES
+    plan = build_plan(topology, {'a': None, 'b': 'g'})
+    assert [(unit['queues'], unit['processes'], unit['min_processes'], unit['max_processes']) for unit in plan] == [
+        (['a'], 4, 4, 4), (['b'], 4, 4, 4)]
+
+
+@pytest.mark.parametrize('data, message', [
+    ('{not json', '不是合法的 JSON'),
+    ([], '必须是 JSON 对象'),
+    ({'default': {}, 'extra': {}}, '未知配置项: extra'),
+    ({'queues': []}, 'queues 必须是对象'),
+    ({'queues': {'q': 3}}, 'queues.q 必须是对象'),
+    ({'queues': {'q': {'procs': 1}}}, 'queues.q 包含未知配置项: procs'),
+    ({'queues': {'q': {'shared': True}}}, 'queues.q 包含未知配置项: shared'),
+    ({'default': {'processes': -1}}, 'default.processes 必须是大于等于 0 的整数'),
+    ({'default': {'processes': True}}, 'default.processes 必须是大于等于 0 的整数'),
+    ({'queues': {'q': {'processes': 1.5}}}, 'queues.q.processes 必须是大于等于 0 的整数'),
+    ({'queues': {'q': {'min_processes': 3, 'max_processes': 2}}}, 'queues.q.min_processes 不能大于 max_processes'),
+    ({'groups': {'g': {'concurrent_mode': 'fork'}}}, 'groups.g.concurrent_mode 必须是'),
+    ({'groups': {'g': {'concurrent_num': 0}}}, 'groups.g.concurrent_num 必须是大于 0 的整数'),
+    ({'groups': {'g': {'shared': 'yes'}}}, 'groups.g.shared 必须是布尔值'),
+])
+def test_load_topology_validation_errors(tmp_path, data, message):
+    with pytest.raises(TopologyError, match=message):
+        load_topology(_write_topology(tmp_path, data))
+
+
+def test_min_above_inherited_max_is_rejected():
+    # 各层单独合法，合并后下限大于上限
+    topology = parse_topology({'groups': {'g': {'max_processes': 2}}, 'queues': {'q': {'min_processes': 3}}})
+    with pytest.raises(TopologyError, match='队列 q 的 min_processes 大于 max_processes'):
+        build_plan(topology, {'q': 'g'})
+
+
+def test_resolve_queue_priority_and_clamping():
+    topology = parse_topology({
+        'default': {'processes': 1, 'concurrent_num': 10},
+        'groups': {'g': {'processes': 3, 'concurrent_mode': 'async'}},
+        'queues': {'q': {'processes': 9, 'max_processes': 5}},
+    })
+    spec = resolve_queue(topology, 'q', 'g')
+    assert spec == {'processes': 5, 'min_processes': 5, 'max_processes': 5,
+                    'concurrent_mode': 'async', 'concurrent_num': 10}
+    assert resolve_queue(topology, 'other', 'g')['processes'] == 3
+    assert resolve_queue(topology, 'other', None)['processes'] == 1
+
+
+def test_build_plan_shared_groups_and_disabled_queues(tmp_path):
+    topology = load_topology(_write_topology(tmp_path, {
+        'default': {'processes': 1},
+        'groups': {'g': {'processes': 2, 'shared': True}},
+        'queues': {'g2': {'processes': 1, 'min_processes': 1, 'max_processes': 4}, 'off': {'processes': 0},
+                   'lazy': {'processes': 0, 'max_processes': 2}},
+    }))
+    plan = build_plan(topology, {'g1': 'g', 'g2': 'g', 'g3': 'g', 'solo': None, 'off': None, 'lazy': None})
+    assert [(unit['queues'], unit['group'], unit['processes'], unit['max_processes']) for unit in plan] == [
+        (['g1', 'g3'], 'g', 2, 2),
+        (['g2'], None, 1, 4),
+        (['solo'], None, 1, 1),
+        (['lazy'], None, 0, 2),
+    ]
+
+
+def test_state_round_trip(tmp_path):
+    path = str(tmp_path / 'state' / 'runner_state.json')
+    assert runner_topology.read_state(path) is None
+    runner_topology.write_state({'pid': 1, 'units': []}, path)
+    assert runner_topology.read_state(path) == {'pid': 1, 'units': []}
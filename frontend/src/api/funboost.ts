@@ -44,6 +44,28 @@ export function fetchGetFunboostResults(params: Api.Funboost.FunboostResultsPara
   })
 }
 
+/**
+ * 获取单条 funboost 消费结果详情（包含参数、结果、异常堆栈等大字段）
+ * @param id 结果 _id
+ * @returns 结果详情
+ */
+export function fetchGetFunboostResultDetail(id: string) {
+  return request.get<Api.Funboost.FunboostResultItem>({
+    url: `/api/funboost/results/${encodeURIComponent(id)}`
+  })
+}
+
+/**
+ * 按 task_id 获取任务的运行日志
+ * @param taskId 任务 task_id
+ * @returns 任务日志
+ */
+export function fetchGetFunboostTaskLogs(taskId: string) {
+  return request.get<Api.Funboost.FunboostTaskLogsData>({
+    url: `/api/funboost/results/${encodeURIComponent(taskId)}/logs`
+  })
+}
+
 /**
  * 获取所有队列的运行信息
  * @returns 所有队列的运行信息
@@ -30,7 +30,9 @@ export function fetchGetMenuList() {
  */
 export function fetchStartProcess() {
   return request.post<Api.Common.CommonResponse>({
-    url: '/api/process/start'
+    url: '/api/process/start',
+    // 首次启动或 requirements.txt 变化后需要先创建 taskrunner 的运行环境，不使用默认的 15 秒超时
+    timeout: 300000
   })
 }
 
@@ -40,7 +42,9 @@ export function fetchStartProcess() {
  */
 export function fetchRestartProcess() {
   return request.post({
-    url: '/api/process/restart'
+    url: '/api/process/restart',
+    // 需要等待正在执行的任务完成（PROCESS_DRAIN_SECONDS），不使用默认的 15 秒超时
+    timeout: 300000
   })
 }
 
@@ -50,7 +54,9 @@ export function fetchRestartProcess() {
  */
 export function fetchStopProcess() {
   return request.post({
-    url: '/api/process/stop'
+    url: '/api/process/stop',
+    // 需要等待正在执行的任务完成（PROCESS_DRAIN_SECONDS），不使用默认的 15 秒超时
+    timeout: 300000
   })
 }
 
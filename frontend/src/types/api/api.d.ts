@@ -142,8 +142,74 @@ declare namespace Api {
 
     /** 子进程状态数据 */
     interface ProcessStatusData {
-      status: 'running' | 'stopped'
+      status: 'running' | 'restarting' | 'stopped'
       pid?: number
+      /** 本次运行时长（秒） */
+      uptime?: number
+      started_at?: string
+      /** 异常退出后等待自动重启的剩余秒数 */
+      restart_in?: number
+      /** 自动重启次数 */
+      restarts?: number
+      auto_restart?: boolean
+      drain_seconds?: number
+      /** taskrunner 使用的 Python（启用独立 venv 时为 venv 中的 Python） */
+      python?: string
+      last_exit_code?: number | null
+      exits?: ProcessExitRecord[]
+      /** 按进程拓扑配置启动的进程分布，未运行时为 null */
+      topology?: RunnerTopologyState | null
+    }
+
+    /** taskrunner 进程分布 */
+    interface RunnerTopologyState {
+      pid: number
+      started_at: number
+      /** 使用的拓扑配置文件，未配置时为 null */
+      topology_path: string | null
+      units: RunnerTopologyUnit[]
+      /** 最近的自动扩缩容决策 */
+      autoscale_decisions: AutoscaleDecision[]
+    }
+
+    /** 自动扩缩容决策 */
+    interface AutoscaleDecision {
+      time: string
+      unit: string
+      from: number
+      to: number
+      backlog: number | null
+      rate: number
+      /** 预计排空积压的秒数，消费速度为 0 时为 null */
+      drain_seconds: number | null
+      reason: string
+      /** 是否实际调整了进程数（被冷却时间或上下限拦下时为 false） */
+      applied: boolean
+    }
+
+    /** 一组使用相同设置的消费进程 */
+    interface RunnerTopologyUnit {
+      queues: string[]
+      /** 共用进程的分组名，单个队列独占进程时为 null */
+      group: string | null
+      processes: number
+      min_processes: number
+      max_processes: number
+      concurrent_mode: string
+      concurrent_num: number
+      pids: number[]
+      alive: number[]
+    }
+
+    /** 子进程退出记录 */
+    interface ProcessExitRecord {
+      pid: number
+      /** 退出码，负数表示被信号结束 */
+      exit_code: number
+      uptime: number
+      time: string
+      /** 是否为主动停止/重启 */
+      expected: boolean
     }
   }
 
@@ -202,7 +268,23 @@ declare namespace Api {
     }
 
     /** Funboost 结果分页响应 */
-    type FunboostResultsData = Api.Common.PaginatedResponse<FunboostResultItem>
+    type FunboostResultsData = Api.Common.PaginatedResponse<FunboostResultItem> & {
+      /** 下一页游标，传回 cursor 参数即可按 keyset 翻页 */
+      next_cursor?: string | null
+      /** 上一页游标 */
+      prev_cursor?: string | null
+      /** total 是否为精确值，estimated 模式下可能为估算值 */
+      total_exact?: boolean
+    }
+
+    /** 按 task_id 查询的任务日志 */
+    interface FunboostTaskLogsData {
+      /** 该任务在结果表中的记录（精简字段），尚未写入时为 null */
+      result: FunboostResultItem | null
+      lines: { time: string; line: string }[]
+      /** 是否因 limit 截断 */
+      truncated: boolean
+    }
 
     /** Funboost 结果查询参数 */
     interface FunboostResultsParams {
@@ -211,6 +293,8 @@ declare namespace Api {
       task_id?: string
       queue_name?: string
       success?: boolean
+      cursor?: string
+      count_mode?: 'exact' | 'cached' | 'estimated'
     }
 
     /** 活跃消费者运行信息 */